@@ -1,54 +1,50 @@
 import streamlit as st
+import functools
 import os
-import requests
 from datetime import datetime, timedelta
 import json
+import sqlite3
 import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from dotenv import load_dotenv
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from policy_kb import POLICY_KB, get_kb_version
 
 # 新增：加载 .env 环境变量
 load_dotenv()
 
-# 新增：导入模块
-try:
-    import google.generativeai as genai
-    GEMINI_AVAILABLE = True
-except ImportError:
-    GEMINI_AVAILABLE = False
-
-try:
-    from huggingface_hub import InferenceClient
-    HF_AVAILABLE = True
-except ImportError:
-    HF_AVAILABLE = False
-
-try:
-    from rag_system import RAGSystem
-    RAG_AVAILABLE = True
-except ImportError:
-    RAG_AVAILABLE = False
-
-try:
-    from recommendation_engine import RecommendationEngine
-    REC_AVAILABLE = True
-except ImportError:
-    REC_AVAILABLE = False
-
-# 新增：导入时间线生成器和翻译管理器
+# 重量级依赖（sentence-transformers/torch、faiss、plotly、pandas）按页面按需导入，可用性在 subsystems 中探测
+from lazy_imports import format_import_report, import_report, timed_import
+
+with timed_import('app.py 核心模块'):
+    from llm_providers import (AsyncBridge, GeminiProvider, HFInferenceProvider, LLMAPIError,
+                               OpenAICompatibleProvider)
+    from circuit_breaker import BreakerRegistry
+    from response_cache import ResponseCache, make_cache_key
+    from rate_limiter import LimiterRegistry, RateLimitExceeded
+    from llm_metrics import estimate_tokens
+    from conversation import ConversationWindow, render_history
+    from context_serializer import build_compact_context, token_savings
+    from latency_budget import BudgetExceeded, LatencyBudget
+    from model_router import ModelRouter
+    from exchange_rates import ExchangeRateProvider
+    from intent_classifier import INTENT_KEYWORDS, IntentClassifier
+    from template_cache import TemplateCache
+    from memory_report import SessionMemoryReport, deep_sizeof, footprint, format_bytes, process_rss
+    # 只读子系统的加载、预热和就绪状态是进程级的（启动器 serve.py 在首个会话之前就会导入并预热）
+    from subsystems import (RAG_AVAILABLE, REC_AVAILABLE, TIMELINE_AVAILABLE, TRANSLATION_AVAILABLE,
+                            get_artifact_manifest, get_canned_index, get_embedding_intent_classifier,
+                            get_metrics_registry, get_policy_kb_version, get_rag_system, get_readiness,
+                            get_recommendation_engine, get_timeline_generator, get_translator,
+                            start_http_endpoint, start_warmup)
+
 # 注意：禁止在 set_page_config 之前调用任何 st.* API，这里先收集警告
 PRE_PAGE_WARNINGS = []
-try:
-    from timeline_generator import TimelineGenerator
-    TIMELINE_AVAILABLE = True
-except ImportError:
-    TIMELINE_AVAILABLE = False
+if not TIMELINE_AVAILABLE:
     PRE_PAGE_WARNINGS.append("⚠️ 时间线生成器未加载")
-
-try:
-    from translation_manager import TranslationManager
-    TRANSLATION_AVAILABLE = True
-except ImportError:
-    TRANSLATION_AVAILABLE = False
+if not TRANSLATION_AVAILABLE:
     PRE_PAGE_WARNINGS.append("⚠️ 翻译管理器未加载")
 
 # 页面配置
@@ -62,14 +58,15 @@ st.set_page_config(
 for _msg in PRE_PAGE_WARNINGS:
     st.warning(_msg)
 
+# 整页运行计时；片段据此区分自己是随整页运行还是被单独重跑
+APP_RUN_STARTED = time.perf_counter()
+st.session_state.app_run = st.session_state.get('app_run', 0) + 1
 
 
-# 初始化翻译管理器
-if 'translator' not in st.session_state:
-    if TRANSLATION_AVAILABLE:
-        st.session_state.translator = TranslationManager()
-    else:
-        st.session_state.translator = None
+# 子系统预热和 /metrics、/ready 端点在进程内只启动一次；用 serve.py 启动时在首个会话之前就已启动，
+# 直接 streamlit run app.py 时由第一个会话启动
+start_http_endpoint()
+start_warmup()
 
 # 初始化语言设置
 if 'language' not in st.session_state:
@@ -78,8 +75,9 @@ if 'language' not in st.session_state:
 # 获取翻译文本的辅助函数
 def t(key):
     """获取翻译文本"""
-    if st.session_state.translator:
-        return st.session_state.translator.get(key, st.session_state.language)
+    translator = get_translator()
+    if translator:
+        return translator.get(key, st.session_state.language)
     return key
 
 # 模型配置
@@ -88,176 +86,134 @@ MODEL_CONFIG = {
         "name": "Qwen-Max",
         "provider": "Alibaba Cloud",
         "speed": "快速",
-        "cost": "中等"
+        "cost": "中等",
+        # 进程级限流：平均速率、突发数、最大并发、排队等待预算（秒）
+        "rate_limit": {"requests_per_second": 5, "burst": 10, "max_concurrency": 8, "queue_timeout": 3},
+        # 多轮对话历史（摘要+最近几轮原文）的token预算
+        "history_tokens": 2000,
+        # 自动路由：能力排序（越大越强）和尚无延迟样本时的预估延迟（秒）
+        "quality": 3,
+        "latency_prior": 2.0
     },
     "Gemini": {
         "name": "Gemini-1.5-Flash",
         "provider": "Google",
         "speed": "极快",
-        "cost": "免费"
+        "cost": "免费",
+        "rate_limit": {"requests_per_second": 0.25, "burst": 5, "max_concurrency": 4, "queue_timeout": 3},
+        "history_tokens": 4000,
+        "quality": 2,
+        "latency_prior": 1.0
     },
     "Llama-3": {
         "name": "Llama-3-8B",
         "provider": "Meta (HuggingFace)",
         "speed": "较慢",
-        "cost": "免费"
+        "cost": "免费",
+        "rate_limit": {"requests_per_second": 1, "burst": 5, "max_concurrency": 4, "queue_timeout": 3},
+        "history_tokens": 1000,
+        "quality": 1,
+        "latency_prior": 4.0
     }
 }
 
-# 政策知识库
-POLICY_KB = {
-    'fertility': {
-        'baby_bonus': {
-            'cash_gifts': {
-                '1st_child': 8000,
-                '2nd_child': 8000,
-                '3rd_child': 10000,
-                '4th_child': 10000,
-                '5th_and_above': 10000
-            },
-            'cda_matching': {
-                '1st_2nd': 3000,
-                '3rd_to_6th': 9000
-            }
-        },
-        'maternity_leave': {
-            'government_paid': 16,
-            'employer_paid': 0,
-            'total': 16
-        },
-        'paternity_leave': {
-            'government_paid': 2,
-            'employer_paid': 0,
-            'total': 2
-        },
-        'childcare_subsidy': {
-            'infant_care': {'max_subsidy': 600, 'income_ceiling': 12000},
-            'childcare': {'max_subsidy': 467, 'income_ceiling': 12000}
-        },
-        'medisave_grant': 4000,
-        'website': 'https://www.babybonus.msf.gov.sg',
-        'description': '生育津贴计划帮助新加坡家庭应对抚养孩子的费用'
-    },
-    'housing': {
-        'bto_requirements': {
-            'age': 21,
-            'income_ceiling': {
-                '2room': 7000,
-                '3room_to_5room': 14000
-            },
-            'citizenship': 'At least one applicant must be Singapore Citizen'
-        },
-        'grants': {
-            'enhanced_housing_grant': {
-                'max_amount': 80000,
-                'income_ceiling': 9000
-            },
-            'family_grant': {
-                'max_amount': 50000,
-                'income_ceiling': 14000
-            },
-            'proximity_housing_grant': {
-                'max_amount': 30000,
-                'condition': 'Living with or near parents'
-            }
-        },
-        'price_ranges': {
-            '2room': [150000, 250000],
-            '3room': [250000, 400000],
-            '4room': [350000, 550000],
-            '5room': [450000, 700000]
-        },
-        'website': 'https://www.hdb.gov.sg',
-        'description': '建屋发展局(HDB)组屋是新加坡大多数家庭的首选住房'
-    },
-    'marriage': {
-        'age_requirement': 21,
-        'cost_range': [26, 42],
-        'documents': ['身份证(NRIC/FIN)', '出生证明', '单身证明'],
-        'procedures': [
-            '在线提交结婚通知(21天前)',
-            '支付费用',
-            '预约注册日期',
-            '携带文件到婚姻注册局',
-            '宣誓并签署结婚证书'
-        ],
-        'website': 'https://www.rom.gov.sg',
-        'description': '在新加坡注册结婚是一个简单快捷的过程'
-    },
-    'healthcare': {
-        'pregnancy_support': {
-            'antenatal_care': '定期产检由政府诊所提供补贴',
-            'delivery_costs': {
-                'public_hospital': [700, 1500],
-                'private_hospital': [5000, 15000]
-            },
-            'medisave_usage': '可使用Medisave支付产检和分娩费用'
-        },
-        'child_immunization': {
-            'cost': 'Free at polyclinics',
-            'schedule': '出生至18个月需完成多次接种'
-        },
-        'website': 'https://www.healthhub.sg'
-    },
-    'education': {
-        'kindergarten': {
-            'age': '18个月起可申请',
-            'subsidy': {
-                'income_ceiling': 12000,
-                'max_subsidy': 467
-            }
-        },
-        'primary_school': {
-            'age': 6,
-            'registration': '分阶段报名系统',
-            'cost': 'Heavily subsidized for citizens'
-        },
-        'website': 'https://www.moe.gov.sg'
-    }
-}
+# 熔断器配置：按进程级错误率/超时率熔断，熔断期间请求自动切换到下一个健康模型
+LLM_BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "5"))
+LLM_BREAKER_WINDOW = float(os.getenv("LLM_BREAKER_WINDOW", "60"))
+LLM_BREAKER_OPEN_SECONDS = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30"))
 
-# 初始化系统
 @st.cache_resource
-def initialize_systems():
-    """初始化RAG、推荐和时间线系统"""
-    systems = {}
-    
-    if RAG_AVAILABLE:
-        try:
-            systems['rag'] = RAGSystem(POLICY_KB)
-            systems['rag'].build_index()
-        except ImportError:
-            # 依赖库缺失，静默处理
-            pass
-        except Exception as e:
-            # 其他错误（如模型下载失败、内存不足等），静默处理
-            # 可通过调试查看具体错误: print(f"RAG初始化错误: {e}")
-            pass
-    
-    if REC_AVAILABLE:
-        try:
-            systems['rec'] = RecommendationEngine(POLICY_KB)
-        except Exception as e:
-            st.warning(f"推荐引擎初始化失败: {e}")
-    
-    if TIMELINE_AVAILABLE:
-        try:
-            systems['timeline'] = TimelineGenerator()
-        except Exception as e:
-            st.warning(f"时间线生成器初始化失败: {e}")
-    
-    return systems
+def get_breaker_registry():
+    """进程级共享的熔断器注册表"""
+    return BreakerRegistry(
+        error_rate_threshold=LLM_BREAKER_ERROR_RATE,
+        min_calls=LLM_BREAKER_MIN_CALLS,
+        window_seconds=LLM_BREAKER_WINDOW,
+        open_seconds=LLM_BREAKER_OPEN_SECONDS
+    )
+
+def get_breaker(model_type):
+    """获取模型的熔断器"""
+    return get_breaker_registry().get(model_type)
 
-if 'systems' not in st.session_state:
-    st.session_state.systems = initialize_systems()
+@st.cache_resource
+def get_limiter_registry():
+    """进程级共享的限流器（令牌桶 + 并发信号量），配置见 MODEL_CONFIG 的 rate_limit"""
+    return LimiterRegistry(MODEL_CONFIG)
+
+def get_limiter(model_type):
+    """获取模型的限流器"""
+    return get_limiter_registry().get(model_type)
+
+# 局部重跑：页面各区块注册为 st.fragment，区块内的交互只重跑该区块，不再重跑整个脚本
+def timed_fragment(section):
+    """把函数注册为 st.fragment，并按区块记录每次运行的耗时（scope 区分整页运行和局部重跑）"""
+    def decorator(func):
+        @st.fragment
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            runs = st.session_state.setdefault('fragment_runs', {})
+            scope = 'fragment' if runs.get(section) == st.session_state.app_run else 'app'
+            runs[section] = st.session_state.app_run
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                get_metrics_registry().observe_render(section, time.perf_counter() - start, scope)
+        return wrapper
+    return decorator
+
+# 自动路由：EWMA延迟由每次成功调用更新（含流式和对冲），决策记录在路由器和指标中
+ROUTER_EWMA_ALPHA = float(os.getenv("ROUTER_EWMA_ALPHA", "0.3"))
+ROUTER_LONG_QUESTION_TOKENS = int(os.getenv("ROUTER_LONG_QUESTION_TOKENS", "40"))
+
+@st.cache_resource
+def get_model_router():
+    """进程级共享的模型路由器"""
+    return ModelRouter(MODEL_CONFIG, alpha=ROUTER_EWMA_ALPHA, long_question_tokens=ROUTER_LONG_QUESTION_TOKENS)
+
+# 模板回答缓存（进程级LRU，见 generate_response）
+TEMPLATE_CACHE_MAX_ENTRIES = int(os.getenv("TEMPLATE_CACHE_MAX_ENTRIES", "1024"))
+
+@st.cache_resource
+def get_template_cache():
+    """进程级共享的模板回答缓存"""
+    return TemplateCache(TEMPLATE_CACHE_MAX_ENTRIES)
+
+# 内存报告：各会话 session_state 的近似大小（不含进程级共享对象），用于确认只读数据没有按会话复制
+@st.cache_resource
+def get_session_memory_report():
+    """进程级共享的会话内存统计"""
+    return SessionMemoryReport()
+
+@st.cache_resource
+def get_shared_memory_sizes():
+    """进程级共享的只读数据大小（内容不变，只计算一次）"""
+    return {'翻译表': deep_sizeof(get_translator()), '政策知识库': deep_sizeof(POLICY_KB)}
+
+def record_session_memory():
+    """统计本会话状态的大小并记入进程级报告，返回各键的字节数"""
+    sizes = footprint(st.session_state.to_dict(), exclude=[get_translator(), POLICY_KB])
+    ctx = get_script_run_ctx()
+    if ctx is not None:
+        get_session_memory_report().record(ctx.session_id, sizes)
+    return sizes
+
+@st.cache_resource
+def log_import_report():
+    """进程首次渲染时把导入耗时打印到启动日志（之后按需导入的模块见侧边栏诊断）"""
+    print(format_import_report())
+
+log_import_report()
 
 # 标题
 st.title(t('app_title'))
 
 # 侧边栏：语言选择
 st.sidebar.header(t('sidebar_language'))
-if TRANSLATION_AVAILABLE and st.session_state.translator:
-    languages = st.session_state.translator.get_available_languages()
+if TRANSLATION_AVAILABLE and get_translator():
+    languages = get_translator().get_available_languages()
     
     # 创建语言选择器
     lang_options = [f"{lang['flag']} {lang['name']}" for lang in languages]
@@ -280,18 +236,26 @@ if TRANSLATION_AVAILABLE and st.session_state.translator:
 # 侧边栏：API配置
 st.sidebar.header(t('sidebar_api_config'))
 
+AUTO_MODEL = "auto"  # 自动路由：按问题复杂度和实时延迟为每个问题选择模型
+
 selected_model = st.sidebar.selectbox(
     t('sidebar_select_model'),
-    list(MODEL_CONFIG.keys()),
-    help="不同模型有不同特点，建议都试试！"
+    list(MODEL_CONFIG.keys()) + [AUTO_MODEL],  # 默认仍为第一个模型，自动模式需手动选择
+    format_func=lambda name: t('sidebar_auto_model') if name == AUTO_MODEL else name,
+    help="自动模式：简单问题交给当前最快的模型，长问题或多部分问题交给能力最强的模型"
 )
 
 with st.sidebar.expander("📊 模型信息", expanded=False):
-    info = MODEL_CONFIG[selected_model]
-    st.write(f"**名称**: {info['name']}")
-    st.write(f"**提供商**: {info['provider']}")
-    st.write(f"**速度**: {info['speed']}")
-    st.write(f"**成本**: {info['cost']}")
+    if selected_model == AUTO_MODEL:
+        st.write("仅在 `.env` 中配置了Key且未熔断的模型中选择")
+        for name, info in MODEL_CONFIG.items():
+            st.write(f"**{name}**: {info['name']}（速度 {info['speed']}，能力排序 {info['quality']}）")
+    else:
+        info = MODEL_CONFIG[selected_model]
+        st.write(f"**名称**: {info['name']}")
+        st.write(f"**提供商**: {info['provider']}")
+        st.write(f"**速度**: {info['speed']}")
+        st.write(f"**成本**: {info['cost']}")
 
 # 从环境变量读取默认密钥（不展示到前端）
 ENV_KEYS = {
@@ -301,14 +265,19 @@ ENV_KEYS = {
 }
 
 # 前端输入为空时，将回退使用 ENV_KEYS，但不在输入框中回显
-if selected_model == "通义千问":
+if selected_model == AUTO_MODEL:
+    # 自动模式可能路由到任一模型，只使用 .env 中的Key；一个都没配置时提示改选具体模型并输入Key
+    api_key_input = ""
+    if not any(ENV_KEYS.values()):
+        st.sidebar.caption(f"⚠️ {t('sidebar_auto_needs_env')}")
+elif selected_model == "通义千问":
     api_key_input = st.sidebar.text_input("通义千问API Key", type="password")
 elif selected_model == "Gemini":
     api_key_input = st.sidebar.text_input("Gemini API Key", type="password")
 else:
     api_key_input = st.sidebar.text_input("HuggingFace Token", type="password")
 
-# 计算最终使用的 Key：前端优先，其次 .env
+# 计算最终使用的 Key：前端优先，其次 .env；自动模式在路由后确定
 effective_api_key = api_key_input or ENV_KEYS.get(selected_model, "")
 
 # 用户信息
@@ -318,72 +287,233 @@ st.sidebar.header(t('sidebar_user_info'))
 citizen_options = [t('citizen'), t('pr'), t('foreigner')]
 marital_options = [t('single'), t('married'), t('divorced')]
 
-citizen = st.sidebar.selectbox(t('sidebar_citizenship'), citizen_options)
-marital_status = st.sidebar.selectbox(t('sidebar_marital_status'), marital_options)
-income = st.sidebar.number_input(t('sidebar_income'), min_value=0, value=5000, step=100)
-children = st.sidebar.number_input(t('sidebar_children'), min_value=0, value=0)
-age = st.sidebar.number_input(t('sidebar_age'), min_value=18, max_value=100, value=30)
+# 放在表单中：修改各项时不触发重跑，点击更新后一次性生效
+with st.sidebar.form("profile_form"):
+    citizen = st.selectbox(t('sidebar_citizenship'), citizen_options)
+    marital_status = st.selectbox(t('sidebar_marital_status'), marital_options)
+    income = st.number_input(t('sidebar_income'), min_value=0, value=5000, step=100)
+    children = st.number_input(t('sidebar_children'), min_value=0, value=0)
+    age = st.number_input(t('sidebar_age'), min_value=18, max_value=100, value=30)
+    st.form_submit_button(t('sidebar_profile_apply'), use_container_width=True)
 
 # 高级设置
 st.sidebar.header(t('sidebar_advanced'))
 use_rag = st.sidebar.checkbox(t('sidebar_enable_rag'), value=True)
+use_streaming = st.sidebar.checkbox(t('sidebar_enable_streaming'), value=True)
+use_progressive = st.sidebar.checkbox(t('sidebar_enable_progressive'), value=True,
+                                      help="立即显示基于政策知识库的标准回答，AI回答在后台生成后替换")
+use_hedging = st.sidebar.checkbox(t('sidebar_enable_hedging'), value=False,
+                                  help="主模型响应过慢时，向另一个已配置Key的模型发送同一问题，采用先返回的回答")
 
 # 模型统计
 if 'model_stats' not in st.session_state:
     st.session_state.model_stats = {
-        "通义千问": {"calls": 0, "total_time": 0, "errors": 0},
-        "Gemini": {"calls": 0, "total_time": 0, "errors": 0},
-        "Llama-3": {"calls": 0, "total_time": 0, "errors": 0}
+        "通义千问": {"calls": 0, "total_time": 0, "errors": 0, "stream_calls": 0, "total_ttft": 0, "hedge_wins": 0, "failovers": 0, "cache_hits": 0, "rate_limited": 0, "rejected": 0},
+        "Gemini": {"calls": 0, "total_time": 0, "errors": 0, "stream_calls": 0, "total_ttft": 0, "hedge_wins": 0, "failovers": 0, "cache_hits": 0, "rate_limited": 0, "rejected": 0},
+        "Llama-3": {"calls": 0, "total_time": 0, "errors": 0, "stream_calls": 0, "total_ttft": 0, "hedge_wins": 0, "failovers": 0, "cache_hits": 0, "rate_limited": 0, "rejected": 0}
     }
 
 with st.sidebar.expander("📈 模型性能统计", expanded=False):
+    # 全局视图：本进程所有会话的指标
+    st.caption("全局（本进程所有会话）")
+    global_metrics = get_metrics_registry().snapshot()
+    for model_name, m in global_metrics['providers'].items():
+        st.write(f"**{model_name}**")
+        st.write(f"  • 调用次数: {m['calls']}")
+        if m['calls'] > 0:
+            st.write(f"  • 延迟 P50/P95/P99: {m['p50']:.2f} / {m['p95']:.2f} / {m['p99']:.2f}秒")
+        if m['ttfb_p50'] is not None:
+            st.write(f"  • 首字节 P50: {m['ttfb_p50']:.2f}秒")
+        st.write(f"  • Token（估算）: 输入 {m['prompt_tokens']:,} / 输出 {m['completion_tokens']:,}")
+        if m['errors']:
+            st.write("  • 错误: " + ", ".join(f"{cls} {n}" for cls, n in m['errors'].items()))
+        if m['rejected']:
+            st.write(f"  • 熔断拒绝: {m['rejected']}")
+        st.write("---")
+    for cache_name, c in global_metrics['cache'].items():
+        st.write(f"💾 {cache_name} 命中率: {c['hit_ratio']:.0%} ({c['hits']}/{c['hits'] + c['misses']})")
+    template_stats = get_template_cache().stats()
+    if template_stats['hits'] + template_stats['misses']:
+        st.write(f"📄 模板回答缓存命中率: {template_stats['hit_ratio']:.0%} "
+                 f"({template_stats['entries']}/{template_stats['max_entries']} 条, 失效 {template_stats['invalidations']} 次)")
+    if global_metrics['context']['requests']:
+        st.write(f"🗜️ 上下文压缩: 共节省 {global_metrics['context']['saved_tokens']:,} tokens "
+                 f"({global_metrics['context']['saved_ratio']:.0%})")
+    if global_metrics['degraded']:
+        st.write("⏱️ 预算降级: " + ", ".join(f"{stage} {n}" for stage, n in global_metrics['degraded'].items()))
+    
+    # 自动路由：各模型EWMA延迟和最近的路由决策
+    router = get_model_router()
+    st.write("🧭 EWMA延迟: " + ", ".join(f"{name} {r['ewma']:.2f}s" + ("" if r['samples'] else "（预估）")
+                                       for name, r in router.snapshot().items()))
+    for decision in router.decisions(limit=5):
+        st.write(f"  • {datetime.fromtimestamp(decision.at):%H:%M:%S} {'+'.join(decision.intents)} → **{decision.model}** "
+                 f"({decision.complexity}{': ' + ', '.join(decision.reasons) if decision.reasons else ''})")
+    
+    # 限流与熔断状态为进程级，所有会话共享
+    for model_name, limiter_state in get_limiter_registry().snapshot().items():
+        if limiter_state['in_flight'] or limiter_state['queue_depth'] or limiter_state['rejected']:
+            st.write(f"🚦 **{model_name}** 并发 {limiter_state['in_flight']}/{limiter_state['max_concurrency']}, "
+                     f"排队 {limiter_state['queue_depth']} (峰值 {limiter_state['max_queue_depth']}), "
+                     f"拒绝 {limiter_state['rejected']}")
+    for model_name, breaker_state in get_breaker_registry().snapshot().items():
+        if breaker_state['state'] != 'closed':
+            st.write(f"🔌 **{model_name}** 熔断状态: {breaker_state['state']} "
+                     f"(错误率 {breaker_state['error_rate']:.0%}, 超时率 {breaker_state['timeout_rate']:.0%})")
+    
+    st.caption("本会话")
+    if 'last_context_savings' in st.session_state:
+        savings = st.session_state.last_context_savings
+        st.write(f"🗜️ 上次请求上下文: {savings['rich_tokens']} → {savings['compact_tokens']} tokens "
+                 f"(节省 {savings['saved_ratio']:.0%})")
+    if 'last_budget_report' in st.session_state:
+        report = st.session_state.last_budget_report
+        st.write(f"⏱️ 上次请求耗时: {report['elapsed']:.2f} / {report['budget']:.0f}秒 ("
+                 + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in report['stages'].items()) + ")")
+        if report['degraded']:
+            st.write("  • 已降级: " + ", ".join(f"{stage}({reason})" for stage, reason in report['degraded'].items()))
     for model_name, stats in st.session_state.model_stats.items():
+        if stats['cache_hits'] > 0:
+            st.write(f"**{model_name}** 缓存命中: {stats['cache_hits']}次")
+        if stats['rejected'] > 0:
+            st.write(f"**{model_name}** 熔断拒绝: {stats['rejected']}次")
         if stats['calls'] > 0:
             avg_time = stats['total_time'] / stats['calls']
             st.write(f"**{model_name}**")
             st.write(f"  • 调用次数: {stats['calls']}")
             st.write(f"  • 平均响应: {avg_time:.2f}秒")
+            if stats['stream_calls'] > 0:
+                st.write(f"  • 平均首字延迟: {stats['total_ttft'] / stats['stream_calls']:.2f}秒")
             st.write(f"  • 错误次数: {stats['errors']}")
+            if stats['hedge_wins'] > 0:
+                st.write(f"  • 对冲胜出次数: {stats['hedge_wins']}")
+            if stats['failovers'] > 0:
+                st.write(f"  • 故障切换接管次数: {stats['failovers']}")
+            if stats['rate_limited'] > 0:
+                st.write(f"  • 限流排队超时: {stats['rate_limited']}次")
             st.write("---")
 
+# 启动与内存诊断：首次导入各模块的耗时（重量级依赖在首次进入对应页面时才出现）和会话内存占用
+with st.sidebar.expander("🩺 启动与内存诊断", expanded=False):
+    st.write("依赖: " + ", ".join(f"{name} {'✅' if ok else '❌'}" for name, ok in [
+        ("RAG", RAG_AVAILABLE), ("时间线", TIMELINE_AVAILABLE), ("推荐", REC_AVAILABLE), ("翻译", TRANSLATION_AVAILABLE)]))
+    for module_name, ms in import_report():
+        st.write(f"  • {module_name}: {ms:,.0f} ms")
+    
+    # 子系统加载状态（与就绪检查 /ready 相同）
+    readiness = get_readiness().snapshot()
+    st.write(f"🚦 就绪: {'✅' if readiness['ready'] else ('❌ 加载失败' if readiness['failed'] else '⏳ 预热中')}"
+             + ("，使用预构建产物" if get_artifact_manifest() else "，未找到预构建产物"))
+    for name, sub in readiness['subsystems'].items():
+        st.write(f"  • {name}: {sub['state']}"
+                 + (f"（{sub['source']}" + (f", {sub['seconds']:.1f}s" if 'seconds' in sub else "") + "）" if 'source' in sub else ""))
+    
+    # 只读数据进程内一份；会话状态应只随用户自己的对话增长
+    st.write(f"💾 进程内存: {format_bytes(process_rss())}")
+    # 展开器内的代码每次重跑都会执行，遍历会话状态的耗时随聊天记录增长，只在勾选后统计
+    if st.checkbox("统计会话内存", key="diag_session_memory", help="遍历本会话状态估算大小，聊天记录较长时较慢"):
+        session_sizes = record_session_memory()
+        memory = get_session_memory_report().summary()
+        st.write("  • 共享只读数据: "
+                 + ", ".join(f"{name} {format_bytes(size)}" for name, size in get_shared_memory_sizes().items()))
+        st.write(f"👥 已统计会话 {memory['sessions']} 个，会话状态合计 {format_bytes(memory['total'])}"
+                 f"（平均 {format_bytes(memory['mean'])}，最大 {format_bytes(memory['max'])}）")
+        if memory['top_keys']:
+            st.write("  • 平均占用最多: " + ", ".join(f"{key} {format_bytes(size)}" for key, size in memory['top_keys']))
+        st.write(f"  • 本会话: {format_bytes(sum(session_sizes.values()))}")
+    
+    # 各区块耗时：整页运行 vs 区块内交互触发的局部重跑
+    for section, r in get_metrics_registry().snapshot()['render'].items():
+        st.write(f"🖼️ {section}: P50 {r['p50'] * 1000:.0f}ms / P95 {r['p95'] * 1000:.0f}ms "
+                 f"（整页 {r['app_runs']} 次，局部 {r['fragment_runs']} 次）")
+
 # 辅助函数
+# 汇率：进程内缓存 + 后台刷新 + 磁盘持久化，问答和计算页面读取汇率时从不等待网络
+EXCHANGE_RATE_URL = os.getenv("EXCHANGE_RATE_URL", "https://api.exchangerate-api.com/v4/latest/SGD")
+EXCHANGE_RATE_TTL = float(os.getenv("EXCHANGE_RATE_TTL", "3600"))
+EXCHANGE_RATE_PATH = os.getenv("EXCHANGE_RATE_PATH", "exchange_rates.json")
+
+@st.cache_resource
+def get_rate_provider():
+    """进程级共享的汇率提供方（启动后台刷新线程）"""
+    provider = ExchangeRateProvider(EXCHANGE_RATE_URL, ttl=EXCHANGE_RATE_TTL, path=EXCHANGE_RATE_PATH)
+    provider.start()
+    return provider
+
 def get_exchange_rate():
-    """获取实时汇率"""
-    try:
-        r = requests.get('https://api.exchangerate-api.com/v4/latest/SGD', timeout=5)
-        if r.status_code == 200:
-            data = r.json()
-            return {
-                'USD': data['rates'].get('USD', 0.74),
-                'CNY': data['rates'].get('CNY', 5.3),
-                'MYR': data['rates'].get('MYR', 3.3)
-            }
-    except:
-        pass
-    return {'USD': 0.74, 'CNY': 5.3, 'MYR': 3.3}
+    """获取汇率（缓存值，过期时后台刷新）"""
+    return get_rate_provider().get()
+
+def match_canned_answer(query_embedding):
+    """匹配预构建的标准问题答案，未命中返回None"""
+    if query_embedding is None:
+        return None
+    canned_index = get_canned_index()
+    if canned_index is None:
+        return None
+    match = canned_index.match(query_embedding, st.session_state.language)
+    get_metrics_registry().record_cache('canned_answer', hit=match is not None)
+    return match
+
+@st.cache_resource
+def get_intent_classifier():
+    """进程级共享的意图分类器（关键词表编译为一个正则）"""
+    return IntentClassifier(INTENT_KEYWORDS)
 
 def detect_intent(question):
-    """意图识别"""
-    q = question.lower()
-    if any(word in q for word in ['生育', '津贴', 'baby', '孩子', '怀孕', 'maternity', 'paternity', 'bonus', 'bayi']):
-        return 'fertility'
-    elif any(word in q for word in ['住房', 'bto', 'hdb', '房子', 'housing', 'perumahan']):
-        return 'housing'  
-    elif any(word in q for word in ['结婚', '婚姻', 'rom', 'marriage', 'perkahwinan']):
-        return 'marriage'
-    elif any(word in q for word in ['医疗', '健康', '产检', 'health', 'pregnancy', 'kesihatan']):
-        return 'healthcare'
-    elif any(word in q for word in ['教育', '幼儿园', '学校', 'education', 'kindergarten', 'pendidikan']):
-        return 'education'
-    return 'general'
+    """意图识别：得分最高的意图"""
+    return get_intent_classifier().primary(question)
+
+def detect_intents(question, query_embedding=None):
+    """
+    多标签意图识别，主意图在前；未识别时为 ['general']
+
+    有查询向量且向量分类器可用时按最近质心分类（能识别换一种说法的问题），
+    关键词命中的具体意图作为补充；向量分类器不可用或无法判断时只用关键词
+    """
+    keyword_intents = get_intent_classifier().intents_of(question)
+    if query_embedding is None:
+        return keyword_intents
+    classifier = get_embedding_intent_classifier()
+    if classifier is None:
+        return keyword_intents
+    
+    embedding_intents = [intent for intent, _ in classifier.classify(query_embedding)]
+    if not embedding_intents:
+        return keyword_intents
+    specific = [intent for intent in keyword_intents if intent != 'general']
+    if embedding_intents[0] == 'general':
+        # 关键词精确度高：向量判为寒暄但命中了政策关键词时以关键词为准
+        return specific or ['general']
+    return ([intent for intent in embedding_intents if intent != 'general']
+            + [intent for intent in specific if intent not in embedding_intents])
+
+# 模板回答缓存：回答只取决于意图和少数归一化的用户信息，所有会话共享；知识库或汇率版本变化时整体失效
+INCOME_SLOT = "\x00income\x00"  # 住房回答按收入档缓存，展示的具体收入在取出后填入
+
+def template_key(intent, citizen_status, income, kids):
+    """缓存键：只包含该意图的回答实际用到的输入"""
+    if intent == 'fertility':
+        return (intent, citizen_status, kids)
+    if intent == 'housing':
+        return (intent, citizen_status, income <= POLICY_KB['housing']['bto_requirements']['income_ceiling']['3room_to_5room'])
+    return (intent,)
 
 def generate_response(question, intent, user_info):
-    """生成政策回答"""
-    rates = get_exchange_rate()
+    """生成政策回答（命中缓存时不重新渲染）"""
     citizen_status = t('citizen') in user_info.get('citizen', '')
     income = user_info.get('income', 0)
     kids = user_info.get('children', 0)
     
+    rate_provider = get_rate_provider()
+    cache = get_template_cache()
+    cache.ensure_generation((get_policy_kb_version(), rate_provider.version))
+    answer = cache.get_or_render(template_key(intent, citizen_status, income, kids),
+                                 lambda: render_template(intent, citizen_status, income, kids, rate_provider.get()))
+    return answer.replace(INCOME_SLOT, f"{income:,}")
+
+def render_template(intent, citizen_status, income, kids, rates):
+    """按知识库渲染政策回答；住房回答中的收入以 INCOME_SLOT 占位"""
     if intent == 'fertility':
         data = POLICY_KB['fertility']['baby_bonus']
         n = kids + 1
@@ -433,7 +563,7 @@ def generate_response(question, intent, user_info):
   • 4房式: S${data['price_ranges']['4room'][0]:,} - S${data['price_ranges']['4room'][1]:,}
 
 ✅ **资格检查**:
-  • 收入: {'✅' if income_ok else '❌'} (S${income:,} vs 上限S$14,000)
+  • 收入: {'✅' if income_ok else '❌'} (S${INCOME_SLOT} vs 上限S$14,000)
   • 公民身份: {'✅' if citizen_ok else '❌'}
 
 💸 **可用津贴**:
@@ -493,124 +623,752 @@ def generate_response(question, intent, user_info):
     
     return "我正在学习更多政策知识，请尝试询问生育津贴、住房申请、结婚注册、医疗或教育相关问题。"
 
+def generate_multi_response(question, intents, user_info):
+    """多意图问题：按意图得分顺序拼接各政策的回答"""
+    return "\n\n".join(generate_response(question, intent, user_info).strip() for intent in intents)
+
+# HTTP连接池配置（可通过环境变量调整；重试仅针对连接失败和429/5xx，读超时不重试）
+HTTP_POOL_SIZE = int(os.getenv("LLM_HTTP_POOL_SIZE", "20"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "30"))
+HTTP_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+HTTP_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", "0.5"))
+HTTP_RETRY_BACKOFF_MAX = float(os.getenv("LLM_RETRY_BACKOFF_MAX", "4"))
+
 # LLM调用函数
-def call_qwen_api(question, context, api_key):
-    """调用通义千问API"""
-    if not api_key:
-        return t('error_no_api_key')
-        
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
+# 各模型的接口地址可指向本地模拟服务（mock_llm_server.py）做离线压测
+QWEN_BASE_URL = os.getenv("QWEN_BASE_URL", "https://dashscope.aliyuncs.com/compatible-mode/v1")
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "")  # 留空使用Google官方SDK
+LLAMA_BASE_URL = os.getenv("LLAMA_BASE_URL", "")    # 留空使用HuggingFace推理API
+
+# Gemini/HuggingFace客户端按Key复用，超出上限时淘汰最久未用的条目
+GEMINI_MODEL_NAME = "gemini-1.5-flash"
+LLAMA_MODEL_ID = "meta-llama/Meta-Llama-3-8B-Instruct"
+LLM_CLIENT_CACHE_SIZE = int(os.getenv("LLM_CLIENT_CACHE_SIZE", "16"))
+
+@st.cache_resource
+def get_llm_runtime():
+    """
+    进程级共享的异步LLM运行时：一个后台事件循环 + 各模型的异步提供方，
+    所有会话的请求在同一个事件循环上并发执行，共享连接池
+    """
+    http_options = {
+        'connect_timeout': HTTP_CONNECT_TIMEOUT,
+        'read_timeout': HTTP_READ_TIMEOUT,
+        'max_connections': HTTP_POOL_SIZE,
+        'max_retries': HTTP_MAX_RETRIES,
+        'backoff': HTTP_RETRY_BACKOFF,
+        'backoff_max': HTTP_RETRY_BACKOFF_MAX
     }
-    
-    data = {
-        "model": "qwen-max",
-        "messages": [
-            {"role": "system", "content": "你是BabyBloomSG，新加坡家庭政策专业AI助手。请基于提供的政策信息，用中文回答用户问题，语调温暖专业，使用emoji。"},
-            {"role": "user", "content": f"政策背景信息：{context}\n\n用户问题：{question}"}
-        ]
+    providers = {
+        "通义千问": OpenAICompatibleProvider("通义千问", QWEN_BASE_URL, QWEN_MODEL_ID, **http_options),
+        "Gemini": GeminiProvider(GEMINI_MODEL_NAME, GEMINI_BASE_URL, cache_size=LLM_CLIENT_CACHE_SIZE,
+                                 **http_options),
+        "Llama-3": HFInferenceProvider(LLAMA_MODEL_ID, LLAMA_BASE_URL, read_timeout=HTTP_READ_TIMEOUT,
+                                       cache_size=LLM_CLIENT_CACHE_SIZE),
     }
-    
-    try:
-        response = requests.post(
-            "https://dashscope.aliyuncs.com/compatible-mode/v1/chat/completions",
-            headers=headers,
-            json=data,
-            timeout=30
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            return result['choices'][0]['message']['content']
-        else:
-            return f"API调用失败: {response.status_code}"
-            
-    except Exception as e:
-        return f"网络错误: {str(e)}"
+    return AsyncBridge(), providers
 
-def call_gemini_api(question, context, api_key):
-    """调用Gemini API"""
-    if not GEMINI_AVAILABLE:
-        return "❌ Gemini库未安装"
-    
-    if not api_key:
-        return t('error_no_api_key')
-    
-    try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
-        prompt = f"""你是BabyBloomSG，新加坡家庭政策专业AI助手。
+def get_provider(model_type):
+    """获取模型的异步提供方"""
+    return get_llm_runtime()[1][model_type]
+
+def run_provider(model_type, prompt, api_key, deadline=None):
+    """同步桥接：等待提供方返回完整回答；deadline（time.monotonic()）到期时取消请求并抛出超时"""
+    bridge, providers = get_llm_runtime()
+    timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+    return bridge.run(providers[model_type].complete(prompt, api_key), timeout)
+
+def iterate_provider(model_type, prompt, api_key, deadline=None, cancel=None):
+    """同步桥接：逐段返回提供方的流式输出，提前关闭、cancel 被设置或 deadline 到期仍未收到首个分片时取消请求"""
+    bridge, providers = get_llm_runtime()
+    return bridge.iterate(providers[model_type].stream(prompt, api_key), deadline=deadline, cancel=cancel)
+
+# 各模型的提示词（同时作为回答缓存键的一部分，修改后旧缓存自然失效）
+QWEN_MODEL_ID = "qwen-max"
+QWEN_SYSTEM_PROMPT = "你是BabyBloomSG，新加坡家庭政策专业AI助手。请基于提供的政策信息，用中文回答用户问题，语调温暖专业，使用emoji。"
+
+GEMINI_PROMPT_TEMPLATE = """你是BabyBloomSG，新加坡家庭政策专业AI助手。
 
 政策背景信息：
 {context}
-
+{history}
 用户问题：{question}
 
 请基于上述政策信息，用中文回答用户问题。语调温暖专业，适当使用emoji。"""
-        
-        response = model.generate_content(prompt)
-        return response.text
-        
-    except Exception as e:
-        return f"Gemini调用错误: {str(e)}"
 
-def call_llama_api(question, context, hf_token):
-    """调用Llama-3"""
-    if not HF_AVAILABLE:
-        return "❌ HuggingFace库未安装"
-    
-    if not hf_token:
-        return t('error_no_api_key')
-    
-    try:
-        client = InferenceClient(token=hf_token)
-        
-        prompt = f"""You are BabyBloomSG, a professional AI assistant for Singapore family policies.
+LLAMA_PROMPT_TEMPLATE = """You are BabyBloomSG, a professional AI assistant for Singapore family policies.
 
 Policy Information:
 {context}
-
+{history}
 User Question: {question}
 
 Please answer in Chinese based on the policy information above. Be warm and professional."""
-        
-        response = client.text_generation(
-            prompt,
-            model="meta-llama/Meta-Llama-3-8B-Instruct",
-            max_new_tokens=500,
-            temperature=0.7
+
+MODEL_IDS = {
+    "通义千问": QWEN_MODEL_ID,
+    "Gemini": GEMINI_MODEL_NAME,
+    "Llama-3": LLAMA_MODEL_ID,
+}
+
+SYSTEM_PROMPTS = {
+    "通义千问": QWEN_SYSTEM_PROMPT,
+    "Gemini": GEMINI_PROMPT_TEMPLATE,
+    "Llama-3": LLAMA_PROMPT_TEMPLATE,
+}
+
+def build_qwen_messages(question, context, history=None):
+    """构造通义千问消息列表；对话历史作为多轮消息发送，早前摘要并入系统提示词"""
+    system_prompt = QWEN_SYSTEM_PROMPT
+    turns = []
+    for message in history or []:
+        if message["role"] == "system":
+            system_prompt += f"\n\n{message['content']}"
+        else:
+            turns.append(message)
+    
+    return [
+        {"role": "system", "content": system_prompt},
+        *turns,
+        {"role": "user", "content": f"政策背景信息：{context}\n\n用户问题：{question}"}
+    ]
+
+def build_gemini_prompt(question, context, history=None):
+    """构造Gemini提示词"""
+    history_text = f"\n此前的对话：\n{render_history(history)}\n" if history else ""
+    return GEMINI_PROMPT_TEMPLATE.format(context=context, history=history_text, question=question)
+
+def build_llama_prompt(question, context, history=None):
+    """构造Llama-3提示词"""
+    history_text = f"\nConversation so far:\n{render_history(history)}\n" if history else ""
+    return LLAMA_PROMPT_TEMPLATE.format(context=context, history=history_text, question=question)
+
+# 多轮对话：最近几轮原文 + 更早轮次的滚动摘要，按各模型的 history_tokens 预算裁剪
+CONVERSATION_MAX_TURNS = int(os.getenv("CONVERSATION_MAX_TURNS", "3"))
+CONVERSATION_SUMMARY_TOKENS = int(os.getenv("CONVERSATION_SUMMARY_TOKENS", "300"))
+
+def get_conversation():
+    """当前会话的对话窗口"""
+    if 'conversation' not in st.session_state:
+        st.session_state.conversation = ConversationWindow(
+            max_turns=CONVERSATION_MAX_TURNS, summary_tokens=CONVERSATION_SUMMARY_TOKENS
         )
-        
-        return response
-        
+    return st.session_state.conversation
+
+def history_for(model_type, conversation):
+    """按模型的token预算取出要发送的对话历史（消息列表）"""
+    if conversation is None:
+        return []
+    return conversation.to_messages(MODEL_CONFIG[model_type].get("history_tokens", 1000))
+
+# LLM回答缓存（SQLite，多进程共享），知识库变化时自动失效
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3")
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+
+@st.cache_resource
+def get_response_cache():
+    """进程级共享的回答缓存，初始化失败时返回None（不影响正常调用）"""
+    if not LLM_CACHE_ENABLED:
+        return None
+    try:
+        return ResponseCache(LLM_CACHE_PATH, get_kb_version(POLICY_KB),
+                             ttl_seconds=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES)
     except Exception as e:
-        return f"Llama-3调用错误: {str(e)}"
+        print(f"回答缓存初始化失败: {e}")
+        return None
+
+def cache_key_for(model_type, question, context, history=None):
+    """生成模型回答的缓存键"""
+    return make_cache_key(model_type, MODEL_IDS[model_type], SYSTEM_PROMPTS[model_type], context, question,
+                          history=render_history(history or []))
+
+def get_cached_response(model_type, question, context, history=None):
+    """读取缓存的回答，未命中返回None"""
+    cache = get_response_cache()
+    if cache is None:
+        return None
+    try:
+        cached = cache.get(cache_key_for(model_type, question, context, history))
+    except sqlite3.Error:
+        return None
+    get_metrics_registry().record_cache('llm_response', hit=cached is not None)
+    return cached
+
+def store_cached_response(model_type, question, context, response, history=None):
+    """写入回答缓存"""
+    cache = get_response_cache()
+    if cache is None or not response:
+        return
+    try:
+        cache.set(cache_key_for(model_type, question, context, history), model_type, response)
+    except sqlite3.Error as e:
+        print(f"回答缓存写入失败: {e}")
+
+class ProviderUnavailableError(LLMAPIError):
+    """模型熔断中，暂不接受请求"""
+
+def is_timeout_error(error):
+    """判断异常是否为超时（httpx超时、Gemini DeadlineExceeded等）"""
+    if isinstance(error, TimeoutError):
+        return True
+    name = type(error).__name__
+    return 'Timeout' in name or 'DeadlineExceeded' in name
+
+def classify_error(error):
+    """错误类型，用作指标标签"""
+    if isinstance(error, BudgetExceeded):
+        return 'budget'
+    if isinstance(error, RateLimitExceeded):
+        return 'rate_limited'
+    if is_timeout_error(error):
+        return 'timeout'
+    if isinstance(error, LLMAPIError):
+        return 'api_error'
+    return type(error).__name__
+
+def record_llm_success(model_type, question, context, response, elapsed, ttfb=None, history=None):
+    """记录一次成功调用到进程级指标"""
+    get_metrics_registry().observe_call(
+        model_type,
+        elapsed,
+        prompt_tokens=(estimate_tokens(SYSTEM_PROMPTS[model_type]) + estimate_tokens(context)
+                       + estimate_tokens(question) + estimate_tokens(render_history(history or []))),
+        completion_tokens=estimate_tokens(response),
+        ttfb=ttfb
+    )
+    get_model_router().observe(model_type, elapsed)
+
+def record_llm_error(model_type, error):
+    """记录一次失败调用到进程级指标"""
+    get_metrics_registry().record_error(model_type, classify_error(error))
+
+def record_llm_rejected(model_type):
+    """
+    记录一次被熔断器拒绝的请求（熔断中，或半开状态的试探名额已被其他请求占用）
+
+    请求没有发出，不计入错误，避免抬高模型的错误率
+    """
+    get_metrics_registry().record_rejected(model_type)
+    st.session_state.model_stats[model_type]["rejected"] += 1
+
+# 延迟预算：剩余时间低于此值时不再发起LLM请求，直接回退到模板回答
+LLM_MIN_BUDGET = float(os.getenv("LLM_MIN_BUDGET", "1.0"))
+
+def budget_deadline(budget):
+    """预算的截止时间（time.monotonic()），无预算时为None"""
+    return None if budget is None else budget.deadline
+
+def queue_timeout(limiter, budget):
+    """限流排队时间不超过剩余预算"""
+    return None if budget is None else budget.timeout(cap=limiter.queue_timeout)
+
+def record_provider_failure(model_type, breaker, error, budget=None):
+    """
+    记录一次模型调用失败；因本次请求的预算耗尽而超时不代表模型不健康，不计入熔断统计
+
+    Returns:
+        预算耗尽时为 BudgetExceeded，否则为原异常
+    """
+    if budget is not None and budget.expired() and is_timeout_error(error):
+        breaker.record_ignored()
+        error = BudgetExceeded(f"{model_type} 超出延迟预算")
+    else:
+        breaker.record_failure(timeout=is_timeout_error(error))
+    record_llm_error(model_type, error)
+    return error
+
+def call_qwen_api(question, context, api_key, history=None, deadline=None):
+    """调用通义千问API，失败时抛出异常"""
+    return run_provider("通义千问", build_qwen_messages(question, context, history), api_key, deadline)
+
+def call_gemini_api(question, context, api_key, history=None, deadline=None):
+    """调用Gemini API，失败时抛出异常"""
+    return run_provider("Gemini", build_gemini_prompt(question, context, history), api_key, deadline)
+
+def call_llama_api(question, context, hf_token, history=None, deadline=None):
+    """调用Llama-3，失败时抛出异常"""
+    return run_provider("Llama-3", build_llama_prompt(question, context, history), hf_token, deadline)
+
+# 流式LLM调用函数：逐段yield文本，供聊天页面增量渲染，失败时抛出异常
+def qwen_chunks(question, context, api_key, history=None, deadline=None, cancel=None):
+    """通义千问SSE流（OpenAI兼容接口）"""
+    return iterate_provider("通义千问", build_qwen_messages(question, context, history), api_key, deadline, cancel)
+
+def gemini_chunks(question, context, api_key, history=None, deadline=None, cancel=None):
+    """Gemini流式输出"""
+    return iterate_provider("Gemini", build_gemini_prompt(question, context, history), api_key, deadline, cancel)
+
+def llama_chunks(question, context, hf_token, history=None, deadline=None, cancel=None):
+    """Llama-3流式输出"""
+    return iterate_provider("Llama-3", build_llama_prompt(question, context, history), hf_token, deadline, cancel)
+
+PROVIDER_CALLS = {
+    "通义千问": call_qwen_api,
+    "Gemini": call_gemini_api,
+    "Llama-3": call_llama_api,
+}
 
-def call_llm_api(question, context, model_type, api_key):
-    """统一LLM调用"""
-    start_time = time.time()
+PROVIDER_CHUNKS = {
+    "通义千问": qwen_chunks,
+    "Gemini": gemini_chunks,
+    "Llama-3": llama_chunks,
+}
+
+def provider_available(model_type):
+    """模型对应的客户端库是否可用"""
+    return model_type in PROVIDER_CALLS and get_provider(model_type).available()
+
+def get_failover_chain(model_type, api_key):
+    """故障切换顺序：所选模型在前，其余按 MODEL_CONFIG 顺序，仅包含已配置Key且SDK可用的模型"""
+    chain = []
+    if api_key and provider_available(model_type):
+        chain.append((model_type, api_key))
+    for name in MODEL_CONFIG:
+        if name != model_type and ENV_KEYS.get(name) and provider_available(name):
+            chain.append((name, ENV_KEYS[name]))
+    return chain
+
+# 自动路由的候选模型需要 ENV_KEYS 和熔断状态，决策同时记入进程级指标
+def route_question(question, intents):
+    """自动模式：在已配置Key、依赖可用且未熔断的模型中选择，没有可用模型时返回None"""
+    candidates = [name for name in MODEL_CONFIG
+                  if ENV_KEYS.get(name) and provider_available(name) and get_breaker(name).is_available()]
+    decision = get_model_router().route(question, intents, candidates)
+    if decision is not None:
+        get_metrics_registry().record_route(decision.model, decision.complexity)
+    return decision
+
+def call_provider(model_type, question, context, api_key, history=None, budget=None):
+    """经熔断器和限流器调用单个模型；排队超时抛出 RateLimitExceeded，预算耗尽抛出 BudgetExceeded"""
+    breaker = get_breaker(model_type)
+    if not breaker.allow_request():
+        raise ProviderUnavailableError(f"{model_type} 熔断中")
     
+    limiter = get_limiter(model_type)
+    if not limiter.acquire(queue_timeout(limiter, budget)):
+        breaker.record_ignored()
+        error = RateLimitExceeded(f"{model_type} 排队超时")
+        record_llm_error(model_type, error)
+        raise error
+    
+    start_time = time.time()
     try:
-        if model_type == "通义千问":
-            response = call_qwen_api(question, context, api_key)
-        elif model_type == "Gemini":
-            response = call_gemini_api(question, context, api_key)
-        elif model_type == "Llama-3":
-            response = call_llama_api(question, context, api_key)
-        else:
-            response = "未知模型类型"
+        response = PROVIDER_CALLS[model_type](question, context, api_key, history, budget_deadline(budget))
+    except Exception as e:
+        error = record_provider_failure(model_type, breaker, e, budget)
+        if error is not e:
+            raise error from e
+        raise
+    finally:
+        limiter.release()
+    
+    breaker.record_success()
+    record_llm_success(model_type, question, context, response, time.time() - start_time, history=history)
+    return response
+
+def call_llm_api(question, context, model_type, api_key, hedge=False, fallback=None, conversation=None,
+                 budget=None):
+    """
+    统一LLM调用：所选模型失败或熔断时切换到下一个健康模型，
+    全部不可用或延迟预算耗尽时返回模板回答（fallback）
+    
+    Args:
+        hedge: 是否启用对冲请求
+        fallback: 所有模型都不可用时返回的模板回答，为空时抛出 LLMAPIError
+        conversation: 对话窗口，按各模型的token预算附带对话历史
+        budget: 本次请求的延迟预算（LatencyBudget）
+    """
+    errors = []
+    
+    for name, key in get_failover_chain(model_type, api_key):
+        history = history_for(name, conversation)
+        cached = get_cached_response(name, question, context, history)
+        if cached is not None:
+            st.session_state.model_stats[name]["cache_hits"] += 1
+            return cached
+        
+        if budget is not None and not budget.allows(LLM_MIN_BUDGET):
+            budget.degrade('llm', 'budget')
+            errors.append(f"{name}: 超出延迟预算")
+            break
+        
+        if not get_breaker(name).is_available():
+            record_llm_rejected(name)
+            errors.append(f"{name}: 熔断中")
+            continue
+        
+        start_time = time.time()
+        try:
+            if hedge:
+                answered_by, response = call_llm_hedged(question, context, name, key, conversation, budget)
+            else:
+                answered_by, response = name, call_provider(name, question, context, key, history, budget)
+        except BudgetExceeded as e:
+            budget.degrade('llm', 'budget')
+            errors.append(str(e))
+            break
+        except RateLimitExceeded as e:
+            st.session_state.model_stats[name]["rate_limited"] += 1
+            errors.append(str(e))
+            continue
+        except ProviderUnavailableError as e:
+            record_llm_rejected(name)
+            errors.append(f"{name}: {e}")
+            continue
+        except Exception as e:
+            st.session_state.model_stats[name]["errors"] += 1
+            errors.append(f"{name}: {e}")
+            continue
         
         elapsed_time = time.time() - start_time
-        st.session_state.model_stats[model_type]["calls"] += 1
-        st.session_state.model_stats[model_type]["total_time"] += elapsed_time
+        record_latency(answered_by, elapsed_time)
+        store_cached_response(answered_by, question, context, response, history_for(answered_by, conversation))
+        
+        stats = st.session_state.model_stats[name]
+        stats["calls"] += 1
+        stats["total_time"] += elapsed_time
+        if answered_by != name:
+            st.session_state.model_stats[answered_by]["hedge_wins"] += 1
+        if name != model_type:
+            stats["failovers"] += 1
         
         return response
+    
+    if fallback is None:
+        raise LLMAPIError("; ".join(errors) or "没有可用的模型")
+    return f"⚠️ {t('chat_llm_fallback')}\n\n{fallback}"
+
+def stream_llm_api(question, context, model_type, api_key, fallback=None, conversation=None, budget=None,
+                   outcome=None):
+    """
+    统一流式LLM调用，记录首字延迟（TTFT）和总耗时；
+    首个分片返回前失败时切换到下一个健康模型，全部不可用或延迟预算耗尽时输出模板回答
+
+    延迟预算只约束首字延迟：首个分片到达前预算耗尽时回退到模板回答；开始输出后不再按预算截断，
+    避免用户看到半句话。已输出部分后中断时追加中断提示，并设置 outcome['interrupted']，
+    调用方不应把不完整的回答写入对话历史
+
+    Args:
+        outcome: 可选的结果字典，流式输出中途中断时写入 'interrupted': True
+    """
+    for name, key in get_failover_chain(model_type, api_key):
+        history = history_for(name, conversation)
+        cached = get_cached_response(name, question, context, history)
+        if cached is not None:
+            st.session_state.model_stats[name]["cache_hits"] += 1
+            yield cached
+            return
+        
+        if budget is not None and not budget.allows(LLM_MIN_BUDGET):
+            budget.degrade('llm', 'budget')
+            break
+        
+        breaker = get_breaker(name)
+        if not breaker.allow_request():
+            record_llm_rejected(name)
+            continue
         
+        limiter = get_limiter(name)
+        if not limiter.acquire(queue_timeout(limiter, budget)):
+            breaker.record_ignored()
+            record_llm_error(name, RateLimitExceeded(name))
+            st.session_state.model_stats[name]["rate_limited"] += 1
+            continue
+        
+        start_time = time.time()
+        first_token_time = None
+        parts = []
+        chunks = PROVIDER_CHUNKS[name](question, context, key, history, budget_deadline(budget))
+        try:
+            for chunk in chunks:
+                if first_token_time is None:
+                    first_token_time = time.time()
+                parts.append(chunk)
+                yield chunk
+        except GeneratorExit:
+            breaker.record_ignored()
+            raise
+        except Exception as e:
+            error = record_provider_failure(name, breaker, e, budget)
+            st.session_state.model_stats[name]["errors"] += 1
+            if first_token_time is not None:
+                # 已输出部分内容，无法无缝切换
+                if budget is not None:
+                    budget.degrade('llm', 'budget' if isinstance(error, BudgetExceeded) else 'interrupted')
+                if outcome is not None:
+                    outcome['interrupted'] = True
+                yield f"\n\n⚠️ {t('chat_stream_interrupted')}"
+                return
+            if isinstance(error, BudgetExceeded):
+                budget.degrade('llm', 'budget')
+                break
+            continue
+        finally:
+            chunks.close()
+            limiter.release()
+        
+        breaker.record_success()
+        response = "".join(parts)
+        store_cached_response(name, question, context, response, history)
+        record_llm_success(name, question, context, response, time.time() - start_time,
+                           ttfb=(first_token_time - start_time) if first_token_time is not None else None,
+                           history=history)
+        stats = st.session_state.model_stats[name]
+        stats["calls"] += 1
+        stats["total_time"] += time.time() - start_time
+        if name != model_type:
+            stats["failovers"] += 1
+        if first_token_time is not None:
+            stats["stream_calls"] += 1
+            stats["total_ttft"] += first_token_time - start_time
+        return
+    
+    if fallback is not None:
+        yield f"⚠️ {t('chat_llm_fallback')}\n\n{fallback}"
+    else:
+        yield t('chat_llm_fallback')
+
+# 对冲请求：主模型超过延迟阈值仍未返回时，向备用模型发送同一请求，先完成者胜出
+LLM_HEDGE_DELAY = os.getenv("LLM_HEDGE_DELAY", "auto")  # 秒数，或 auto 表示取该模型近期P90延迟
+LLM_HEDGE_DEFAULT_DELAY = 5.0  # 样本不足时的默认延迟
+LLM_HEDGE_MIN_SAMPLES = 20
+LLM_WORKER_THREADS = int(os.getenv("LLM_WORKER_THREADS", "16"))
+
+@st.cache_resource
+def get_llm_executor():
+    """进程级共享的LLM调用线程池"""
+    return ThreadPoolExecutor(max_workers=LLM_WORKER_THREADS, thread_name_prefix="llm")
+
+@st.cache_resource
+def get_latency_samples():
+    """进程级的各模型近期成功调用延迟（秒），用于计算对冲延迟"""
+    return {
+        'lock': threading.Lock(),
+        'samples': {name: deque(maxlen=200) for name in MODEL_CONFIG}
+    }
+
+def record_latency(model_type, elapsed):
+    """记录一次成功调用的延迟"""
+    latency = get_latency_samples()
+    with latency['lock']:
+        latency['samples'].setdefault(model_type, deque(maxlen=200)).append(elapsed)
+
+def get_hedge_delay(model_type):
+    """对冲延迟：固定配置值，或该模型近期延迟的P90"""
+    if LLM_HEDGE_DELAY != "auto":
+        return float(LLM_HEDGE_DELAY)
+    
+    latency = get_latency_samples()
+    with latency['lock']:
+        samples = sorted(latency['samples'].get(model_type, []))
+    if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+        return LLM_HEDGE_DEFAULT_DELAY
+    return samples[int(len(samples) * 0.9) - 1]
+
+def get_hedge_partner(model_type):
+    """按 MODEL_CONFIG 顺序选择第一个已配置Key、SDK可用且未熔断的其他模型作为备用"""
+    for name in MODEL_CONFIG:
+        if (name != model_type and ENV_KEYS.get(name) and provider_available(name)
+                and get_breaker(name).is_available()):
+            return name
+    return None
+
+def _collect_chunks(ctx, model_type, question, context, api_key, cancel_event, history=None, budget=None):
+    """
+    在工作线程中经熔断器消费流式输出；被取消时关闭流并返回None
+
+    挂载提交者会话的脚本上下文：线程池线程中调用 cache_resource 获取熔断器、限流器和指标注册表
+    """
+    add_script_run_ctx(threading.current_thread(), ctx)
+    breaker = get_breaker(model_type)
+    if not breaker.allow_request():
+        raise ProviderUnavailableError(f"{model_type} 熔断中")
+    
+    limiter = get_limiter(model_type)
+    if not limiter.acquire(queue_timeout(limiter, budget)):
+        breaker.record_ignored()
+        error = RateLimitExceeded(f"{model_type} 排队超时")
+        record_llm_error(model_type, error)
+        raise error
+    
+    start_time = time.time()
+    first_token_time = None
+    # 传入取消信号：落败时立即取消进行中的读取并关闭连接，不必等到下一个分片才释放限流名额
+    chunks = PROVIDER_CHUNKS[model_type](question, context, api_key, history, budget_deadline(budget), cancel_event)
+    parts = []
+    try:
+        for chunk in chunks:
+            if cancel_event.is_set():
+                break
+            if first_token_time is None:
+                first_token_time = time.time()
+            parts.append(chunk)
     except Exception as e:
-        st.session_state.model_stats[model_type]["errors"] += 1
-        return f"调用失败: {str(e)}"
+        error = record_provider_failure(model_type, breaker, e, budget)
+        if error is not e:
+            raise error from e
+        raise
+    finally:
+        chunks.close()
+        limiter.release()
+    
+    if cancel_event.is_set():
+        breaker.record_ignored()
+        return None
+    breaker.record_success()
+    response = "".join(parts)
+    record_llm_success(model_type, question, context, response, time.time() - start_time,
+                       ttfb=(first_token_time - start_time) if first_token_time is not None else None,
+                       history=history)
+    return response
+
+def call_llm_hedged(question, context, model_type, api_key, conversation=None, budget=None):
+    """
+    对冲调用：先请求主模型，超过对冲延迟仍未完成时再请求备用模型，
+    采用最先成功的回答并取消另一个请求；延迟预算耗尽时取消全部请求并抛出 BudgetExceeded
+    
+    Returns:
+        (实际回答的模型, 回答文本)
+    """
+    executor = get_llm_executor()
+    ctx = get_script_run_ctx()
+    cancel_events = {model_type: threading.Event()}
+    futures = {
+        executor.submit(_collect_chunks, ctx, model_type, question, context, api_key,
+                        cancel_events[model_type], history_for(model_type, conversation), budget): model_type
+    }
+    
+    hedge_delay = get_hedge_delay(model_type)
+    done, _ = wait(futures, timeout=hedge_delay if budget is None else budget.timeout(cap=hedge_delay))
+    if not done and (budget is None or budget.allows(LLM_MIN_BUDGET)):
+        backup = get_hedge_partner(model_type)
+        if backup:
+            cancel_events[backup] = threading.Event()
+            futures[executor.submit(_collect_chunks, ctx, backup, question, context, ENV_KEYS[backup],
+                                    cancel_events[backup], history_for(backup, conversation), budget)] = backup
+    
+    winner, response, errors, rejected = None, None, [], 0
+    pending = set(futures)
+    while pending and winner is None:
+        done, pending = wait(pending, timeout=None if budget is None else budget.remaining(),
+                             return_when=FIRST_COMPLETED)
+        if not done:
+            errors.append("超出延迟预算")
+            break
+        for future in done:
+            try:
+                result = future.result()
+            except ProviderUnavailableError as e:
+                rejected += 1
+                errors.append(f"{futures[future]}: {e}")
+                continue
+            except Exception as e:
+                errors.append(f"{futures[future]}: {e}")
+                continue
+            if result:
+                winner, response = futures[future], result
+                break
+    
+    # 取消落后的请求：未开始的直接取消，进行中的立即取消正在等待的读取并关闭连接
+    for future, name in futures.items():
+        if name != winner:
+            cancel_events[name].set()
+            future.cancel()
+    
+    if winner is None:
+        if budget is not None and budget.expired():
+            raise BudgetExceeded("; ".join(errors))
+        if rejected == len(futures):
+            # 请求都被熔断器拒绝，没有发出，由调用方按拒绝而非错误统计
+            raise ProviderUnavailableError("; ".join(errors))
+        raise LLMAPIError("; ".join(errors) or "无可用回答")
+    return winner, response
+
+# 端到端延迟预算：每个问题从提交起计时，各阶段只使用剩余时间，不足时降级
+CHAT_LATENCY_BUDGET = float(os.getenv("CHAT_LATENCY_BUDGET", "8"))
+RETRIEVAL_MIN_BUDGET = 0.5  # 剩余预算低于（检索 + 最短LLM调用）所需时间时跳过检索
+
+def finish_budget(budget):
+    """保存本次请求的预算使用情况，并把降级的阶段记入进程级指标"""
+    registry = get_metrics_registry()
+    for stage in budget.degraded:
+        registry.record_degraded(stage)
+    st.session_state.last_budget_report = budget.report()
+
+# 渐进式回答：先展示模板回答，LLM在后台线程完成后替换；脚本重跑（如点击取消）时停止完善
+REFINE_POLL_INTERVAL = 0.1
+# 非流式完善要等完整回答才能替换模板，首字预算对它没有意义；模板已经展示，改为等待到此截止时间（秒，从提问起计）
+REFINE_COMPLETION_TIMEOUT = float(os.getenv("REFINE_COMPLETION_TIMEOUT", "30"))
+
+@st.cache_resource
+def get_refine_executor():
+    """后台完善回答的线程池（与LLM调用线程池分开，避免对冲请求等待同一线程池而死锁）"""
+    return ThreadPoolExecutor(max_workers=LLM_WORKER_THREADS, thread_name_prefix="llm-refine")
+
+def localize(text):
+    """非中文界面时翻译回答"""
+    if st.session_state.language != 'zh' and get_translator():
+        return get_translator().translate_policy_response(text, 'zh', st.session_state.language)
+    return text
+
+def _refine_in_background(job, ctx, question, context, model_type, api_key, hedge, stream, fallback, conversation,
+                          budget=None):
+    """在工作线程中调用LLM，分片写入 job['parts']；挂载会话的脚本上下文以便访问 session_state"""
+    add_script_run_ctx(threading.current_thread(), ctx)
+    try:
+        if stream and not hedge:
+            chunks = stream_llm_api(question, context, model_type, api_key,
+                                    fallback=fallback, conversation=conversation, budget=budget, outcome=job)
+            try:
+                for chunk in chunks:
+                    if job['cancel'].is_set():
+                        break
+                    job['parts'].append(chunk)
+            finally:
+                chunks.close()
+        else:
+            response = call_llm_api(question, context, model_type, api_key, hedge=hedge,
+                                    fallback=fallback, conversation=conversation, budget=budget)
+            if not job['cancel'].is_set():
+                job['parts'].append(response)
+    except Exception as e:
+        job['error'] = e
+    finally:
+        job['done'].set()
+
+def start_refinement(question, template, context, model_type, api_key, hedge, stream, fallback, conversation,
+                     budget=None):
+    """提交后台完善任务，返回任务状态（保存在 session_state 中以便重跑时取消）"""
+    job = {
+        'question': question,
+        'template': template,
+        'parts': [],
+        'error': None,
+        'interrupted': False,
+        'cancel': threading.Event(),
+        'done': threading.Event(),
+        'started_at': time.time()
+    }
+    get_refine_executor().submit(_refine_in_background, job, get_script_run_ctx(), question, context,
+                                 model_type, api_key, hedge, stream, fallback, conversation, budget)
+    st.session_state.refinement = job
+    return job
+
+def cancel_refinement():
+    """上一次运行被打断（点击取消或其他操作）时停止后台任务，保留已展示的模板回答"""
+    job = st.session_state.pop('refinement', None)
+    if job is None:
+        return
+    job['cancel'].set()
+    get_conversation().add_turn(job['question'], job['template'])
+    st.toast(t('chat_refine_cancelled'))
+
+# 上一次运行未正常结束说明用户中途操作了页面，停止尚未完成的完善任务
+if 'refinement' in st.session_state:
+    cancel_refinement()
 
 # ==================== 导航选择 ====================
 if 'current_page' not in st.session_state:
@@ -637,8 +1395,17 @@ with col4:
 st.markdown("---")
 
 # ==================== 智能问答页面 ====================
-if st.session_state.current_page == "智能问答":
+@timed_fragment('chat')
+def chat_page():
+    """智能问答（提问、取消完善等操作只重跑本区块）"""
+    # 局部重跑不经过脚本顶部的检查：上一次运行被本区块内的操作打断时在这里停止完善
+    if 'refinement' in st.session_state:
+        cancel_refinement()
+    
     st.markdown(t('chat_description'))
+    # 首次进入问答页面时加载embedding模型（在计时之前，不占用问题的延迟预算）
+    with st.spinner("正在加载检索模型..."):
+        rag = get_rag_system()
     
     if 'messages' not in st.session_state:
         st.session_state.messages = [
@@ -650,52 +1417,159 @@ if st.session_state.current_page == "智能问答":
             st.markdown(message["content"])
     
     if prompt := st.chat_input(t('chat_input_placeholder')):
+        budget = LatencyBudget(CHAT_LATENCY_BUDGET)
         st.chat_message("user").markdown(prompt)
         st.session_state.messages.append({"role": "user", "content": prompt})
         
         with st.chat_message("assistant"):
-            with st.spinner(f"{selected_model} {t('chat_thinking')}"):
-                intent = detect_intent(prompt)
+            query_embedding = None
+            if rag is not None:
+                with budget.stage('embedding'):
+                    try:
+                        query_embedding = rag.encode_query(prompt)
+                    except Exception:
+                        query_embedding = None
+            
+            # 命中标准问题时直接返回预构建答案，跳过模板生成和LLM调用
+            canned = match_canned_answer(query_embedding)
+            if canned:
+                st.markdown(canned['answer'])
+                st.session_state.messages.append({"role": "assistant", "content": canned['answer']})
+                get_conversation().add_turn(prompt, canned['answer'])
+                finish_budget(budget)
+            else:
+                model_label = t('sidebar_auto_model') if selected_model == AUTO_MODEL else selected_model
+                with st.spinner(f"{model_label} {t('chat_thinking')}"):
+                    with budget.stage('intent'):
+                        intents = detect_intents(prompt, query_embedding)
+                    
+                    chat_model, chat_key, route = selected_model, effective_api_key, None
+                    if selected_model == AUTO_MODEL:
+                        route = route_question(prompt, intents)
+                        chat_model = route.model if route else next(iter(MODEL_CONFIG))
+                        chat_key = ENV_KEYS[route.model] if route else ""
                 
-                user_info = {
-                    'citizen': citizen,
-                    'income': income,
-                    'children': children,
-                    'age': age,
-                    'marital_status': marital_status
-                }
+                    user_info = {
+                        'citizen': citizen,
+                        'income': income,
+                        'children': children,
+                        'age': age,
+                        'marital_status': marital_status
+                    }
                 
-                if use_rag and RAG_AVAILABLE and 'rag' in st.session_state.systems:
-                    try:
-                        retrieved_docs = st.session_state.systems['rag'].search(prompt, top_k=3)
-                        rag_context = "\n\n".join([f"相关政策 {i+1}:\n{doc}" for i, doc in enumerate(retrieved_docs)])
-                        basic_response = f"{generate_response(prompt, intent, user_info)}\n\n**检索到的相关政策**:\n{rag_context}"
-                    except:
-                        basic_response = generate_response(prompt, intent, user_info)
-                else:
-                    basic_response = generate_response(prompt, intent, user_info)
+                    with budget.stage('template'):
+                        template_response = generate_multi_response(prompt, intents, user_info)
+                    retrieved_docs = []
+                    if use_rag and rag is not None:
+                        if budget.allows(RETRIEVAL_MIN_BUDGET + LLM_MIN_BUDGET):
+                            with budget.stage('retrieval'):
+                                try:
+                                    retrieved_docs = rag.search_documents(prompt, top_k=3, query_embedding=query_embedding)
+                                except Exception:
+                                    retrieved_docs = []
+                        else:
+                            budget.degrade('retrieval', 'budget')
+                    
+                    # 面向用户的回退回答保留完整格式；发送给模型的上下文使用紧凑的事实列表
+                    if retrieved_docs:
+                        rag_context = "\n\n".join([f"相关政策 {i+1}:\n{doc['text']}" for i, doc in enumerate(retrieved_docs)])
+                        basic_response = f"{template_response}\n\n**检索到的相关政策**:\n{rag_context}"
+                    else:
+                        basic_response = template_response
+                    llm_context = build_compact_context(template_response, retrieved_docs, POLICY_KB)
+                    if chat_key:
+                        savings = token_savings(basic_response, llm_context)
+                        st.session_state.last_context_savings = savings
+                        get_metrics_registry().record_context(savings['rich_tokens'], savings['compact_tokens'])
                 
-                if effective_api_key:
-                    ai_response = call_llm_api(prompt, basic_response, selected_model, effective_api_key)
-                    final_response = ai_response
-                else:
-                    final_response = basic_response + f"\n\n💡 {t('chat_api_hint')}"
+                    # 对冲模式需要完整回答才能判定胜出者，因此不走流式渲染
+                    if chat_key and not use_progressive and (use_hedging or not use_streaming):
+                        with budget.stage('llm'):
+                            final_response = call_llm_api(prompt, llm_context, chat_model, chat_key,
+                                                          hedge=use_hedging, fallback=basic_response,
+                                                          conversation=get_conversation(), budget=budget)
+                    elif not chat_key:
+                        final_response = basic_response + f"\n\n💡 {t('chat_api_hint')}"
                 
-                # 如果需要翻译（非中文）
-                if st.session_state.language != 'zh' and st.session_state.translator:
-                    final_response = st.session_state.translator.translate_policy_response(
-                        final_response, 'zh', st.session_state.language
-                    )
+                if route is not None:
+                    st.caption(f"🤖 {t('chat_routed_to')}: {route.model}")
+                placeholder = st.empty()
                 
-                st.markdown(final_response)
-                st.session_state.messages.append({"role": "assistant", "content": final_response})
+                # 渐进模式：立即展示模板回答（先写入消息列表，被取消时保留），AI回答完成后替换
+                if chat_key and use_progressive:
+                    with budget.stage('translation'):
+                        message = {"role": "assistant", "content": localize(basic_response)}
+                    placeholder.markdown(message["content"])
+                    st.session_state.messages.append(message)
+                    
+                    status = st.empty()
+                    cancel_area = st.empty()
+                    cancel_area.button(t('chat_cancel_refine'), key=f"cancel_refine_{len(st.session_state.messages)}")
+                    
+                    with budget.stage('llm'):
+                        refine_stream = use_streaming and not use_hedging
+                        if not refine_stream:
+                            budget.extend_to(REFINE_COMPLETION_TIMEOUT)
+                        job = start_refinement(prompt, basic_response, llm_context, chat_model, chat_key,
+                                               use_hedging, use_streaming, basic_response, get_conversation(), budget)
+                        shown, timed_out = 0, False
+                        while not job['done'].wait(REFINE_POLL_INTERVAL):
+                            # 后台调用本身按预算截止（流式为首字，非流式为完整回答）；此处兜底，
+                            # 预算耗尽时仍未收到内容则保留模板回答。已开始输出的回答不再丢弃，由读取超时约束
+                            if budget.expired() and not job['parts']:
+                                job['cancel'].set()
+                                timed_out = True
+                                budget.degrade('llm', 'budget')
+                                break
+                            if len(job['parts']) != shown:
+                                shown = len(job['parts'])
+                                placeholder.markdown("".join(job['parts']) + "▌")
+                            status.caption(f"⏳ {t('chat_refining')} {time.time() - job['started_at']:.0f}s")
+                    st.session_state.pop('refinement', None)
+                    status.empty()
+                    cancel_area.empty()
+                    
+                    final_response = basic_response if timed_out else ("".join(job['parts']) or basic_response)
+                    # 中途中断的回答带中断提示展示给用户，对话历史记录模板回答（同取消完善）
+                    get_conversation().add_turn(prompt, basic_response if job['interrupted'] else final_response)
+                    with budget.stage('translation'):
+                        message["content"] = localize(final_response)
+                    placeholder.markdown(message["content"])
+                
+                else:
+                    # 流式模式：边生成边渲染，结束后再做整体翻译
+                    stream_outcome = {'interrupted': False}
+                    if chat_key and use_streaming and not use_hedging:
+                        chunks = []
+                        with budget.stage('llm'):
+                            for chunk in stream_llm_api(prompt, llm_context, chat_model, chat_key,
+                                                        fallback=basic_response, conversation=get_conversation(),
+                                                        budget=budget, outcome=stream_outcome):
+                                chunks.append(chunk)
+                                placeholder.markdown("".join(chunks) + "▌")
+                        final_response = "".join(chunks)
+                    
+                    # 对话历史保存中文原文（提示词要求模型用中文回答），每轮增量更新；中途中断的回答不写入历史
+                    get_conversation().add_turn(prompt, basic_response if stream_outcome['interrupted'] else final_response)
+                    
+                    # 如果需要翻译（非中文）；翻译总是执行，否则用户会看到非所选语言的回答
+                    with budget.stage('translation'):
+                        final_response = localize(final_response)
+                    
+                    placeholder.markdown(final_response)
+                    st.session_state.messages.append({"role": "assistant", "content": final_response})
+                
+                finish_budget(budget)
 
 # ==================== 政策推荐页面 ====================
-elif st.session_state.current_page == "政策推荐":
+@timed_fragment('recommendation')
+def recommendation_page():
+    """政策推荐"""
     st.markdown(t('rec_description'))
     
     if st.button(t('rec_button'), type="primary"):
-        if REC_AVAILABLE and 'rec' in st.session_state.systems:
+        rec_engine = get_recommendation_engine()
+        if rec_engine is not None:
             with st.spinner(t('rec_analyzing')):
                 user_profile = {
                     'citizenship': citizen,
@@ -705,7 +1579,7 @@ elif st.session_state.current_page == "政策推荐":
                     'age': age
                 }
                 
-                recommendations = st.session_state.systems['rec'].get_recommendations(user_profile)
+                recommendations = rec_engine.get_recommendations(user_profile)
                 
                 st.success(t('rec_success'))
                 
@@ -727,88 +1601,102 @@ elif st.session_state.current_page == "政策推荐":
             st.error(t('error_engine_not_loaded'))
 
 # ==================== 津贴计算页面 ====================
-elif st.session_state.current_page == "津贴计算":
-    st.markdown(t('calc_description'))
-    
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.subheader(t('calc_fertility_title'))
-        calc_children = st.number_input(t('calc_children_plan'), min_value=1, max_value=10, value=2, key="calc_children")
-        
-        if st.button(t('calc_button_fertility'), key="calc_fertility"):
-            if REC_AVAILABLE and 'rec' in st.session_state.systems:
-                total = st.session_state.systems['rec'].calculate_fertility_benefits(
-                    current_children=children,
-                    planned_children=calc_children,
-                    is_citizen=(t('citizen') in citizen)
-                )
-                
-                st.metric(t('calc_total_fertility'), f"S${total:,}")
-                
-                rates = get_exchange_rate()
-                st.write(f"约 ¥{int(total * rates['CNY']):,} 人民币")
-                st.write(f"约 ${int(total * rates['USD']):,} 美元")
-            else:
-                st.error(t('error_engine_not_loaded'))
-    
-    with col2:
-        st.subheader(t('calc_housing_title'))
-        calc_flat_type = st.selectbox(t('calc_flat_type'), ["3房", "4房", "5房"], key="calc_flat")
-        calc_live_with_parents = st.checkbox(t('calc_proximity'), key="calc_proximity")
-        
-        if st.button(t('calc_button_housing'), key="calc_housing"):
-            if REC_AVAILABLE and 'rec' in st.session_state.systems:
-                total = st.session_state.systems['rec'].calculate_housing_grants(
-                    income=income,
-                    is_citizen=(t('citizen') in citizen),
-                    first_timer=True,
-                    proximity=calc_live_with_parents
-                )
-                
-                st.metric(t('calc_total_housing'), f"S${total:,}")
-                
-                grants = POLICY_KB['housing']['grants']
-                if income <= 9000:
-                    st.write(f"• Enhanced Housing Grant: S${grants['enhanced_housing_grant']['max_amount']:,}")
-                if income <= 14000:
-                    st.write(f"• Family Grant: S${grants['family_grant']['max_amount']:,}")
-                if calc_live_with_parents:
-                    st.write(f"• Proximity Housing Grant: S${grants['proximity_housing_grant']['max_amount']:,}")
+@timed_fragment('calculator_fertility')
+def fertility_calculator():
+    """生育津贴计算（调整计划子女数只重跑本区块）"""
+    st.subheader(t('calc_fertility_title'))
+    calc_children = st.number_input(t('calc_children_plan'), min_value=1, max_value=10, value=2, key="calc_children")
+
+    if st.button(t('calc_button_fertility'), key="calc_fertility"):
+        rec_engine = get_recommendation_engine()
+        if rec_engine is not None:
+            total = rec_engine.calculate_fertility_benefits(
+                current_children=children,
+                planned_children=calc_children,
+                is_citizen=(t('citizen') in citizen)
+            )
+
+            st.metric(t('calc_total_fertility'), f"S${total:,}")
+
+            rates = get_exchange_rate()
+            st.write(f"约 ¥{int(total * rates['CNY']):,} 人民币")
+            st.write(f"约 ${int(total * rates['USD']):,} 美元")
+            rate_status = get_rate_provider().status()
+            if rate_status['fetched_at']:
+                st.caption(f"汇率更新于 {datetime.fromtimestamp(rate_status['fetched_at']):%Y-%m-%d %H:%M}")
             else:
-                st.error(t('error_engine_not_loaded'))
+                st.caption("汇率为默认参考值")
+        else:
+            st.error(t('error_engine_not_loaded'))
+
+@timed_fragment('calculator_housing')
+def housing_calculator():
+    """住房津贴计算（调整户型和选项只重跑本区块）"""
+    st.subheader(t('calc_housing_title'))
+    calc_flat_type = st.selectbox(t('calc_flat_type'), ["3房", "4房", "5房"], key="calc_flat")
+    calc_live_with_parents = st.checkbox(t('calc_proximity'), key="calc_proximity")
+
+    if st.button(t('calc_button_housing'), key="calc_housing"):
+        rec_engine = get_recommendation_engine()
+        if rec_engine is not None:
+            total = rec_engine.calculate_housing_grants(
+                income=income,
+                is_citizen=(t('citizen') in citizen),
+                first_timer=True,
+                proximity=calc_live_with_parents
+            )
+
+            st.metric(t('calc_total_housing'), f"S${total:,}")
+
+            grants = POLICY_KB['housing']['grants']
+            if income <= 9000:
+                st.write(f"• Enhanced Housing Grant: S${grants['enhanced_housing_grant']['max_amount']:,}")
+            if income <= 14000:
+                st.write(f"• Family Grant: S${grants['family_grant']['max_amount']:,}")
+            if calc_live_with_parents:
+                st.write(f"• Proximity Housing Grant: S${grants['proximity_housing_grant']['max_amount']:,}")
+        else:
+            st.error(t('error_engine_not_loaded'))
 
 # ==================== 时间规划页面 ====================
-elif st.session_state.current_page == "时间规划":
+@timed_fragment('timeline')
+def timeline_page():
+    """时间规划（配置和生成时间线只重跑本区块）"""
     st.markdown(t('timeline_description'))
     
-    if TIMELINE_AVAILABLE and 'timeline' in st.session_state.systems:
+    with st.spinner("正在加载时间线组件..."):
+        timeline_generator = get_timeline_generator()
+    if timeline_generator is not None:
         col1, col2 = st.columns([1, 2])
         
         with col1:
             st.subheader("⚙️ " + t('timeline_milestones'))
             
-            start_date = st.date_input(
-                t('timeline_start_date'),
-                value=datetime.now(),
-                min_value=datetime.now() - timedelta(days=365),
-                max_value=datetime.now() + timedelta(days=365*5)
-            )
-            
-            milestones = []
-            if st.checkbox(t('timeline_marriage'), value=True):
-                milestones.append('marriage')
-            if st.checkbox(t('timeline_housing'), value=True):
-                milestones.append('housing')
-            if st.checkbox(t('timeline_pregnancy'), value=True):
-                milestones.append('pregnancy')
-            if st.checkbox(t('timeline_baby_admin'), value=True):
-                milestones.append('baby_admin')
+            # 日期和里程碑放在表单中：勾选时不重跑，点击生成后一次性提交
+            with st.form("timeline_form"):
+                start_date = st.date_input(
+                    t('timeline_start_date'),
+                    value=datetime.now(),
+                    min_value=datetime.now() - timedelta(days=365),
+                    max_value=datetime.now() + timedelta(days=365*5)
+                )
+                
+                milestones = []
+                if st.checkbox(t('timeline_marriage'), value=True):
+                    milestones.append('marriage')
+                if st.checkbox(t('timeline_housing'), value=True):
+                    milestones.append('housing')
+                if st.checkbox(t('timeline_pregnancy'), value=True):
+                    milestones.append('pregnancy')
+                if st.checkbox(t('timeline_baby_admin'), value=True):
+                    milestones.append('baby_admin')
+                
+                generate = st.form_submit_button(t('timeline_generate'), type="primary")
             
-            if st.button(t('timeline_generate'), type="primary"):
+            if generate:
                 if milestones:
                     with st.spinner(t('timeline_generating')):
-                        timeline_data = st.session_state.systems['timeline'].generate_timeline(
+                        timeline_data = timeline_generator.generate_timeline(
                             datetime.combine(start_date, datetime.min.time()),
                             milestones,
                             st.session_state.language
@@ -821,16 +1709,25 @@ elif st.session_state.current_page == "时间规划":
         
         with col2:
             if 'timeline_data' in st.session_state and st.session_state.timeline_data:
-                # 显示甘特图
-                fig = st.session_state.systems['timeline'].create_gantt_chart(
-                    st.session_state.timeline_data,
-                    st.session_state.language
-                )
+                # 显示甘特图：只在时间线或语言变化时重新生成图表
+                chart = st.session_state.get('timeline_chart')
+                if (chart is None or chart['data'] is not st.session_state.timeline_data
+                        or chart['language'] != st.session_state.language):
+                    chart = {
+                        'data': st.session_state.timeline_data,
+                        'language': st.session_state.language,
+                        'fig': timeline_generator.create_gantt_chart(
+                            st.session_state.timeline_data,
+                            st.session_state.language
+                        )
+                    }
+                    st.session_state.timeline_chart = chart
+                fig = chart['fig']
                 st.plotly_chart(fig, use_container_width=True)
                 
                 # 显示即将到来的提醒
                 st.subheader(t('timeline_reminders_title'))
-                reminders = st.session_state.systems['timeline'].get_upcoming_reminders(
+                reminders = timeline_generator.get_upcoming_reminders(
                     st.session_state.timeline_data,
                     days_ahead=90,
                     language=st.session_state.language
@@ -854,7 +1751,7 @@ elif st.session_state.current_page == "时间规划":
                 
                 # 显示里程碑摘要
                 st.subheader(t('timeline_summary_title'))
-                summary = st.session_state.systems['timeline'].create_milestone_summary(
+                summary = timeline_generator.create_milestone_summary(
                     st.session_state.timeline_data,
                     st.session_state.language
                 )
@@ -874,6 +1771,21 @@ elif st.session_state.current_page == "时间规划":
     else:
         st.error("时间线生成器未加载，请安装所需依赖：pip install plotly pandas")
 
+# ==================== 页面分发 ====================
+if st.session_state.current_page == "智能问答":
+    chat_page()
+elif st.session_state.current_page == "政策推荐":
+    recommendation_page()
+elif st.session_state.current_page == "津贴计算":
+    st.markdown(t('calc_description'))
+    col1, col2 = st.columns(2)
+    with col1:
+        fertility_calculator()
+    with col2:
+        housing_calculator()
+elif st.session_state.current_page == "时间规划":
+    timeline_page()
+
 # 底部说明
 st.markdown("---")
 st.markdown(f"### {t('guide_title')}")
@@ -899,4 +1811,7 @@ st.markdown(f"""
 
 ### {t('disclaimer_title')}
 {t('disclaimer_text')}
-""")
\ No newline at end of file
+""")
+
+# 整页运行耗时（被新的交互打断的运行不计入）；各区块的耗时由 timed_fragment 记录
+get_metrics_registry().observe_render('app', time.perf_counter() - APP_RUN_STARTED, 'app')
@@ -0,0 +1,393 @@
+"""
+标准问题答案库 - 离线生成常见问题的审核答案，在线按语义匹配直接返回
+匹配成功时跳过模板生成和LLM调用
+"""
+import json
+import os
+import string
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from policy_kb import POLICY_KB, get_kb_version
+
+# 默认产物路径与匹配阈值（余弦相似度）
+DEFAULT_INDEX_PATH = os.getenv("CANNED_ANSWERS_PATH", "canned_answers.json")
+DEFAULT_THRESHOLD = float(os.getenv("CANNED_ANSWER_THRESHOLD", "0.88"))
+
+# 标准问题表：每条包含各语言的问法和答案模板
+# 答案模板中的 {a.b.c} 引用 POLICY_KB 中的字段，构建时渲染，保证与知识库一致
+CANONICAL_QUESTIONS = [
+    {
+        'id': 'baby_bonus_1st',
+        'intent': 'fertility',
+        'questions': {
+            'zh': ['第一胎生育津贴有多少钱', '生第一个孩子有多少Baby Bonus'],
+            'en': ['How much is the Baby Bonus for my first child', 'Baby Bonus cash gift for 1st child'],
+            'ms': ['Berapakah Bonus Bayi untuk anak pertama']
+        },
+        'answer': {
+            'zh': "💰 **第一胎生育津贴**\n\n🎁 现金奖励: S${fertility.baby_bonus.cash_gifts.1st_child:,}\n"
+                  "💳 CDA配对: 最高S${fertility.baby_bonus.cda_matching.1st_2nd:,}\n"
+                  "🏥 Medisave新生儿补助: S${fertility.medisave_grant:,}\n\n🌐 {fertility.website}",
+            'en': "💰 **Baby Bonus for your 1st child**\n\n🎁 Cash Gift: S${fertility.baby_bonus.cash_gifts.1st_child:,}\n"
+                  "💳 CDA matching: up to S${fertility.baby_bonus.cda_matching.1st_2nd:,}\n"
+                  "🏥 Medisave Grant for Newborns: S${fertility.medisave_grant:,}\n\n🌐 {fertility.website}",
+            'ms': "💰 **Bonus Bayi untuk anak pertama**\n\n🎁 Hadiah Tunai: S${fertility.baby_bonus.cash_gifts.1st_child:,}\n"
+                  "💳 Padanan CDA: sehingga S${fertility.baby_bonus.cda_matching.1st_2nd:,}\n"
+                  "🏥 Geran Medisave: S${fertility.medisave_grant:,}\n\n🌐 {fertility.website}"
+        }
+    },
+    {
+        'id': 'baby_bonus_2nd',
+        'intent': 'fertility',
+        'questions': {
+            'zh': ['第二胎生育津贴有多少钱', '生二胎有多少Baby Bonus'],
+            'en': ['How much is the Baby Bonus for my 2nd child', 'Baby Bonus cash gift for second child'],
+            'ms': ['Berapakah Bonus Bayi untuk anak kedua']
+        },
+        'answer': {
+            'zh': "💰 **第二胎生育津贴**\n\n🎁 现金奖励: S${fertility.baby_bonus.cash_gifts.2nd_child:,}\n"
+                  "💳 CDA配对: 最高S${fertility.baby_bonus.cda_matching.1st_2nd:,}\n"
+                  "🏥 Medisave新生儿补助: S${fertility.medisave_grant:,}\n\n🌐 {fertility.website}",
+            'en': "💰 **Baby Bonus for your 2nd child**\n\n🎁 Cash Gift: S${fertility.baby_bonus.cash_gifts.2nd_child:,}\n"
+                  "💳 CDA matching: up to S${fertility.baby_bonus.cda_matching.1st_2nd:,}\n"
+                  "🏥 Medisave Grant for Newborns: S${fertility.medisave_grant:,}\n\n🌐 {fertility.website}",
+            'ms': "💰 **Bonus Bayi untuk anak kedua**\n\n🎁 Hadiah Tunai: S${fertility.baby_bonus.cash_gifts.2nd_child:,}\n"
+                  "💳 Padanan CDA: sehingga S${fertility.baby_bonus.cda_matching.1st_2nd:,}\n"
+                  "🏥 Geran Medisave: S${fertility.medisave_grant:,}\n\n🌐 {fertility.website}"
+        }
+    },
+    {
+        'id': 'baby_bonus_3rd',
+        'intent': 'fertility',
+        'questions': {
+            'zh': ['第三胎生育津贴有多少钱', '生三胎有多少Baby Bonus'],
+            'en': ['How much is the Baby Bonus for my third child', 'Baby Bonus cash gift for 3rd child'],
+            'ms': ['Berapakah Bonus Bayi untuk anak ketiga']
+        },
+        'answer': {
+            'zh': "💰 **第三胎生育津贴**\n\n🎁 现金奖励: S${fertility.baby_bonus.cash_gifts.3rd_child:,}\n"
+                  "💳 CDA配对: 最高S${fertility.baby_bonus.cda_matching.3rd_to_6th:,}\n"
+                  "🏥 Medisave新生儿补助: S${fertility.medisave_grant:,}\n\n🌐 {fertility.website}",
+            'en': "💰 **Baby Bonus for your 3rd child**\n\n🎁 Cash Gift: S${fertility.baby_bonus.cash_gifts.3rd_child:,}\n"
+                  "💳 CDA matching: up to S${fertility.baby_bonus.cda_matching.3rd_to_6th:,}\n"
+                  "🏥 Medisave Grant for Newborns: S${fertility.medisave_grant:,}\n\n🌐 {fertility.website}",
+            'ms': "💰 **Bonus Bayi untuk anak ketiga**\n\n🎁 Hadiah Tunai: S${fertility.baby_bonus.cash_gifts.3rd_child:,}\n"
+                  "💳 Padanan CDA: sehingga S${fertility.baby_bonus.cda_matching.3rd_to_6th:,}\n"
+                  "🏥 Geran Medisave: S${fertility.medisave_grant:,}\n\n🌐 {fertility.website}"
+        }
+    },
+    {
+        'id': 'maternity_leave',
+        'intent': 'fertility',
+        'questions': {
+            'zh': ['产假有多少周', '政府支付的产假有多长'],
+            'en': ['How many weeks of maternity leave do I get', 'How long is government-paid maternity leave'],
+            'ms': ['Berapa minggu cuti bersalin']
+        },
+        'answer': {
+            'zh': "👶 **产假**: {fertility.maternity_leave.total}周（政府支付{fertility.maternity_leave.government_paid}周）\n\n"
+                  "🌐 {fertility.website}",
+            'en': "👶 **Maternity Leave**: {fertility.maternity_leave.total} weeks "
+                  "({fertility.maternity_leave.government_paid} weeks government-paid)\n\n🌐 {fertility.website}",
+            'ms': "👶 **Cuti Bersalin**: {fertility.maternity_leave.total} minggu "
+                  "({fertility.maternity_leave.government_paid} minggu dibayar kerajaan)\n\n🌐 {fertility.website}"
+        }
+    },
+    {
+        'id': 'paternity_leave',
+        'intent': 'fertility',
+        'questions': {
+            'zh': ['陪产假有多少周', '爸爸可以休几周陪产假'],
+            'en': ['How many weeks of paternity leave do fathers get'],
+            'ms': ['Berapa minggu cuti paterniti']
+        },
+        'answer': {
+            'zh': "👨‍👧 **陪产假**: {fertility.paternity_leave.total}周（政府支付）\n\n🌐 {fertility.website}",
+            'en': "👨‍👧 **Paternity Leave**: {fertility.paternity_leave.total} weeks (government-paid)\n\n🌐 {fertility.website}",
+            'ms': "👨‍👧 **Cuti Paterniti**: {fertility.paternity_leave.total} minggu (dibayar kerajaan)\n\n🌐 {fertility.website}"
+        }
+    },
+    {
+        'id': 'bto_income_ceiling',
+        'intent': 'housing',
+        'questions': {
+            'zh': ['BTO收入上限是多少', '申请组屋的收入上限'],
+            'en': ['What is the BTO income ceiling', 'Income ceiling for HDB BTO flats'],
+            'ms': ['Apakah siling pendapatan BTO']
+        },
+        'answer': {
+            'zh': "🏠 **BTO收入上限**\n\n  • 2房式: S${housing.bto_requirements.income_ceiling.2room:,}\n"
+                  "  • 3房至5房式: S${housing.bto_requirements.income_ceiling.3room_to_5room:,}\n"
+                  "  • 最低年龄: {housing.bto_requirements.age}岁\n\n🌐 {housing.website}",
+            'en': "🏠 **BTO income ceiling**\n\n  • 2-room: S${housing.bto_requirements.income_ceiling.2room:,}\n"
+                  "  • 3-room to 5-room: S${housing.bto_requirements.income_ceiling.3room_to_5room:,}\n"
+                  "  • Minimum age: {housing.bto_requirements.age}\n\n🌐 {housing.website}",
+            'ms': "🏠 **Siling pendapatan BTO**\n\n  • 2 bilik: S${housing.bto_requirements.income_ceiling.2room:,}\n"
+                  "  • 3 hingga 5 bilik: S${housing.bto_requirements.income_ceiling.3room_to_5room:,}\n"
+                  "  • Umur minimum: {housing.bto_requirements.age}\n\n🌐 {housing.website}"
+        }
+    },
+    {
+        'id': 'housing_grants',
+        'intent': 'housing',
+        'questions': {
+            'zh': ['买组屋有哪些住房津贴', 'HDB购房津贴有多少'],
+            'en': ['What housing grants are available for HDB flats'],
+            'ms': ['Apakah geran perumahan yang ada untuk flat HDB']
+        },
+        'answer': {
+            'zh': "💸 **住房津贴**\n\n"
+                  "  • Enhanced Housing Grant: 最高S${housing.grants.enhanced_housing_grant.max_amount:,}"
+                  "（收入上限S${housing.grants.enhanced_housing_grant.income_ceiling:,}）\n"
+                  "  • Family Grant: 最高S${housing.grants.family_grant.max_amount:,}"
+                  "（收入上限S${housing.grants.family_grant.income_ceiling:,}）\n"
+                  "  • Proximity Housing Grant: 最高S${housing.grants.proximity_housing_grant.max_amount:,}\n\n"
+                  "🌐 {housing.website}",
+            'en': "💸 **Housing Grants**\n\n"
+                  "  • Enhanced Housing Grant: up to S${housing.grants.enhanced_housing_grant.max_amount:,}"
+                  " (income ceiling S${housing.grants.enhanced_housing_grant.income_ceiling:,})\n"
+                  "  • Family Grant: up to S${housing.grants.family_grant.max_amount:,}"
+                  " (income ceiling S${housing.grants.family_grant.income_ceiling:,})\n"
+                  "  • Proximity Housing Grant: up to S${housing.grants.proximity_housing_grant.max_amount:,}\n\n"
+                  "🌐 {housing.website}",
+            'ms': "💸 **Geran Perumahan**\n\n"
+                  "  • Enhanced Housing Grant: sehingga S${housing.grants.enhanced_housing_grant.max_amount:,}"
+                  " (siling pendapatan S${housing.grants.enhanced_housing_grant.income_ceiling:,})\n"
+                  "  • Family Grant: sehingga S${housing.grants.family_grant.max_amount:,}"
+                  " (siling pendapatan S${housing.grants.family_grant.income_ceiling:,})\n"
+                  "  • Proximity Housing Grant: sehingga S${housing.grants.proximity_housing_grant.max_amount:,}\n\n"
+                  "🌐 {housing.website}"
+        }
+    },
+    {
+        'id': 'marriage_cost',
+        'intent': 'marriage',
+        'questions': {
+            'zh': ['结婚注册要多少钱', '在新加坡登记结婚的费用'],
+            'en': ['How much does it cost to register a marriage'],
+            'ms': ['Berapakah kos pendaftaran perkahwinan']
+        },
+        'answer': {
+            'zh': "💒 **结婚注册费用**: S${marriage.cost_range.0} - S${marriage.cost_range.1}\n"
+                  "⏰ 需提前21天在线提交结婚通知\n\n🌐 {marriage.website}",
+            'en': "💒 **Marriage registration fee**: S${marriage.cost_range.0} - S${marriage.cost_range.1}\n"
+                  "⏰ Submit the notice of marriage online at least 21 days ahead\n\n🌐 {marriage.website}",
+            'ms': "💒 **Yuran pendaftaran perkahwinan**: S${marriage.cost_range.0} - S${marriage.cost_range.1}\n"
+                  "⏰ Hantar notis perkahwinan dalam talian sekurang-kurangnya 21 hari lebih awal\n\n🌐 {marriage.website}"
+        }
+    },
+    {
+        'id': 'delivery_cost',
+        'intent': 'healthcare',
+        'questions': {
+            'zh': ['公立医院生孩子要多少钱', '分娩费用大概多少'],
+            'en': ['How much does delivery cost at a public hospital'],
+            'ms': ['Berapakah kos bersalin di hospital awam']
+        },
+        'answer': {
+            'zh': "🏥 **分娩费用**\n\n  • 公立医院: S${healthcare.pregnancy_support.delivery_costs.public_hospital.0:,}"
+                  " - S${healthcare.pregnancy_support.delivery_costs.public_hospital.1:,}\n"
+                  "  • 私立医院: S${healthcare.pregnancy_support.delivery_costs.private_hospital.0:,}"
+                  " - S${healthcare.pregnancy_support.delivery_costs.private_hospital.1:,}\n"
+                  "💳 {healthcare.pregnancy_support.medisave_usage}\n\n🌐 {healthcare.website}",
+            'en': "🏥 **Delivery costs**\n\n  • Public hospital: S${healthcare.pregnancy_support.delivery_costs.public_hospital.0:,}"
+                  " - S${healthcare.pregnancy_support.delivery_costs.public_hospital.1:,}\n"
+                  "  • Private hospital: S${healthcare.pregnancy_support.delivery_costs.private_hospital.0:,}"
+                  " - S${healthcare.pregnancy_support.delivery_costs.private_hospital.1:,}\n"
+                  "💳 MediSave can be used for antenatal and delivery costs\n\n🌐 {healthcare.website}",
+            'ms': "🏥 **Kos bersalin**\n\n  • Hospital awam: S${healthcare.pregnancy_support.delivery_costs.public_hospital.0:,}"
+                  " - S${healthcare.pregnancy_support.delivery_costs.public_hospital.1:,}\n"
+                  "  • Hospital swasta: S${healthcare.pregnancy_support.delivery_costs.private_hospital.0:,}"
+                  " - S${healthcare.pregnancy_support.delivery_costs.private_hospital.1:,}\n"
+                  "💳 MediSave boleh digunakan untuk kos pranatal dan bersalin\n\n🌐 {healthcare.website}"
+        }
+    },
+    {
+        'id': 'kindergarten_subsidy',
+        'intent': 'education',
+        'questions': {
+            'zh': ['幼儿园补贴有多少', '幼儿园每月最高补贴'],
+            'en': ['How much is the kindergarten subsidy'],
+            'ms': ['Berapakah subsidi tadika']
+        },
+        'answer': {
+            'zh': "🏫 **幼儿园补贴**: 最高S${education.kindergarten.subsidy.max_subsidy}/月"
+                  "（家庭月收入≤S${education.kindergarten.subsidy.income_ceiling:,}）\n\n🌐 {education.website}",
+            'en': "🏫 **Kindergarten subsidy**: up to S${education.kindergarten.subsidy.max_subsidy}/month"
+                  " (household income ≤ S${education.kindergarten.subsidy.income_ceiling:,})\n\n🌐 {education.website}",
+            'ms': "🏫 **Subsidi tadika**: sehingga S${education.kindergarten.subsidy.max_subsidy}/bulan"
+                  " (pendapatan isi rumah ≤ S${education.kindergarten.subsidy.income_ceiling:,})\n\n🌐 {education.website}"
+        }
+    }
+]
+
+
+class _KBFormatter(string.Formatter):
+    """支持 {a.b.0} 形式点分路径的格式化器，从知识库取值"""
+
+    def get_field(self, field_name, args, kwargs):
+        value = kwargs['kb']
+        for part in field_name.split('.'):
+            value = value[int(part)] if isinstance(value, list) else value[part]
+        return value, field_name
+
+
+def render_answer(template: str, policy_kb: Dict[str, Any]) -> str:
+    """
+    用知识库渲染答案模板
+
+    Args:
+        template: 含 {a.b.c} 占位符的答案模板
+        policy_kb: 政策知识库字典
+
+    Returns:
+        渲染后的答案文本
+    """
+    return _KBFormatter().format(template, kb=policy_kb)
+
+
+def build_canned_answers(policy_kb: Dict[str, Any] = None, output_path: str = DEFAULT_INDEX_PATH,
+                         model=None) -> Dict[str, Any]:
+    """
+    离线构建标准问题答案库
+
+    Args:
+        policy_kb: 政策知识库字典，默认使用 POLICY_KB
+        output_path: 产物JSON路径
+        model: 已加载的embedding模型，为空时按需加载
+
+    Returns:
+        写入文件的产物字典
+    """
+    policy_kb = POLICY_KB if policy_kb is None else policy_kb
+
+    if model is None:
+        from sentence_transformers import SentenceTransformer
+        from rag_system import EMBEDDING_MODEL_NAME
+        model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+    entries = []
+    for item in CANONICAL_QUESTIONS:
+        for language, questions in item['questions'].items():
+            answer = render_answer(item['answer'][language], policy_kb)
+            for question in questions:
+                entries.append({
+                    'id': item['id'],
+                    'intent': item['intent'],
+                    'language': language,
+                    'question': question,
+                    'answer': answer
+                })
+
+    embeddings = model.encode([e['question'] for e in entries], normalize_embeddings=True)
+    for entry, embedding in zip(entries, embeddings):
+        entry['embedding'] = [round(float(x), 6) for x in embedding]
+
+    artifact = {
+        'kb_version': get_kb_version(policy_kb),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'entries': entries
+    }
+
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(artifact, f, ensure_ascii=False)
+
+    return artifact
+
+
+class CannedAnswerIndex:
+    """标准问题答案索引，按语言分组做余弦相似度匹配"""
+
+    def __init__(self, artifact: Dict[str, Any], threshold: float = DEFAULT_THRESHOLD):
+        """
+        初始化答案索引
+
+        Args:
+            artifact: build_canned_answers 生成的产物字典
+            threshold: 最低余弦相似度，低于该值不返回答案
+        """
+        self.threshold = threshold
+        self.kb_version = artifact.get('kb_version')
+        self.entries: Dict[str, List[Dict[str, Any]]] = {}
+        self.matrices: Dict[str, np.ndarray] = {}
+
+        for entry in artifact.get('entries', []):
+            self.entries.setdefault(entry['language'], []).append(entry)
+
+        for language, entries in self.entries.items():
+            self.matrices[language] = np.array([e['embedding'] for e in entries], dtype='float32')
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_INDEX_PATH, policy_kb: Dict[str, Any] = None,
+             threshold: float = DEFAULT_THRESHOLD) -> Optional['CannedAnswerIndex']:
+        """
+        加载答案索引，文件缺失或知识库版本不一致时返回None
+
+        Args:
+            path: 产物JSON路径
+            policy_kb: 当前政策知识库，用于校验版本
+            threshold: 最低余弦相似度
+        """
+        if not os.path.exists(path):
+            return None
+
+        with open(path, 'r', encoding='utf-8') as f:
+            artifact = json.load(f)
+
+        if artifact.get('kb_version') != get_kb_version(policy_kb):
+            print("⚠️ 标准答案库与当前知识库版本不一致，请重新运行 python canned_answers.py")
+            return None
+
+        return cls(artifact, threshold)
+
+    def match(self, query_embedding, language: str) -> Optional[Dict[str, Any]]:
+        """
+        匹配标准问题
+
+        Args:
+            query_embedding: 查询向量（与构建时同一模型编码）
+            language: 语言代码，只在该语言的问题中匹配
+
+        Returns:
+            命中的条目（含answer和score），未命中返回None
+        """
+        matrix = self.matrices.get(language)
+        if matrix is None or not len(matrix):
+            return None
+
+        query = np.asarray(query_embedding, dtype='float32').reshape(-1)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return None
+
+        scores = matrix @ (query / norm)
+        best = int(np.argmax(scores))
+        score = float(scores[best])
+
+        if score < self.threshold:
+            return None
+
+        entry = self.entries[language][best]
+        return {
+            'id': entry['id'],
+            'intent': entry['intent'],
+            'question': entry['question'],
+            'answer': entry['answer'],
+            'score': score
+        }
+
+
+# 离线构建入口
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="构建标准问题答案库")
+    parser.add_argument('--output', default=DEFAULT_INDEX_PATH, help="产物JSON路径")
+    args = parser.parse_args()
+
+    print("正在构建标准问题答案库...")
+    artifact = build_canned_answers(output_path=args.output)
+    print(f"✅ 已写入 {args.output}，共 {len(artifact['entries'])} 条问法，知识库版本 {artifact['kb_version']}")
@@ -0,0 +1,188 @@
+"""
+熔断器 - 按模型统计进程级错误率和超时率，异常时暂停向该模型发送请求
+状态: closed(正常) -> open(熔断) -> half_open(试探) -> closed/open
+"""
+import threading
+import time
+from collections import deque
+from typing import Any, Dict
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """单个模型的熔断器（线程安全）"""
+
+    def __init__(self, name: str, error_rate_threshold: float = 0.5, min_calls: int = 5,
+                 window_seconds: float = 60.0, open_seconds: float = 30.0, half_open_max_calls: int = 1):
+        """
+        初始化熔断器
+
+        Args:
+            name: 模型名称
+            error_rate_threshold: 窗口内失败率（错误+超时）达到该值时熔断
+            min_calls: 窗口内至少有这么多次调用才计算失败率
+            window_seconds: 统计窗口（秒）
+            open_seconds: 熔断持续时间，之后进入半开状态
+            half_open_max_calls: 半开状态下允许同时进行的试探请求数
+        """
+        self.name = name
+        self.error_rate_threshold = error_rate_threshold
+        self.min_calls = min_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        # 调用结果窗口: (时间戳, 结果)，结果为 'ok' / 'error' / 'timeout'
+        self._outcomes = deque()
+
+    @property
+    def state(self) -> str:
+        """当前状态（熔断到期时自动转为半开）"""
+        with self._lock:
+            self._refresh_state()
+            return self._state
+
+    def _refresh_state(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._half_open_calls = 0
+
+    def _prune(self, now: float):
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            self._outcomes.popleft()
+
+    def _trip(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._half_open_calls = 0
+
+    def is_available(self) -> bool:
+        """是否可能接受请求（不占用半开试探名额）"""
+        with self._lock:
+            self._refresh_state()
+            return self._state == CLOSED or (
+                self._state == HALF_OPEN and self._half_open_calls < self.half_open_max_calls
+            )
+
+    def allow_request(self) -> bool:
+        """
+        申请发送一次请求；半开状态下会占用试探名额，
+        调用方必须随后调用 record_success / record_failure / record_ignored 之一
+        """
+        with self._lock:
+            self._refresh_state()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return True
+            return False
+
+    def record_success(self):
+        """记录成功调用"""
+        with self._lock:
+            now = time.monotonic()
+            if self._state == HALF_OPEN:
+                # 试探成功，恢复正常并清空历史
+                self._state = CLOSED
+                self._outcomes.clear()
+            self._outcomes.append((now, 'ok'))
+            self._prune(now)
+
+    def record_failure(self, timeout: bool = False):
+        """
+        记录失败调用
+
+        Args:
+            timeout: 是否为超时
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._outcomes.append((now, 'timeout' if timeout else 'error'))
+            self._prune(now)
+
+            if self._state == HALF_OPEN:
+                self._trip()
+                return
+
+            total = len(self._outcomes)
+            failures = sum(1 for _, outcome in self._outcomes if outcome != 'ok')
+            if total >= self.min_calls and failures / total >= self.error_rate_threshold:
+                self._trip()
+
+    def record_ignored(self):
+        """请求被取消等不计入统计的情况，释放半开试探名额"""
+        with self._lock:
+            if self._state == HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前状态和窗口内的错误率、超时率"""
+        with self._lock:
+            self._refresh_state()
+            self._prune(time.monotonic())
+            total = len(self._outcomes)
+            errors = sum(1 for _, outcome in self._outcomes if outcome == 'error')
+            timeouts = sum(1 for _, outcome in self._outcomes if outcome == 'timeout')
+            return {
+                'name': self.name,
+                'state': self._state,
+                'calls': total,
+                'error_rate': errors / total if total else 0.0,
+                'timeout_rate': timeouts / total if total else 0.0
+            }
+
+
+class BreakerRegistry:
+    """按模型名管理熔断器，首次访问时创建"""
+
+    def __init__(self, **breaker_kwargs):
+        """
+        Args:
+            breaker_kwargs: 传给每个 CircuitBreaker 的参数
+        """
+        self._breaker_kwargs = breaker_kwargs
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> CircuitBreaker:
+        """获取（必要时创建）模型的熔断器"""
+        with self._lock:
+            if name not in self._breakers:
+                self._breakers[name] = CircuitBreaker(name, **self._breaker_kwargs)
+            return self._breakers[name]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """所有熔断器的状态"""
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: breaker.snapshot() for breaker in breakers}
+
+
+# 测试代码
+if __name__ == "__main__":
+    breaker = CircuitBreaker('demo', min_calls=4, open_seconds=0.2)
+
+    for _ in range(2):
+        breaker.record_success()
+    for _ in range(2):
+        breaker.record_failure(timeout=True)
+    print(f"失败率达到阈值后: {breaker.state}")
+    assert breaker.state == OPEN and not breaker.allow_request()
+
+    time.sleep(0.25)
+    print(f"熔断到期后: {breaker.state}")
+    assert breaker.allow_request()
+    assert not breaker.allow_request()  # 半开状态只放行一个试探请求
+
+    breaker.record_success()
+    print(f"试探成功后: {breaker.state}")
+    assert breaker.state == CLOSED
+    print(breaker.snapshot())
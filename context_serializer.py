@@ -0,0 +1,184 @@
+"""
+紧凑上下文序列化 - 为LLM提示词生成去掉emoji、Markdown和缩进的 "键: 值" 事实列表
+面向用户的模板回答（含emoji和格式）保持不变，仅发送给模型的上下文使用紧凑格式
+"""
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from llm_metrics import estimate_tokens
+
+_EMOJI = re.compile(
+    '['
+    '\U0001F000-\U0001FAFF'  # 表情、符号、交通等
+    '\u2300-\u23FF'          # ⏰ 等
+    '\u2600-\u27BF'          # ✅ ❌ 等
+    '\uFE0F\u200D'           # 变体选择符、零宽连接符
+    ']'
+)
+_MARKUP = re.compile(r'\*\*|__|`')
+_BULLET = re.compile(r'^[•\-*]\s*')
+_SPACES = re.compile(r'[ \t]+')
+
+
+def flatten(value: Any, prefix: str = '') -> List[Tuple[str, str]]:
+    """
+    把嵌套结构展开为 (路径, 值) 列表
+
+    标量列表和只含标量的字典合并为一行，其余按路径展开
+
+    Args:
+        value: 字典、列表或标量
+        prefix: 路径前缀
+
+    Returns:
+        [(路径, 值文本), ...]
+    """
+    if isinstance(value, dict):
+        if value and all(not isinstance(item, (dict, list, tuple)) for item in value.values()):
+            # 叶子字典合并为一行，避免重复路径前缀
+            return [(prefix, ', '.join(f"{key}={item}" for key, item in value.items()))]
+        pairs = []
+        for key, item in value.items():
+            pairs.extend(flatten(item, f"{prefix}.{key}" if prefix else str(key)))
+        return pairs
+    if isinstance(value, (list, tuple)):
+        if all(not isinstance(item, (dict, list, tuple)) for item in value):
+            return [(prefix, ', '.join(str(item) for item in value))]
+        pairs = []
+        for i, item in enumerate(value):
+            pairs.extend(flatten(item, f"{prefix}.{i}"))
+        return pairs
+    return [(prefix, str(value))]
+
+
+def serialize_facts(pairs: List[Tuple[str, str]]) -> str:
+    """(路径, 值) 列表转为 "路径: 值" 行"""
+    return '\n'.join(f"{path}: {value}" for path, value in pairs)
+
+
+def compact_text(markdown: str) -> str:
+    """
+    去掉emoji、加粗等标记、项目符号、缩进和空行
+
+    Args:
+        markdown: 模板回答（Markdown）
+
+    Returns:
+        每行一条事实的纯文本
+    """
+    lines = []
+    for line in markdown.splitlines():
+        line = _MARKUP.sub('', _EMOJI.sub('', line))
+        line = _BULLET.sub('', _SPACES.sub(' ', line).strip())
+        if line:
+            lines.append(line)
+    return '\n'.join(lines)
+
+
+def serialize_documents(documents: List[Dict[str, Any]], policy_kb: Dict[str, Any]) -> str:
+    """
+    把检索到的文档按元数据重新从知识库取值并展开（代替 json.dumps(indent=2) 的文本）
+
+    Args:
+        documents: RAGSystem.search_documents 返回的文档（含 metadata）
+        policy_kb: 政策知识库
+
+    Returns:
+        "路径: 值" 行
+    """
+    pairs = []
+    seen = set()
+    for doc in documents:
+        metadata = doc.get('metadata', {})
+        category = metadata.get('category')
+        section = policy_kb.get(category)
+        if not isinstance(section, dict):
+            pairs.append(('doc', compact_text(doc.get('text', '')).replace('\n', '; ')))
+            continue
+
+        if metadata.get('type') == 'detail':
+            key = metadata.get('key')
+            if (category, key) in seen or key not in section:
+                continue
+            seen.add((category, key))
+            pairs.extend(flatten(section[key], f"{category}.{key}"))
+        else:
+            if (category, None) in seen:
+                continue
+            seen.add((category, None))
+            for field in ('description', 'website'):
+                if field in section:
+                    pairs.append((f"{category}.{field}", str(section[field])))
+    return serialize_facts(pairs)
+
+
+def build_compact_context(answer: str, documents: Optional[List[Dict[str, Any]]] = None,
+                          policy_kb: Optional[Dict[str, Any]] = None) -> str:
+    """
+    组装发送给LLM的紧凑上下文
+
+    不附带用户资料（收入、年龄、婚姻状况等）：这些信息不发送给第三方模型，模板回答中已包含按资料得出的结论；
+    上下文也是回答缓存键的一部分，不含资料时不同用户的相同问题可以命中同一条缓存
+
+    Args:
+        answer: 模板回答（Markdown），压缩为要点
+        documents: 检索到的文档（含 metadata）
+        policy_kb: 政策知识库（展开检索文档时需要）
+
+    Returns:
+        紧凑上下文文本
+    """
+    sections = [f"[要点]\n{compact_text(answer)}"]
+    if documents and policy_kb is not None:
+        facts = serialize_documents(documents, policy_kb)
+        if facts:
+            sections.append(f"[政策]\n{facts}")
+    return '\n'.join(sections)
+
+
+def token_savings(rich: str, compact: str) -> Dict[str, Any]:
+    """
+    比较原始上下文和紧凑上下文的估算token数
+
+    Returns:
+        {'rich_tokens', 'compact_tokens', 'saved_tokens', 'saved_ratio'}
+    """
+    rich_tokens = estimate_tokens(rich)
+    compact_tokens = estimate_tokens(compact)
+    saved = rich_tokens - compact_tokens
+    return {
+        'rich_tokens': rich_tokens,
+        'compact_tokens': compact_tokens,
+        'saved_tokens': saved,
+        'saved_ratio': saved / rich_tokens if rich_tokens else 0.0
+    }
+
+
+# 测试代码
+if __name__ == "__main__":
+    import json
+    from policy_kb import POLICY_KB
+
+    # 示例回答按知识库数值生成（与 app.py 的生育模板同一口径），知识库更新后示例随之更新
+    bonus = POLICY_KB['fertility']['baby_bonus']
+    answer = f"""
+💰 **新加坡生育津贴详情（第2胎）**
+
+🎁 **现金奖励**: S${bonus['cash_gifts']['2nd_child']:,}
+💳 **CDA配对**: S${bonus['cda_matching']['1st_2nd']:,}
+👶 **产假**: {POLICY_KB['fertility']['maternity_leave']['total']}周（政府支付）
+
+📋 **申请条件**:
+  • 孩子必须是新加坡公民
+  • 出生后18个月内申请
+"""
+    documents = [{'text': '', 'metadata': {'category': 'fertility', 'type': 'detail', 'key': 'baby_bonus'}}]
+    rag_text = "\n\n".join(
+        f"相关政策 1:\n类别: fertility - baby_bonus\n内容: "
+        f"{json.dumps(POLICY_KB['fertility']['baby_bonus'], ensure_ascii=False, indent=2)}"
+        for _ in documents
+    )
+
+    compact = build_compact_context(answer, documents, POLICY_KB)
+    print(compact)
+    print(token_savings(f"{answer}\n\n**检索到的相关政策**:\n{rag_text}", compact))
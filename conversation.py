@@ -0,0 +1,128 @@
+"""
+多轮对话上下文 - 最近N轮保留原文，更早的轮次压缩为滚动摘要
+每轮增量更新，发送给模型的历史长度受token预算约束，不随对话轮数线性增长
+"""
+import re
+from collections import deque
+from typing import Dict, List, Tuple
+
+from llm_metrics import estimate_tokens
+
+_MARKUP = re.compile(r'[*#>`_|]+')
+_WHITESPACE = re.compile(r'\s+')
+_SENTENCE_END = re.compile(r'[。！？!?\n]')
+
+
+def _compact(text: str, limit: int) -> str:
+    """去掉Markdown标记、合并空白，截取第一句并限制长度"""
+    text = _WHITESPACE.sub(' ', _MARKUP.sub('', text)).strip()
+    match = _SENTENCE_END.search(text)
+    if match and match.start() > 0:
+        text = text[:match.start()]
+    return text if len(text) <= limit else text[:limit - 1] + '…'
+
+
+def summarize_turn(user: str, assistant: str) -> str:
+    """把一轮对话压缩成一行摘要"""
+    return f"问: {_compact(user, 60)} → 答: {_compact(assistant, 80)}"
+
+
+class ConversationWindow:
+    """对话窗口：最近若干轮原文 + 滚动摘要"""
+
+    def __init__(self, max_turns: int = 3, summary_tokens: int = 300):
+        """
+        Args:
+            max_turns: 保留原文的最近轮数
+            summary_tokens: 滚动摘要的token上限，超出时丢弃最早的摘要行
+        """
+        self.max_turns = max_turns
+        self.summary_tokens = summary_tokens
+        self.turns: deque = deque()
+        self.summary_lines: deque = deque()
+        self._summary_token_count = 0
+
+    def _push_summary(self, line: str):
+        self.summary_lines.append(line)
+        self._summary_token_count += estimate_tokens(line)
+        while self._summary_token_count > self.summary_tokens and len(self.summary_lines) > 1:
+            self._summary_token_count -= estimate_tokens(self.summary_lines.popleft())
+
+    def add_turn(self, user: str, assistant: str):
+        """
+        追加一轮对话；超出原文轮数的最早一轮压缩进摘要
+
+        Args:
+            user: 用户问题
+            assistant: 助手回答
+        """
+        self.turns.append((user, assistant))
+        while len(self.turns) > self.max_turns:
+            self._push_summary(summarize_turn(*self.turns.popleft()))
+
+    def clear(self):
+        """清空对话历史"""
+        self.turns.clear()
+        self.summary_lines.clear()
+        self._summary_token_count = 0
+
+    def window(self, token_budget: int) -> Tuple[str, List[Tuple[str, str]]]:
+        """
+        在token预算内取出摘要和原文轮次；预算不足时把较早的原文轮次改为摘要
+
+        Args:
+            token_budget: 历史部分的token上限
+
+        Returns:
+            (摘要文本, [(用户, 助手), ...])
+        """
+        summary = list(self.summary_lines)
+        turns = list(self.turns)
+
+        def cost() -> int:
+            return (sum(estimate_tokens(line) for line in summary)
+                    + sum(estimate_tokens(u) + estimate_tokens(a) for u, a in turns))
+
+        while turns and cost() > token_budget:
+            summary.append(summarize_turn(*turns.pop(0)))
+        while summary and cost() > token_budget:
+            summary.pop(0)
+
+        return "\n".join(summary), turns
+
+    def to_messages(self, token_budget: int) -> List[Dict[str, str]]:
+        """
+        转为OpenAI兼容的消息列表（摘要作为一条system消息放在最前）
+
+        Args:
+            token_budget: 历史部分的token上限
+        """
+        summary, turns = self.window(token_budget)
+        messages = []
+        if summary:
+            messages.append({"role": "system", "content": f"早前对话摘要：\n{summary}"})
+        for user, assistant in turns:
+            messages.append({"role": "user", "content": user})
+            messages.append({"role": "assistant", "content": assistant})
+        return messages
+
+
+def render_history(messages: List[Dict[str, str]]) -> str:
+    """把消息列表渲染为纯文本（供不支持多轮消息的提示词模板使用）"""
+    names = {'user': '用户', 'assistant': '助手', 'system': '背景'}
+    return "\n".join(f"{names.get(m['role'], m['role'])}: {m['content']}" for m in messages)
+
+
+# 测试代码
+if __name__ == "__main__":
+    conversation = ConversationWindow(max_turns=2, summary_tokens=60)
+    for i in range(1, 6):
+        conversation.add_turn(f"第{i}个问题：生育津贴有多少钱？", f"**第{i}个回答**：第一胎现金奖励S$8,000。更多细节见官网。")
+
+    print(f"原文轮数: {len(conversation.turns)}，摘要行数: {len(conversation.summary_lines)}")
+    for message in conversation.to_messages(token_budget=200):
+        print(message)
+
+    # 预算很小时只保留摘要
+    summary, turns = conversation.window(token_budget=30)
+    assert estimate_tokens(summary) <= 30 and not turns
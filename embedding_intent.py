@@ -0,0 +1,168 @@
+"""
+基于向量的意图识别 - 用检索时已经计算好的查询向量做最近质心分类，不再额外编码一次
+各意图的质心由多语言示例问题（含标准问题库中的问法）的向量求平均得到；
+模型不可用或相似度过低时由调用方回退到关键词分类器
+"""
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from intent_classifier import GENERAL
+
+# 意图 -> 示例问题（中/英/马来）；'general' 用于识别寒暄和与政策无关的问题
+INTENT_EXAMPLES = {
+    'fertility': [
+        '生孩子政府给多少钱', '生育津贴怎么申请', '产假有多长', '二胎有什么补贴', '怀孕了可以领什么福利',
+        'How much money do we get for having a baby', 'How long is maternity leave', 'Baby Bonus eligibility',
+        'Berapa lama cuti bersalin', 'Bantuan kerajaan untuk bayi baru lahir',
+    ],
+    'housing': [
+        '买组屋有什么补贴', 'BTO申请条件是什么', '第一次买房可以拿多少津贴', '和父母住得近有补助吗',
+        'How do I apply for a BTO flat', 'What housing grants can first-timers get', 'HDB income ceiling',
+        'Bagaimana memohon rumah HDB', 'Geran perumahan untuk pasangan muda',
+    ],
+    'marriage': [
+        '怎么在新加坡结婚', '结婚登记需要什么材料', '婚姻注册要多久', '外国人可以在新加坡注册结婚吗',
+        'How do we register our marriage', 'What documents are needed to get married', 'ROM appointment',
+        'Bagaimana mendaftar perkahwinan', 'Dokumen untuk berkahwin di Singapura',
+    ],
+    'healthcare': [
+        '产检可以报销吗', '保健储蓄能付生孩子的费用吗', '孩子打疫苗要钱吗', '怀孕期间看病有补贴吗',
+        'Can I use MediSave for delivery costs', 'Are prenatal checkups subsidised', 'Childhood vaccination schedule',
+        'Bolehkah Medisave digunakan untuk bersalin', 'Subsidi pemeriksaan kehamilan',
+    ],
+    'education': [
+        '幼儿园补贴多少', '孩子几岁上小学', '托儿所怎么申请', '小学报名怎么排队',
+        'How much is the preschool subsidy', 'When does my child start primary school', 'Childcare centre fees',
+        'Subsidi tadika', 'Pendaftaran sekolah rendah',
+    ],
+    GENERAL: [
+        '你好', '谢谢', '你是谁', '你能做什么', '今天天气怎么样',
+        'Hello', 'Thank you', 'What can you do', 'Who are you',
+        'Selamat pagi', 'Terima kasih',
+    ],
+}
+
+DEFAULT_MIN_SCORE = 0.35  # 最高相似度低于该值时视为无法判断，回退到关键词
+DEFAULT_MARGIN = 0.05     # 与最高分相差不超过该值的意图也作为标签返回
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+class EmbeddingIntentClassifier:
+    """最近质心意图分类器（构建后只读，可在线程间共享）"""
+
+    def __init__(self, intents: Sequence[str], centroids: np.ndarray,
+                 min_score: float = DEFAULT_MIN_SCORE, margin: float = DEFAULT_MARGIN):
+        """
+        Args:
+            intents: 意图名称，与质心行一一对应
+            centroids: 形状为 (意图数, dim) 的质心矩阵
+            min_score: 最低余弦相似度
+            margin: 多标签的分差范围
+        """
+        self.intents = list(intents)
+        self.centroids = _normalize(np.asarray(centroids, dtype='float32'))
+        self.min_score = min_score
+        self.margin = margin
+
+    @classmethod
+    def build(cls, encode: Callable[[List[str]], np.ndarray],
+              examples: Optional[Dict[str, List[str]]] = None, **kwargs) -> 'EmbeddingIntentClassifier':
+        """
+        编码示例问题并计算各意图的质心
+
+        Args:
+            encode: 文本列表 -> 向量矩阵（与查询使用同一模型，如 RAGSystem.model.encode）
+            examples: 意图 -> 示例问题，默认使用 INTENT_EXAMPLES 和标准问题库中的问法
+        """
+        if examples is None:
+            examples = {intent: list(questions) for intent, questions in INTENT_EXAMPLES.items()}
+            try:
+                from canned_answers import CANONICAL_QUESTIONS
+                for item in CANONICAL_QUESTIONS:
+                    for questions in item['questions'].values():
+                        examples.setdefault(item['intent'], []).extend(questions)
+            except ImportError:
+                pass
+
+        intents = [intent for intent, questions in examples.items() if questions]
+        texts = [question for intent in intents for question in examples[intent]]
+        vectors = _normalize(np.asarray(encode(texts), dtype='float32'))
+
+        centroids, start = [], 0
+        for intent in intents:
+            count = len(examples[intent])
+            centroids.append(vectors[start:start + count].mean(axis=0))
+            start += count
+        return cls(intents, np.stack(centroids), **kwargs)
+
+    def to_artifact(self) -> Dict[str, Any]:
+        """可JSON序列化的质心和参数（预构建产物，见 prebuild.py）"""
+        return {
+            'intents': self.intents,
+            'centroids': [[round(float(x), 6) for x in row] for row in self.centroids],
+            'min_score': self.min_score,
+            'margin': self.margin
+        }
+
+    @classmethod
+    def from_artifact(cls, artifact: Dict[str, Any]) -> 'EmbeddingIntentClassifier':
+        """从 to_artifact() 的结果恢复，启动时不必再编码示例问题"""
+        return cls(artifact['intents'], np.asarray(artifact['centroids'], dtype='float32'),
+                   min_score=artifact.get('min_score', DEFAULT_MIN_SCORE),
+                   margin=artifact.get('margin', DEFAULT_MARGIN))
+
+    def scores(self, query_embedding) -> Dict[str, float]:
+        """查询向量与各意图质心的余弦相似度"""
+        query = np.asarray(query_embedding, dtype='float32').reshape(-1)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return {}
+        similarities = self.centroids @ (query / norm)
+        return {intent: float(score) for intent, score in zip(self.intents, similarities)}
+
+    def classify(self, query_embedding) -> List[Tuple[str, float]]:
+        """
+        多标签分类
+
+        Returns:
+            [(意图, 相似度), ...]，最高分在前；无法判断时为空列表（调用方回退到关键词）
+        """
+        scores = self.scores(query_embedding)
+        if not scores:
+            return []
+        best = max(scores.values())
+        if best < self.min_score:
+            return []
+        labels = [(intent, score) for intent, score in scores.items() if score >= best - self.margin]
+        return sorted(labels, key=lambda item: -item[1])
+
+
+# 测试代码
+if __name__ == "__main__":
+    from intent_classifier import LABELED_QUESTIONS, IntentClassifier
+    from rag_system import DEPENDENCIES_AVAILABLE, EMBEDDING_MODEL_NAME
+
+    if not DEPENDENCIES_AVAILABLE:
+        raise SystemExit("需要 sentence-transformers 才能评测向量意图识别")
+
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    classifier = EmbeddingIntentClassifier.build(model.encode)
+    keywords = IntentClassifier()
+
+    questions = [question for question, _ in LABELED_QUESTIONS]
+    embeddings = model.encode(questions)
+    embedding_hits = keyword_hits = 0
+    for (question, expected), embedding in zip(LABELED_QUESTIONS, embeddings):
+        labels = classifier.classify(embedding)
+        top = labels[0][0] if labels else keywords.primary(question)
+        embedding_hits += top in expected
+        keyword_hits += keywords.primary(question) in expected
+        print(f"{question[:30]:<32} {labels[:2]}")
+    print(f"主意图正确: 向量 {embedding_hits}/{len(questions)}，关键词 {keyword_hits}/{len(questions)}")
@@ -0,0 +1,216 @@
+"""
+汇率提供方 - 进程内缓存 + 后台刷新 + 磁盘持久化
+读取汇率从不等待网络：缓存过期时先返回旧值并在后台刷新（stale-while-revalidate），
+最近一次成功获取的汇率写入磁盘，重启后即使无法联网也能使用
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+DEFAULT_URL = 'https://api.exchangerate-api.com/v4/latest/SGD'
+DEFAULT_RATES = {'USD': 0.74, 'CNY': 5.3, 'MYR': 3.3}
+
+
+def fetch_rates(url: str, timeout: float) -> Dict[str, float]:
+    """请求汇率接口，返回 {币种: 1新元兑换的金额}；失败时抛出异常"""
+    import requests
+
+    response = requests.get(url, timeout=timeout)
+    response.raise_for_status()
+    return response.json()['rates']
+
+
+class ExchangeRateProvider:
+    """新加坡元汇率（线程安全，进程内共享）"""
+
+    def __init__(self, url: str = DEFAULT_URL, defaults: Optional[Dict[str, float]] = None,
+                 ttl: float = 3600.0, path: str = '', timeout: float = 5.0,
+                 retry_interval: float = 60.0,
+                 fetch: Callable[[str, float], Dict[str, float]] = fetch_rates):
+        """
+        Args:
+            url: 汇率接口地址
+            defaults: 需要的币种及默认汇率（从未成功获取时使用）
+            ttl: 缓存有效期（秒），过期后下一次读取触发后台刷新
+            path: 持久化文件路径，留空表示不持久化
+            timeout: 请求超时（秒），只影响后台线程
+            retry_interval: 后台刷新失败后的重试间隔（秒）
+            fetch: 获取汇率的函数 (url, timeout) -> rates
+        """
+        self.url = url
+        self.defaults = dict(defaults or DEFAULT_RATES)
+        self.ttl = ttl
+        self.path = path
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self._fetch = fetch
+
+        self._lock = threading.Lock()
+        self._rates = dict(self.defaults)
+        self._fetched_at = 0.0  # 0 表示仍是默认值
+        self._source = 'default'
+        self._last_error: Optional[str] = None
+        self._refreshing = False
+        self._last_attempt = float('-inf')
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._load()
+        self._version = self._hash(self._rates)
+
+    def _load(self):
+        """读取上次持久化的汇率"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            rates = {currency: float(data['rates'][currency]) for currency in self.defaults
+                     if currency in data['rates']}
+            self._rates.update(rates)
+            self._fetched_at = float(data['fetched_at'])
+            self._source = 'disk'
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self._last_error = f"读取汇率文件失败: {e}"
+
+    def _save(self, rates: Dict[str, float], fetched_at: float):
+        """原子写入持久化文件"""
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'url': self.url, 'fetched_at': fetched_at, 'rates': rates}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            self._last_error = f"写入汇率文件失败: {e}"
+
+    def is_stale(self) -> bool:
+        """缓存是否已过期"""
+        with self._lock:
+            return time.time() - self._fetched_at >= self.ttl
+
+    def refresh(self) -> bool:
+        """
+        同步获取最新汇率（由后台线程调用）
+
+        Returns:
+            是否获取成功；失败时保留原有汇率
+        """
+        with self._lock:
+            self._last_attempt = time.time()
+        try:
+            remote = self._fetch(self.url, self.timeout)
+            rates = {currency: float(remote.get(currency, default)) for currency, default in self.defaults.items()}
+        except Exception as e:
+            with self._lock:
+                self._last_error = f"{type(e).__name__}: {e}"
+            return False
+
+        fetched_at = time.time()
+        version = self._hash(rates)
+        with self._lock:
+            self._rates = rates
+            self._version = version
+            self._fetched_at = fetched_at
+            self._source = 'live'
+            self._last_error = None
+        self._save(rates, fetched_at)
+        return True
+
+    def get(self) -> Dict[str, float]:
+        """
+        当前汇率，从不阻塞；缓存过期时唤醒后台线程刷新（未启动后台线程时临时起一个刷新线程），
+        上次刷新失败后 retry_interval 秒内不再重复触发
+        """
+        with self._lock:
+            rates = dict(self._rates)
+            now = time.time()
+            trigger = (now - self._fetched_at >= self.ttl and not self._refreshing
+                       and now - self._last_attempt >= self.retry_interval)
+            if trigger:
+                self._refreshing = True
+        if trigger:
+            if self._thread is not None and self._thread.is_alive():
+                self._wakeup.set()
+            else:
+                threading.Thread(target=self._refresh_once, name='exchange-rate-refresh', daemon=True).start()
+        return rates
+
+    def _refresh_once(self):
+        try:
+            self.refresh()
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def start(self) -> threading.Thread:
+        """启动后台刷新线程：缓存到期前主动刷新，失败时按 retry_interval 重试"""
+        if self._thread is not None and self._thread.is_alive():
+            return self._thread
+
+        def run():
+            while True:
+                with self._lock:
+                    due = self._fetched_at + self.ttl * 0.9 - time.time()
+                if due <= 0 or self._wakeup.is_set():
+                    self._wakeup.clear()
+                    ok = self.refresh()
+                    with self._lock:
+                        self._refreshing = False
+                    if not ok:
+                        self._wakeup.wait(self.retry_interval)
+                    continue
+                self._wakeup.wait(due)
+
+        self._thread = threading.Thread(target=run, name='exchange-rate-refresher', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    @staticmethod
+    def _hash(rates: Dict[str, float]) -> str:
+        payload = json.dumps(rates, sort_keys=True)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:8]
+
+    @property
+    def version(self) -> str:
+        """汇率内容的短哈希，汇率变化时改变（可作为缓存键的一部分）"""
+        with self._lock:
+            return self._version
+
+    def status(self) -> Dict[str, Any]:
+        """汇率来源（live / disk / default）、获取时间、是否过期和最近错误"""
+        with self._lock:
+            return {
+                'source': self._source,
+                'fetched_at': self._fetched_at or None,
+                'age': time.time() - self._fetched_at if self._fetched_at else None,
+                'stale': time.time() - self._fetched_at >= self.ttl,
+                'last_error': self._last_error
+            }
+
+
+# 测试代码
+if __name__ == "__main__":
+    import tempfile
+
+    calls = []
+
+    def slow_fetch(url, timeout):
+        calls.append(url)
+        time.sleep(0.2)
+        return {'USD': 0.75, 'CNY': 5.4, 'MYR': 3.4, 'EUR': 0.69}
+
+    path = os.path.join(tempfile.mkdtemp(), 'exchange_rates.json')
+    provider = ExchangeRateProvider(ttl=0.5, path=path, fetch=slow_fetch)
+
+    start = time.perf_counter()
+    print("首次读取（默认值）:", provider.get(), f"{(time.perf_counter() - start) * 1000:.1f}ms")
+    time.sleep(0.3)
+    print("后台刷新后:", provider.get(), provider.status())
+
+    restarted = ExchangeRateProvider(ttl=3600, path=path, fetch=slow_fetch)
+    print("重启后从磁盘读取:", restarted.get(), restarted.status()['source'])
+    assert restarted.get()['USD'] == 0.75 and len(calls) == 1
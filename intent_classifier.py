@@ -0,0 +1,179 @@
+"""
+意图分类器 - 按分语言关键词表逐词做子串判断，返回带分数的多标签意图
+与原来的链式 any(word in q ...) 判断相同，但检查全部意图而不是命中第一个即返回，"BTO和生育津贴"这类问题能同时识别出两个意图
+"""
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+GENERAL = 'general'
+
+# 意图 -> 语言 -> 关键词（英文/马来文按小写匹配；短词按整词匹配，长词允许复数等后缀）
+# 关键词可写成 (词, 权重)，默认权重为1
+# 不收录在各类问题中都会出现的泛用词（如"津贴""孩子""anak"）：多标签回答会为每个意图各生成一段，
+# 泛用词会给住房、教育等问题误加一段生育津贴
+INTENT_KEYWORDS = {
+    'fertility': {
+        'zh': ['生育', '生孩子', '怀孕', '生娃', '二胎', '三胎', '产假', '陪产假', ('婴儿花红', 2)],
+        'en': ['baby', 'maternity', 'paternity', 'bonus', 'newborn', ('baby bonus', 2), 'childbirth'],
+        'ms': ['bayi', 'bersalin', 'paterniti', ('bonus bayi', 2)],
+    },
+    'housing': {
+        'zh': ['住房', '房子', '组屋', '买房', '购房', '公寓', '建屋局'],
+        'en': ['bto', 'hdb', 'housing', 'flat', ('housing grant', 2), 'resale'],
+        'ms': ['perumahan', 'rumah', 'flat'],
+    },
+    'marriage': {
+        'zh': ['结婚', '婚姻', '领证', '婚礼', '婚姻注册'],
+        'en': ['rom', 'marriage', 'marry', 'married', 'wedding'],
+        'ms': ['perkahwinan', 'kahwin', 'nikah'],
+    },
+    'healthcare': {
+        'zh': ['医疗', '健康', '产检', '疫苗', '医院', '分娩', '保健储蓄'],
+        'en': ['health', 'pregnancy', 'medisave', 'medishield', 'vaccination', 'prenatal'],
+        'ms': ['kesihatan', 'hospital', 'vaksin', 'kehamilan'],
+    },
+    'education': {
+        'zh': ['教育', '幼儿园', '学校', '小学', '托儿', '上学'],
+        'en': ['education', 'kindergarten', 'school', 'preschool', 'childcare'],
+        'ms': ['pendidikan', 'tadika', 'sekolah'],
+    },
+}
+
+_LATIN = re.compile(r'[a-z0-9 ]+')
+# 不用 \b：中文字符也属于 \w，"BTO申请" 中的 BTO 两侧没有 \b
+_LEFT = r'(?<![a-z0-9])'
+_RIGHT = r'(?![a-z0-9])'
+
+
+def _boundary(term: str) -> Optional['re.Pattern']:
+    """
+    英文/马来文关键词的词边界检查（只在子串命中后执行）：要求词首对齐，
+    3个字母及以下的缩写（bto、hdb、rom）还要求词尾对齐（"from" 不算 rom），较长的词允许复数等后缀；中文不需要
+    """
+    if not _LATIN.fullmatch(term):
+        return None
+    return re.compile(_LEFT + re.escape(term) + (_RIGHT if len(term) <= 3 else ''))
+
+
+class IntentClassifier:
+    """多标签意图分类器：逐个关键词做子串判断，返回所有命中的意图（构建后只读，可在线程间共享）"""
+
+    def __init__(self, keywords: Optional[Dict[str, Dict[str, Sequence]]] = None, threshold: float = 1.0):
+        """
+        Args:
+            keywords: 意图 -> 语言 -> 关键词列表（元素为词或 (词, 权重)）
+            threshold: 意图得分达到该值才作为标签返回
+        """
+        keywords = keywords or INTENT_KEYWORDS
+        self.threshold = threshold
+        self.intents = list(keywords)  # 顺序即同分时的优先级
+        self._rank = {intent: index for index, intent in enumerate(self.intents)}
+        # 意图 -> [(关键词, 权重, 词边界), ...]；同一意图中重复的词（如 flat 同时出现在英文和马来文）只保留一次
+        self._table: List[Tuple[str, List[Tuple[str, float, Optional['re.Pattern']]]]] = []
+        for intent, by_language in keywords.items():
+            entries: Dict[str, float] = {}
+            for terms in by_language.values():
+                for entry in terms:
+                    term, weight = entry if isinstance(entry, tuple) else (entry, 1.0)
+                    entries.setdefault(term.lower(), weight)
+            self._table.append((intent, [(term, weight, _boundary(term)) for term, weight in entries.items()]))
+
+    def scores(self, text: str) -> Dict[str, float]:
+        """返回各意图得分（未命中的意图不出现）；短语命中时其中的单词也各自计分"""
+        q = text.lower()
+        result: Dict[str, float] = {}
+        for intent, terms in self._table:
+            score = 0.0
+            for term, weight, boundary in terms:
+                if term in q and (boundary is None or boundary.search(q)):
+                    score += weight
+            if score:
+                result[intent] = score
+        return result
+
+    def classify(self, text: str) -> List[Tuple[str, float]]:
+        """
+        多标签分类
+
+        Returns:
+            [(意图, 得分), ...]，按得分降序、同分按关键词表顺序；没有意图达到阈值时为 [('general', 0.0)]
+        """
+        scores = self.scores(text)
+        labels = [(intent, score) for intent, score in scores.items() if score >= self.threshold]
+        if not labels:
+            return [(GENERAL, 0.0)]
+        if len(labels) == 1:
+            return labels
+        return sorted(labels, key=lambda item: (-item[1], self._rank[item[0]]))
+
+    def intents_of(self, text: str) -> List[str]:
+        """多标签意图名称"""
+        return [intent for intent, _ in self.classify(text)]
+
+    def primary(self, text: str) -> str:
+        """得分最高的意图"""
+        return self.classify(text)[0][0]
+
+
+# 标注的评测集：(问题, 期望意图集合)，按问题实际询问的政策人工标注，不以分类器输出为准
+LABELED_QUESTIONS = [
+    ("生育津贴有多少钱？", {'fertility'}),
+    ("我想了解BTO申请条件", {'housing'}),
+    ("怎么办理结婚登记", {'marriage'}),
+    ("产检费用可以用保健储蓄吗", {'healthcare'}),
+    ("幼儿园补贴多少", {'education'}),
+    ("BTO and baby bonus", {'housing', 'fertility'}),
+    ("我们刚结婚，想申请组屋", {'marriage', 'housing'}),
+    ("What is the Baby Bonus for my second child?", {'fertility'}),
+    ("How do I apply for an HDB flat?", {'housing'}),
+    ("Where can we register our marriage (ROM)?", {'marriage'}),
+    ("Are prenatal checkups covered by MediSave?", {'healthcare'}),
+    ("When does primary school registration start?", {'education'}),
+    ("I'm moving from Malaysia, what can I get?", {GENERAL}),
+    ("Berapakah bonus bayi untuk anak pertama?", {'fertility'}),
+    ("Syarat permohonan perumahan HDB", {'housing'}),
+    ("Bagaimana mendaftar perkahwinan?", {'marriage'}),
+    ("Subsidi tadika untuk anak saya", {'education'}),
+    ("你好", {GENERAL}),
+    ("怀孕期间的产假和产检补贴分别是多少？", {'fertility', 'healthcare'}),
+    ("Paternity leave and childcare subsidies", {'fertility', 'education'}),
+    ("买组屋有哪些住房津贴", {'housing'}),
+    ("孩子几岁上小学", {'education'}),
+    ("孩子打疫苗要钱吗", {'healthcare'}),
+    ("Sekolah rendah untuk anak saya", {'education'}),
+    ("生孩子政府给多少钱", {'fertility'}),
+]
+
+
+def _legacy_detect_intent(question: str) -> str:
+    """原有的链式关键词判断（仅用于基准对比）"""
+    q = question.lower()
+    if any(word in q for word in ['生育', '津贴', 'baby', '孩子', '怀孕', 'maternity', 'paternity', 'bonus', 'bayi']):
+        return 'fertility'
+    elif any(word in q for word in ['住房', 'bto', 'hdb', '房子', 'housing', 'perumahan']):
+        return 'housing'
+    elif any(word in q for word in ['结婚', '婚姻', 'rom', 'marriage', 'perkahwinan']):
+        return 'marriage'
+    elif any(word in q for word in ['医疗', '健康', '产检', 'health', 'pregnancy', 'kesihatan']):
+        return 'healthcare'
+    elif any(word in q for word in ['教育', '幼儿园', '学校', 'education', 'kindergarten', 'pendidikan']):
+        return 'education'
+    return GENERAL
+
+
+# 测试代码（准确率评测见 tests/test_intent_classifier.py）
+if __name__ == "__main__":
+    import timeit
+
+    classifier = IntentClassifier()
+    for question in ("BTO and baby bonus", "买组屋有哪些住房津贴", "Subsidi tadika untuk anak saya"):
+        print(f"{question} -> {classifier.classify(question)}")
+
+    # 原实现命中第一个意图即返回；多标签需要检查全部关键词，每个问题多用几微秒。
+    # 曾按前缀树把关键词编译成一个正则，在这个规模的关键词表上仍比原实现慢，却难读难改，因此保留逐词子串判断。
+    # 相对每个问题的embedding编码（毫秒级）和LLM调用（秒级），这点差距可以忽略
+    samples = [question for question, _ in LABELED_QUESTIONS]
+    for name, func in (('原实现（单标签，首个命中即返回）', _legacy_detect_intent),
+                       ('逐词子串判断（多标签）', classifier.classify)):
+        seconds = min(timeit.repeat(lambda: [func(q) for q in samples], number=2000, repeat=3))
+        print(f"{name:<22} {seconds / (2000 * len(samples)) * 1e6:.2f} µs/问题")
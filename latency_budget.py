@@ -0,0 +1,106 @@
+"""
+端到端延迟预算 - 每个问答请求创建一个预算，依次传给意图识别、检索、模板生成、LLM调用和翻译
+各阶段只能使用剩余时间，时间不足时降级（跳过检索、使用缓存汇率、回退到模板回答）并记录
+"""
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+
+class BudgetExceeded(TimeoutError):
+    """延迟预算耗尽"""
+
+
+class LatencyBudget:
+    """单个请求的延迟预算"""
+
+    def __init__(self, total_seconds: float, clock=time.monotonic):
+        """
+        Args:
+            total_seconds: 总预算（秒）
+            clock: 单调时钟
+        """
+        self.total_seconds = total_seconds
+        self._clock = clock
+        self.started_at = clock()
+        self.deadline = self.started_at + total_seconds
+        self.stages: Dict[str, float] = {}
+        self.degraded: Dict[str, str] = {}
+
+    def elapsed(self) -> float:
+        """已用时间（秒）"""
+        return self._clock() - self.started_at
+
+    def remaining(self) -> float:
+        """剩余时间（秒），不小于0"""
+        return max(0.0, self.deadline - self._clock())
+
+    def expired(self) -> bool:
+        """预算是否已耗尽"""
+        return self.remaining() <= 0
+
+    def allows(self, seconds: float) -> bool:
+        """剩余时间是否足够执行预计耗时 seconds 的阶段"""
+        return self.remaining() >= seconds
+
+    def timeout(self, cap: Optional[float] = None, reserve: float = 0.0) -> float:
+        """
+        阶段可用的超时时间
+
+        Args:
+            cap: 阶段自身的超时上限
+            reserve: 为后续阶段预留的时间
+
+        Returns:
+            min(cap, 剩余时间 - reserve)，不小于0
+        """
+        available = max(0.0, self.remaining() - reserve)
+        return available if cap is None else min(cap, available)
+
+    def extend_to(self, total_seconds: float):
+        """把总预算放宽到 total_seconds（只放宽不收紧），截止时间相应延后"""
+        if total_seconds > self.total_seconds:
+            self.total_seconds = total_seconds
+            self.deadline = self.started_at + total_seconds
+
+    def degrade(self, stage: str, reason: str):
+        """记录某阶段被降级及原因"""
+        self.degraded[stage] = reason
+
+    @contextmanager
+    def stage(self, name: str):
+        """记录阶段耗时（同名阶段累加）"""
+        start = self._clock()
+        try:
+            yield self
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + self._clock() - start
+
+    def report(self) -> Dict[str, Any]:
+        """预算使用情况"""
+        return {
+            'budget': self.total_seconds,
+            'elapsed': self.elapsed(),
+            'stages': dict(self.stages),
+            'degraded': dict(self.degraded)
+        }
+
+
+# 测试代码
+if __name__ == "__main__":
+    budget = LatencyBudget(0.3)
+
+    with budget.stage('intent'):
+        time.sleep(0.05)
+    with budget.stage('retrieval'):
+        if budget.allows(0.5):
+            time.sleep(0.5)
+        else:
+            budget.degrade('retrieval', 'budget')
+    with budget.stage('llm'):
+        timeout = budget.timeout(cap=30, reserve=0.05)
+        print(f"LLM可用时间: {timeout:.2f}秒")
+        time.sleep(timeout)
+
+    print(budget.report())
+    assert 'retrieval' in budget.degraded and budget.elapsed() < 0.3
@@ -0,0 +1,101 @@
+"""
+按需导入 - 重量级依赖（torch、faiss、plotly、pandas、各家SDK）只在用到的页面或提供方首次使用时导入
+Streamlit 每次交互都会重新执行 app.py 顶层代码，启动和轻量页面（如津贴计算）不应为这些依赖付出导入时间；
+可用性用 importlib.util.find_spec 探测（只查找模块文件，不执行模块代码），实际导入的耗时记录为导入耗时报告
+"""
+import importlib
+import importlib.util
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+_lock = threading.Lock()
+_probes: Dict[str, bool] = {}
+_timings: Dict[str, float] = {}  # 模块名或代码块标签 -> 首次导入耗时（毫秒）
+
+
+def is_available(*names: str) -> bool:
+    """
+    探测模块是否已安装（不导入，结果缓存）
+
+    Args:
+        names: 模块名，如 'sentence_transformers'、'google.generativeai'；全部可找到时返回True
+    """
+    for name in names:
+        with _lock:
+            found = _probes.get(name)
+        if found is None:
+            if name in sys.modules:
+                found = True
+            else:
+                try:
+                    found = importlib.util.find_spec(name) is not None
+                except (ImportError, ValueError):
+                    # 子模块的父包不存在时 find_spec 抛出 ModuleNotFoundError
+                    found = False
+            with _lock:
+                _probes[name] = found
+        if not found:
+            return False
+    return True
+
+
+def load(name: str):
+    """
+    导入模块并记录首次导入耗时；已导入的模块直接从 sys.modules 返回
+
+    耗时包含该模块导入的所有依赖（如 rag_system 包含 sentence_transformers 和 torch）
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    start = time.perf_counter()
+    module = importlib.import_module(name)
+    elapsed = (time.perf_counter() - start) * 1000
+    with _lock:
+        _timings.setdefault(name, elapsed)
+    return module
+
+
+@contextmanager
+def timed_import(label: str):
+    """记录一段导入语句的耗时（只保留首次，脚本重跑时模块已缓存，不覆盖冷启动的数据）"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - start) * 1000
+        with _lock:
+            _timings.setdefault(label, elapsed)
+
+
+def import_report() -> List[Tuple[str, float]]:
+    """已记录的导入耗时 [(模块名, 毫秒), ...]，耗时长的在前"""
+    with _lock:
+        return sorted(_timings.items(), key=lambda item: -item[1])
+
+
+def format_import_report() -> str:
+    """导入耗时报告（文本，用于启动日志）"""
+    lines = [f"{ms:9.1f} ms  {name}" for name, ms in import_report()]
+    return "导入耗时:\n" + "\n".join(lines) if lines else "导入耗时: 尚无记录"
+
+
+# 测试代码
+if __name__ == "__main__":
+    for names in [('json',), ('sentence_transformers', 'faiss'), ('plotly', 'pandas'),
+                  ('google.generativeai',), ('huggingface_hub', 'aiohttp'), ('httpx',)]:
+        start = time.perf_counter()
+        found = is_available(*names)
+        print(f"{'+'.join(names):<32} {'✓' if found else '✗'}  探测 {(time.perf_counter() - start) * 1000:.2f}ms")
+
+    with timed_import('标准库'):
+        import decimal, email.parser  # noqa: F401
+    load('policy_kb')
+    load('intent_classifier')
+    if is_available('numpy', 'sentence_transformers', 'faiss'):
+        load('rag_system')
+    load('policy_kb')  # 已导入，不重复计时
+    print(format_import_report())
@@ -0,0 +1,380 @@
+"""
+LLM指标注册表 - 进程级、线程安全
+记录各模型的延迟直方图、首字节时间、token数、错误类型和缓存命中率，
+可导出为Prometheus文本格式（本地HTTP端点或文件）
+"""
+import os
+import re
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional
+
+# 延迟直方图分桶（秒）
+DEFAULT_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0)
+# 页面渲染耗时分桶（秒）：局部重跑通常在几十毫秒以内
+RENDER_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_CJK = re.compile(r'[　-鿿가-힯＀-￯]')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算token数（不依赖具体分词器）：中日韩字符约1个token，其余字符约4个一个token
+
+    Args:
+        text: 文本
+
+    Returns:
+        估算的token数
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+class Histogram:
+    """累积分桶直方图，另保留最近样本用于计算分位数"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, reservoir_size: int = 2000):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.samples = deque(maxlen=reservoir_size)
+
+    def observe(self, value: float):
+        """记录一个观测值"""
+        self.count += 1
+        self.sum += value
+        self.samples.append(value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+    def percentile(self, p: float) -> float:
+        """近期样本的分位数（p取0-100）"""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))
+        return ordered[index]
+
+
+class MetricsRegistry:
+    """LLM调用指标注册表（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latency: Dict[str, Histogram] = {}
+        self._ttfb: Dict[str, Histogram] = {}
+        self._calls: Dict[str, int] = {}
+        self._prompt_tokens: Dict[str, int] = {}
+        self._completion_tokens: Dict[str, int] = {}
+        self._errors: Dict[tuple, int] = {}
+        self._rejected: Dict[str, int] = {}
+        self._cache: Dict[tuple, int] = {}
+        self._context_tokens = {'rich': 0, 'compact': 0}
+        self._context_requests = 0
+        self._degraded: Dict[str, int] = {}
+        self._routes: Dict[tuple, int] = {}
+        self._render: Dict[str, Histogram] = {}
+        self._render_runs: Dict[tuple, int] = {}
+        self.started_at = time.time()
+
+    def observe_call(self, provider: str, latency: float, prompt_tokens: int = 0,
+                     completion_tokens: int = 0, ttfb: Optional[float] = None):
+        """
+        记录一次成功调用
+
+        Args:
+            provider: 模型名称
+            latency: 总耗时（秒）
+            prompt_tokens: 输入token数
+            completion_tokens: 输出token数
+            ttfb: 首字节时间（秒），流式调用时提供
+        """
+        with self._lock:
+            self._calls[provider] = self._calls.get(provider, 0) + 1
+            self._latency.setdefault(provider, Histogram()).observe(latency)
+            if ttfb is not None:
+                self._ttfb.setdefault(provider, Histogram()).observe(ttfb)
+            self._prompt_tokens[provider] = self._prompt_tokens.get(provider, 0) + prompt_tokens
+            self._completion_tokens[provider] = self._completion_tokens.get(provider, 0) + completion_tokens
+
+    def record_error(self, provider: str, error_class: str):
+        """记录一次失败调用及其错误类型"""
+        with self._lock:
+            key = (provider, error_class)
+            self._errors[key] = self._errors.get(key, 0) + 1
+
+    def record_rejected(self, provider: str):
+        """记录一次因熔断（或半开状态试探名额已被占用）而未发出的请求，不计入错误"""
+        with self._lock:
+            self._rejected[provider] = self._rejected.get(provider, 0) + 1
+
+    def record_cache(self, cache: str, hit: bool):
+        """记录一次缓存查询（cache为缓存名称，如 llm_response / canned_answer）"""
+        with self._lock:
+            key = (cache, 'hit' if hit else 'miss')
+            self._cache[key] = self._cache.get(key, 0) + 1
+
+    def record_context(self, rich_tokens: int, compact_tokens: int):
+        """记录一次上下文压缩（原始Markdown上下文与发送给模型的紧凑上下文的token数）"""
+        with self._lock:
+            self._context_requests += 1
+            self._context_tokens['rich'] += rich_tokens
+            self._context_tokens['compact'] += compact_tokens
+
+    def record_degraded(self, stage: str):
+        """记录一次因延迟预算不足而降级的阶段（如 retrieval / exchange_rate / llm）"""
+        with self._lock:
+            self._degraded[stage] = self._degraded.get(stage, 0) + 1
+
+    def record_route(self, provider: str, complexity: str):
+        """记录一次自动路由决策（complexity 为 simple / complex）"""
+        with self._lock:
+            key = (provider, complexity)
+            self._routes[key] = self._routes.get(key, 0) + 1
+
+    def observe_render(self, section: str, seconds: float, scope: str):
+        """
+        记录一次页面区块的渲染耗时
+
+        Args:
+            section: 区块名称（如 sidebar / chat / timeline）
+            seconds: 耗时（秒）
+            scope: 'app'（整个脚本重跑）或 'fragment'（只重跑该区块）
+        """
+        with self._lock:
+            self._render.setdefault(section, Histogram(RENDER_BUCKETS)).observe(seconds)
+            key = (section, scope)
+            self._render_runs[key] = self._render_runs.get(key, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        汇总视图
+
+        Returns:
+            {'providers': {名称: 指标}, 'cache': {缓存名: 命中率等}, 'context': 上下文压缩统计,
+             'degraded': {阶段: 降级次数}, 'render': {区块: 渲染耗时和重跑次数}}
+        """
+        with self._lock:
+            providers = {}
+            names = set(self._calls) | {provider for provider, _ in self._errors} | set(self._rejected)
+            for name in sorted(names):
+                latency = self._latency.get(name, Histogram())
+                ttfb = self._ttfb.get(name)
+                errors = {cls: n for (provider, cls), n in self._errors.items() if provider == name}
+                providers[name] = {
+                    'calls': self._calls.get(name, 0),
+                    'errors': errors,
+                    'rejected': self._rejected.get(name, 0),
+                    'p50': latency.percentile(50),
+                    'p95': latency.percentile(95),
+                    'p99': latency.percentile(99),
+                    'ttfb_p50': ttfb.percentile(50) if ttfb else None,
+                    'prompt_tokens': self._prompt_tokens.get(name, 0),
+                    'completion_tokens': self._completion_tokens.get(name, 0)
+                }
+
+            cache = {}
+            for cache_name in sorted({name for name, _ in self._cache}):
+                hits = self._cache.get((cache_name, 'hit'), 0)
+                misses = self._cache.get((cache_name, 'miss'), 0)
+                cache[cache_name] = {
+                    'hits': hits,
+                    'misses': misses,
+                    'hit_ratio': hits / (hits + misses) if hits + misses else 0.0
+                }
+
+            rich, compact = self._context_tokens['rich'], self._context_tokens['compact']
+            context = {
+                'requests': self._context_requests,
+                'saved_tokens': rich - compact,
+                'saved_ratio': (rich - compact) / rich if rich else 0.0
+            }
+
+            degraded = dict(self._degraded)
+
+            render = {}
+            for section, hist in sorted(self._render.items()):
+                render[section] = {
+                    'p50': hist.percentile(50),
+                    'p95': hist.percentile(95),
+                    'app_runs': self._render_runs.get((section, 'app'), 0),
+                    'fragment_runs': self._render_runs.get((section, 'fragment'), 0)
+                }
+
+        return {'providers': providers, 'cache': cache, 'context': context, 'degraded': degraded,
+                'render': render}
+
+    def to_prometheus(self) -> str:
+        """导出为Prometheus文本格式"""
+        lines = []
+
+        def label(value: str) -> str:
+            return value.replace('\\', '\\\\').replace('"', '\\"')
+
+        with self._lock:
+            lines.append('# HELP babybloom_llm_calls_total Successful LLM calls')
+            lines.append('# TYPE babybloom_llm_calls_total counter')
+            for provider, n in sorted(self._calls.items()):
+                lines.append(f'babybloom_llm_calls_total{{provider="{label(provider)}"}} {n}')
+
+            for metric, histograms, help_text in (
+                ('babybloom_llm_latency_seconds', self._latency, 'LLM call latency'),
+                ('babybloom_llm_ttfb_seconds', self._ttfb, 'LLM time to first byte (streaming)')
+            ):
+                lines.append(f'# HELP {metric} {help_text}')
+                lines.append(f'# TYPE {metric} histogram')
+                for provider, hist in sorted(histograms.items()):
+                    name = label(provider)
+                    for bound, n in zip(hist.buckets, hist.counts):
+                        lines.append(f'{metric}_bucket{{provider="{name}",le="{bound}"}} {n}')
+                    lines.append(f'{metric}_bucket{{provider="{name}",le="+Inf"}} {hist.count}')
+                    lines.append(f'{metric}_sum{{provider="{name}"}} {hist.sum:.6f}')
+                    lines.append(f'{metric}_count{{provider="{name}"}} {hist.count}')
+
+            lines.append('# HELP babybloom_llm_tokens_total Estimated LLM tokens')
+            lines.append('# TYPE babybloom_llm_tokens_total counter')
+            for kind, totals in (('prompt', self._prompt_tokens), ('completion', self._completion_tokens)):
+                for provider, n in sorted(totals.items()):
+                    lines.append(f'babybloom_llm_tokens_total{{provider="{label(provider)}",kind="{kind}"}} {n}')
+
+            lines.append('# HELP babybloom_llm_errors_total Failed LLM calls by error class')
+            lines.append('# TYPE babybloom_llm_errors_total counter')
+            for (provider, cls), n in sorted(self._errors.items()):
+                lines.append(f'babybloom_llm_errors_total{{provider="{label(provider)}",class="{label(cls)}"}} {n}')
+
+            lines.append('# HELP babybloom_llm_rejected_total LLM requests skipped because the circuit breaker was open')
+            lines.append('# TYPE babybloom_llm_rejected_total counter')
+            for provider, n in sorted(self._rejected.items()):
+                lines.append(f'babybloom_llm_rejected_total{{provider="{label(provider)}"}} {n}')
+
+            lines.append('# HELP babybloom_cache_requests_total Cache lookups by result')
+            lines.append('# TYPE babybloom_cache_requests_total counter')
+            for (cache, result), n in sorted(self._cache.items()):
+                lines.append(f'babybloom_cache_requests_total{{cache="{label(cache)}",result="{result}"}} {n}')
+
+            lines.append('# HELP babybloom_llm_context_tokens_total Estimated context tokens before/after compaction')
+            lines.append('# TYPE babybloom_llm_context_tokens_total counter')
+            for kind, n in sorted(self._context_tokens.items()):
+                lines.append(f'babybloom_llm_context_tokens_total{{kind="{kind}"}} {n}')
+
+            lines.append('# HELP babybloom_degraded_total Pipeline stages degraded by the latency budget')
+            lines.append('# TYPE babybloom_degraded_total counter')
+            for stage, n in sorted(self._degraded.items()):
+                lines.append(f'babybloom_degraded_total{{stage="{label(stage)}"}} {n}')
+
+            metric = 'babybloom_render_seconds'
+            lines.append(f'# HELP {metric} Page section render time')
+            lines.append(f'# TYPE {metric} histogram')
+            for section, hist in sorted(self._render.items()):
+                name = label(section)
+                for bound, n in zip(hist.buckets, hist.counts):
+                    lines.append(f'{metric}_bucket{{section="{name}",le="{bound}"}} {n}')
+                lines.append(f'{metric}_bucket{{section="{name}",le="+Inf"}} {hist.count}')
+                lines.append(f'{metric}_sum{{section="{name}"}} {hist.sum:.6f}')
+                lines.append(f'{metric}_count{{section="{name}"}} {hist.count}')
+
+            lines.append('# HELP babybloom_render_runs_total Page section runs by rerun scope')
+            lines.append('# TYPE babybloom_render_runs_total counter')
+            for (section, scope), n in sorted(self._render_runs.items()):
+                lines.append(f'babybloom_render_runs_total{{section="{label(section)}",scope="{scope}"}} {n}')
+
+            lines.append('# HELP babybloom_route_decisions_total Auto-routing decisions by model and query complexity')
+            lines.append('# TYPE babybloom_route_decisions_total counter')
+            for (provider, complexity), n in sorted(self._routes.items()):
+                lines.append(f'babybloom_route_decisions_total{{provider="{label(provider)}",complexity="{complexity}"}} {n}')
+
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: str):
+        """原子写入Prometheus文本文件（供node_exporter textfile采集）"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def start_metrics_server(render: Optional[Callable[[], str]], port: int, host: str = '127.0.0.1',
+                         routes: Optional[Dict[str, Callable[[], Any]]] = None) -> ThreadingHTTPServer:
+    """
+    在后台线程启动HTTP端点，GET /metrics 返回 render() 的结果
+
+    Args:
+        render: 生成Prometheus文本的函数，为None时不提供 /metrics（如只提供就绪检查）
+        port: 监听端口
+        host: 监听地址（默认仅本机；需要从节点或负载均衡器访问时由部署显式指定 0.0.0.0）
+        routes: 额外的 路径 -> 处理函数 映射，处理函数返回文本、(状态码, 文本) 或 (状态码, 文本, Content-Type)
+
+    Returns:
+        已启动的HTTP服务器
+    """
+    handlers = {**({'/metrics': render} if render is not None else {}), **(routes or {})}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.split('?', 1)[0]
+            if path not in handlers:
+                self.send_error(404)
+                return
+            result = handlers[path]()
+            # 处理函数可返回 (状态码, 文本[, Content-Type])，如就绪检查未就绪时返回503、内容为JSON
+            if not isinstance(result, tuple):
+                result = (200, result)
+            status, text = result[:2]
+            content_type = result[2] if len(result) > 2 else PROMETHEUS_CONTENT_TYPE
+            body = text.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
+
+
+def start_file_exporter(registry: MetricsRegistry, path: str, interval: float = 15.0) -> threading.Thread:
+    """在后台线程定期把指标写入文件"""
+    def run():
+        while True:
+            try:
+                registry.write_prometheus(path)
+            except OSError as e:
+                print(f"指标文件写入失败: {e}")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name='metrics-file', daemon=True)
+    thread.start()
+    return thread
+
+
+# 测试代码
+if __name__ == "__main__":
+    registry = MetricsRegistry()
+    for latency in (0.8, 1.2, 3.5, 0.4):
+        registry.observe_call('通义千问', latency, prompt_tokens=estimate_tokens('生育津贴有多少钱？'),
+                              completion_tokens=120, ttfb=latency / 4)
+    registry.record_error('Gemini', 'timeout')
+    registry.record_cache('llm_response', hit=True)
+    registry.record_cache('llm_response', hit=False)
+    registry.record_context(rich_tokens=400, compact_tokens=250)
+    registry.record_degraded('retrieval')
+    registry.record_route('Gemini', 'simple')
+    registry.observe_render('chat', 0.012, 'fragment')
+    registry.observe_render('chat', 0.180, 'app')
+
+    print(registry.snapshot())
+    print(registry.to_prometheus())
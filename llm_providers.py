@@ -0,0 +1,393 @@
+"""
+LLM提供方统一异步接口 - 每个提供方实现 complete（完整回答）和 stream（逐段输出）
+所有请求在同一个后台事件循环中执行，Streamlit页面通过 AsyncBridge 同步调用；
+同时进行的多个请求共享一个事件循环和连接池，不再各自占用一个线程等待网络
+"""
+import asyncio
+import concurrent.futures
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from lazy_imports import is_available, load
+
+if TYPE_CHECKING:
+    import httpx
+
+# SDK在第一次发送请求时才导入（google-generativeai 会连带导入 grpc/protobuf，耗时较长），这里只探测是否已安装
+HTTPX_AVAILABLE = is_available('httpx')
+GEMINI_SDK_AVAILABLE = is_available('google.generativeai')
+# AsyncInferenceClient 在发送请求时才导入 aiohttp
+HF_ASYNC_AVAILABLE = is_available('huggingface_hub', 'aiohttp')
+
+# 可重试的HTTP状态码（仅在收到响应内容之前重试）
+RETRY_STATUS = frozenset({429, 500, 502, 503, 504})
+
+
+class LLMAPIError(Exception):
+    """LLM接口调用失败"""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class LLMProvider:
+    """
+    提供方接口
+
+    prompt 的形式由提供方决定：OpenAI兼容接口为消息列表，Gemini和TGI为提示词文本
+    """
+    name = 'base'
+
+    def available(self) -> bool:
+        """依赖库是否可用"""
+        return True
+
+    async def complete(self, prompt: Any, api_key: str) -> str:
+        """返回完整回答，失败时抛出异常"""
+        raise NotImplementedError
+
+    async def stream(self, prompt: Any, api_key: str) -> AsyncIterator[str]:
+        """逐段返回回答，失败时抛出异常"""
+        raise NotImplementedError
+        yield  # pragma: no cover
+
+    async def aclose(self):
+        """释放连接"""
+
+
+class _HTTPProvider(LLMProvider):
+    """基于 httpx.AsyncClient 的提供方：连接池、超时和指数退避重试"""
+
+    def __init__(self, base_url: str, connect_timeout: float = 5.0, read_timeout: float = 30.0,
+                 max_connections: int = 20, max_retries: int = 2, backoff: float = 0.5,
+                 backoff_max: float = 4.0):
+        self.base_url = base_url.rstrip('/')
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self._client = None
+
+    def available(self) -> bool:
+        return HTTPX_AVAILABLE
+
+    def _http(self) -> 'httpx.AsyncClient':
+        # 在事件循环线程中首次使用时创建，之后所有请求复用同一个连接池
+        if self._client is None:
+            httpx = load('httpx')
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                transport=httpx.AsyncHTTPTransport(retries=self.max_retries)  # 连接失败重试
+            )
+        return self._client
+
+    async def _sleep_backoff(self, attempt: int):
+        await asyncio.sleep(min(self.backoff_max, self.backoff * 2 ** attempt))
+
+    async def _post_json(self, url: str, payload: Dict[str, Any], headers: Dict[str, str]) -> Any:
+        """POST并返回JSON；429/5xx按指数退避重试"""
+        for attempt in range(self.max_retries + 1):
+            response = await self._http().post(url, json=payload, headers=headers)
+            if response.status_code in RETRY_STATUS and attempt < self.max_retries:
+                await self._sleep_backoff(attempt)
+                continue
+            if response.status_code != 200:
+                raise LLMAPIError(f"API调用失败: {response.status_code}", response.status_code)
+            return response.json()
+
+    async def _post_sse(self, url: str, payload: Dict[str, Any], headers: Dict[str, str]) -> AsyncIterator[str]:
+        """POST并逐条返回SSE事件的data字段；429/5xx在开始接收前按指数退避重试"""
+        for attempt in range(self.max_retries + 1):
+            async with self._http().stream('POST', url, json=payload, headers=headers) as response:
+                if response.status_code in RETRY_STATUS and attempt < self.max_retries:
+                    retry = True
+                elif response.status_code != 200:
+                    raise LLMAPIError(f"API调用失败: {response.status_code}", response.status_code)
+                else:
+                    retry = False
+                    async for line in response.aiter_lines():
+                        if line.startswith('data:'):
+                            yield line[len('data:'):].strip()
+            if not retry:
+                return
+            await self._sleep_backoff(attempt)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class OpenAICompatibleProvider(_HTTPProvider):
+    """OpenAI兼容的 /chat/completions 接口（通义千问 DashScope 兼容模式）"""
+
+    def __init__(self, name: str, base_url: str, model_id: str, **http_options):
+        super().__init__(base_url, **http_options)
+        self.name = name
+        self.model_id = model_id
+
+    def _request(self, messages: List[Dict[str, str]], api_key: str, stream: bool):
+        headers = {"Authorization": f"Bearer {api_key}"}
+        payload = {"model": self.model_id, "messages": messages}
+        if stream:
+            payload["stream"] = True
+        return f"{self.base_url}/chat/completions", payload, headers
+
+    async def complete(self, messages: List[Dict[str, str]], api_key: str) -> str:
+        result = await self._post_json(*self._request(messages, api_key, stream=False))
+        return result['choices'][0]['message']['content']
+
+    async def stream(self, messages: List[Dict[str, str]], api_key: str) -> AsyncIterator[str]:
+        async for data in self._post_sse(*self._request(messages, api_key, stream=True)):
+            if data == "[DONE]":
+                break
+            chunk = json.loads(data)
+            choices = chunk.get('choices') or [{}]
+            delta = choices[0].get('delta', {}).get('content')
+            if delta:
+                yield delta
+
+
+class GeminiProvider(_HTTPProvider):
+    """
+    Gemini：默认使用 google-generativeai 的异步接口；
+    配置了 base_url 时直接调用 generativelanguage REST 接口（如本地模拟服务）
+    """
+
+    def __init__(self, model_name: str, base_url: str = '', cache_size: int = 16, **http_options):
+        super().__init__(base_url, **http_options)
+        self.name = 'Gemini'
+        self.model_name = model_name
+        self.cache_size = cache_size
+        self._models: 'OrderedDict[str, Any]' = OrderedDict()
+        self._configured_key = None
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        return HTTPX_AVAILABLE if self.base_url else GEMINI_SDK_AVAILABLE
+
+    def _model(self, api_key: str):
+        """按Key缓存模型对象；genai.configure 是进程级全局配置，仅在Key变化时重新配置"""
+        genai = load('google.generativeai')
+        with self._lock:
+            if self._configured_key != api_key:
+                genai.configure(api_key=api_key)
+                self._configured_key = api_key
+            if api_key in self._models:
+                self._models.move_to_end(api_key)
+            else:
+                self._models[api_key] = genai.GenerativeModel(self.model_name)
+                while len(self._models) > self.cache_size:
+                    self._models.popitem(last=False)
+            return self._models[api_key]
+
+    def _rest_request(self, prompt: str, api_key: str, method: str):
+        url = f"{self.base_url}/v1beta/models/{self.model_name}:{method}"
+        if method == 'streamGenerateContent':
+            url += '?alt=sse'
+        payload = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+        return url, payload, {"x-goog-api-key": api_key}
+
+    @staticmethod
+    def _candidate_text(result: Dict[str, Any]) -> str:
+        candidates = result.get('candidates') or [{}]
+        parts = candidates[0].get('content', {}).get('parts') or []
+        return "".join(part.get('text', '') for part in parts)
+
+    async def complete(self, prompt: str, api_key: str) -> str:
+        if self.base_url:
+            return self._candidate_text(await self._post_json(*self._rest_request(prompt, api_key, 'generateContent')))
+        response = await self._model(api_key).generate_content_async(
+            prompt, request_options={'timeout': self.read_timeout}
+        )
+        return response.text
+
+    async def stream(self, prompt: str, api_key: str) -> AsyncIterator[str]:
+        if self.base_url:
+            async for data in self._post_sse(*self._rest_request(prompt, api_key, 'streamGenerateContent')):
+                text = self._candidate_text(json.loads(data))
+                if text:
+                    yield text
+            return
+        response = await self._model(api_key).generate_content_async(
+            prompt, stream=True, request_options={'timeout': self.read_timeout}
+        )
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+class HFInferenceProvider(LLMProvider):
+    """HuggingFace 推理API / TGI端点（AsyncInferenceClient），base_url 不为空时直连该端点"""
+
+    def __init__(self, model_id: str, base_url: str = '', max_new_tokens: int = 500,
+                 temperature: float = 0.7, read_timeout: float = 30.0, cache_size: int = 16):
+        self.name = 'Llama-3'
+        self.model_id = model_id
+        self.base_url = base_url
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.read_timeout = read_timeout
+        self.cache_size = cache_size
+        self._clients: 'OrderedDict[str, Any]' = OrderedDict()
+
+    def available(self) -> bool:
+        return HF_ASYNC_AVAILABLE
+
+    def _client(self, token: str):
+        """按Token缓存客户端，超出上限时淘汰最久未用的"""
+        if token in self._clients:
+            self._clients.move_to_end(token)
+        else:
+            AsyncInferenceClient = load('huggingface_hub').AsyncInferenceClient
+            self._clients[token] = AsyncInferenceClient(model=self.base_url or self.model_id, token=token,
+                                                        timeout=self.read_timeout)
+            while len(self._clients) > self.cache_size:
+                self._clients.popitem(last=False)
+        return self._clients[token]
+
+    async def complete(self, prompt: str, api_key: str) -> str:
+        return await self._client(api_key).text_generation(
+            prompt, max_new_tokens=self.max_new_tokens, temperature=self.temperature
+        )
+
+    async def stream(self, prompt: str, api_key: str) -> AsyncIterator[str]:
+        tokens = await self._client(api_key).text_generation(
+            prompt, max_new_tokens=self.max_new_tokens, temperature=self.temperature, stream=True
+        )
+        async for token in tokens:
+            if token:
+                yield token
+
+    async def aclose(self):
+        for client in self._clients.values():
+            close = getattr(client, 'close', None)
+            if close is not None:
+                await close()
+        self._clients.clear()
+
+
+# 关闭流式响应（取消进行中的读取并释放连接）的等待上限（秒）
+ITERATE_CLOSE_TIMEOUT = 2.0
+# 等待分片时检查取消信号的间隔（秒）
+ITERATE_CANCEL_POLL = 0.05
+
+
+class AsyncBridge:
+    """在后台线程运行一个事件循环，供同步代码（Streamlit脚本、工作线程）提交协程"""
+
+    def __init__(self, name: str = 'llm-async'):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coro) -> concurrent.futures.Future:
+        """提交协程，返回 concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout: Optional[float] = None):
+        """提交协程并阻塞等待结果；超时时取消协程"""
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def iterate(self, agen: AsyncIterator[str], timeout: Optional[float] = None,
+                deadline: Optional[float] = None,
+                cancel: Optional[threading.Event] = None) -> Iterator[str]:
+        """
+        把异步生成器转为同步生成器；调用方提前关闭（对冲落败、用户取消）时关闭异步生成器并释放连接
+
+        Args:
+            agen: 异步生成器
+            timeout: 等待每个分片的超时（秒）
+            deadline: 首个分片的截止时间（time.monotonic()），到期仍未收到首个分片时抛出超时；
+                开始输出后只受 timeout 限制，不截断已经展示给用户的回答
+            cancel: 取消信号；等待分片期间被设置时立即取消进行中的读取并结束迭代（对冲落败的一方不必等到下一个分片）
+        """
+        pending = {}
+
+        async def next_item():
+            pending['task'] = asyncio.current_task()
+            return await agen.__anext__()
+
+        async def close():
+            # 超时或提前关闭时 __anext__ 可能仍在执行：先取消并等它退出，再关闭生成器，
+            # 否则 aclose() 会因"asynchronous generator is already running"失败，连接不能释放
+            task = pending.get('task')
+            if task is not None and not task.done():
+                task.cancel()
+                await asyncio.wait({task})
+            await agen.aclose()
+
+        try:
+            started = False
+            while True:
+                wait = timeout
+                if deadline is not None and not started:
+                    left = max(0.0, deadline - time.monotonic())
+                    wait = left if wait is None else min(wait, left)
+                limit = None if wait is None else time.monotonic() + wait
+                future = self.submit(next_item())
+                while True:
+                    if cancel is not None and cancel.is_set():
+                        return
+                    left = None if limit is None else max(0.0, limit - time.monotonic())
+                    poll = left
+                    if cancel is not None:
+                        poll = ITERATE_CANCEL_POLL if left is None else min(ITERATE_CANCEL_POLL, left)
+                    try:
+                        item = future.result(poll)
+                        break
+                    except StopAsyncIteration:
+                        return
+                    except concurrent.futures.TimeoutError:
+                        if limit is not None and time.monotonic() >= limit:
+                            raise
+                started = True
+                yield item
+        finally:
+            try:
+                self.submit(close()).result(ITERATE_CLOSE_TIMEOUT)
+            except Exception as e:
+                print(f"关闭流式响应失败: {type(e).__name__}: {e}")
+
+    def close(self, providers: Optional[Dict[str, LLMProvider]] = None):
+        """关闭提供方连接并停止事件循环"""
+        for provider in (providers or {}).values():
+            self.run(provider.aclose())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+
+
+# 测试代码：需先启动本地模拟服务 python mock_llm_server.py --port 8808
+if __name__ == "__main__":
+    bridge = AsyncBridge()
+    qwen = OpenAICompatibleProvider('通义千问', 'http://127.0.0.1:8808/v1', 'qwen-max')
+    messages = [{"role": "user", "content": "生育津贴有多少钱？"}]
+
+    print(bridge.run(qwen.complete(messages, 'mock'))[:40])
+    print("".join(bridge.iterate(qwen.stream(messages, 'mock')))[:40])
+
+    # 20个并发请求共享一个事件循环
+    async def fan_out():
+        return await asyncio.gather(*(qwen.complete(messages, 'mock') for _ in range(20)))
+
+    start = time.perf_counter()
+    answers = bridge.run(fan_out())
+    print(f"{len(answers)} 个并发请求耗时 {time.perf_counter() - start:.2f}秒，活动线程数 {threading.active_count()}")
+    bridge.close({'qwen': qwen})
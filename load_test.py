@@ -0,0 +1,337 @@
+"""
+并发会话压测 - 用 Streamlit AppTest 模拟多个用户会话访问问答、推荐、计算和时间规划页面
+输出各页面 P50/P95 延迟、吞吐量、错误率以及进程 CPU、内存，结果为JSON，便于版本间对比
+
+用法：
+    python load_test.py --users 50 --duration 120 --mock-llm --output results.json
+    python load_test.py --users 50 --duration 120 --baseline results_prev.json
+
+说明：AppTest 在本进程内执行 app.py，所有模拟会话共享 st.cache_resource 资源和 subsystems 中的进程级对象，
+与单个 Streamlit 服务进程的情况一致；--mock-llm 会启动本地模拟LLM服务并让各模型指向它。
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from translation_manager import TranslationManager
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+try:
+    import resource  # 仅Unix
+except ImportError:
+    resource = None
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+PAGES = {
+    'chat': "智能问答",
+    'recommendation': "政策推荐",
+    'calculator': "津贴计算",
+    'timeline': "时间规划",
+}
+
+# 页面访问比例（问答为主）
+PAGE_WEIGHTS = {'chat': 0.6, 'recommendation': 0.15, 'calculator': 0.15, 'timeline': 0.1}
+
+# 问题组合：标准问题、个性化问题、追问、多语言
+QUESTIONS = [
+    ("生育津贴有多少钱？", 5),
+    ("第二胎的婴儿花红是多少？", 4),
+    ("BTO的收入上限是多少？", 4),
+    ("产假有几周？爸爸有陪产假吗？", 3),
+    ("我是PR，月收入6000，可以申请哪些住房补贴？", 3),
+    ("和父母住得近有什么津贴？", 2),
+    ("儿童发展账户政府怎么配对？", 2),
+    ("那第三胎呢？", 2),
+    ("How much is the Baby Bonus for a first child?", 2),
+    ("Berapakah geran perumahan untuk pasangan muda?", 1),
+    ("托儿所补贴怎么申请，需要什么材料？", 1),
+]
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """分位数（p取0-100），无样本时返回None"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class ResourceSampler:
+    """后台线程定期采样本进程CPU和RSS；未安装psutil时只记录CPU时间和RSS峰值"""
+
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self.cpu_samples: List[float] = []
+        self.rss_samples: List[float] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='resource-sampler', daemon=True)
+        self._process = psutil.Process() if PSUTIL_AVAILABLE else None
+        self._cpu_start = time.process_time()
+        self._wall_start = time.monotonic()
+
+    def _run(self):
+        if self._process is None:
+            return
+        self._process.cpu_percent(None)
+        while not self._stop.wait(self.interval):
+            self.cpu_samples.append(self._process.cpu_percent(None))
+            self.rss_samples.append(self._process.memory_info().rss / 1024 / 1024)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Dict[str, Any]:
+        """停止采样并返回汇总"""
+        self._stop.set()
+        self._thread.join()
+        cpu_seconds = time.process_time() - self._cpu_start
+        wall_seconds = time.monotonic() - self._wall_start
+        summary = {
+            'cpu_seconds': cpu_seconds,
+            'cpu_percent_avg': 100 * cpu_seconds / wall_seconds if wall_seconds else 0.0,
+        }
+        if resource is not None:
+            # Linux上 ru_maxrss 单位为KB，macOS为字节
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            summary['rss_peak_mb'] = peak / 1024 / 1024 if platform.system() == 'Darwin' else peak / 1024
+        if self.cpu_samples:
+            summary['cpu_percent_p95'] = percentile(self.cpu_samples, 95)
+            summary['rss_end_mb'] = self.rss_samples[-1]
+        return summary
+
+
+class SimulatedUser:
+    """一个模拟用户会话：打开应用后按权重随机访问页面"""
+
+    def __init__(self, user_id: int, rng: random.Random, timeout: float, labels: Dict[str, str]):
+        from streamlit.testing.v1 import AppTest
+
+        self.user_id = user_id
+        self.rng = rng
+        self.timeout = timeout
+        self.labels = labels
+        self.app = AppTest.from_file(APP_PATH, default_timeout=timeout)
+
+    def _run(self, action) -> Optional[str]:
+        """执行一次交互并返回错误描述（成功返回None）"""
+        try:
+            action()
+        except Exception as e:
+            return f"{type(e).__name__}: {e}"
+        if len(self.app.exception):
+            return self.app.exception[0].message
+        return None
+
+    def _click(self, label: str):
+        for button in self.app.button:
+            if button.label == label:
+                button.click().run()
+                return
+        raise LookupError(f"未找到按钮: {label}")
+
+    def open(self) -> Tuple[str, float, Optional[str]]:
+        """首次打开应用"""
+        start = time.perf_counter()
+        error = self._run(self.app.run)
+        return 'startup', time.perf_counter() - start, error
+
+    def step(self) -> Tuple[str, float, Optional[str]]:
+        """随机访问一个页面并执行该页面的主要操作"""
+        page = self.rng.choices(list(PAGE_WEIGHTS), weights=list(PAGE_WEIGHTS.values()))[0]
+
+        def action():
+            self.app.session_state['current_page'] = PAGES[page]
+            if page == 'chat':
+                question = self.rng.choices([q for q, _ in QUESTIONS], weights=[w for _, w in QUESTIONS])[0]
+                self.app.run()
+                self.app.chat_input[0].set_value(question).run()
+            elif page == 'recommendation':
+                self.app.run()
+                self._click(self.labels['rec_button'])
+            elif page == 'calculator':
+                self.app.run()
+                key = self.rng.choice(['calc_fertility', 'calc_housing'])
+                self.app.button(key=key).click().run()
+            else:
+                self.app.run()
+                self._click(self.labels['timeline_generate'])
+
+        start = time.perf_counter()
+        error = self._run(action)
+        return page, time.perf_counter() - start, error
+
+
+def start_mock_llm(args) -> Any:
+    """启动本地模拟LLM服务，并通过环境变量让 app.py 的各模型指向它"""
+    from mock_llm_server import MockConfig, start_mock_server
+
+    config = MockConfig(
+        latency_median=args.mock_latency,
+        tokens_per_second=args.mock_tokens_per_second,
+        error_rate=args.mock_error_rate,
+        seed=args.seed
+    )
+    server = start_mock_server(config, port=args.mock_port)
+    base = f"http://127.0.0.1:{args.mock_port}"
+    os.environ.update({
+        'QWEN_BASE_URL': f"{base}/v1",
+        'GEMINI_BASE_URL': base,
+        'LLAMA_BASE_URL': f"{base}/hf",
+        'QWEN_API_KEY': os.environ.get('QWEN_API_KEY') or 'mock',
+        'GEMINI_API_KEY': os.environ.get('GEMINI_API_KEY') or 'mock',
+        'HF_TOKEN': os.environ.get('HF_TOKEN') or 'mock',
+    })
+    return server
+
+
+def summarize(samples: List[Tuple[str, float, Optional[str]]], wall_seconds: float) -> Dict[str, Any]:
+    """按页面汇总延迟和错误"""
+    pages: Dict[str, Dict[str, Any]] = {}
+    for name in ['startup', *PAGES]:
+        latencies = [latency for page, latency, _ in samples if page == name]
+        errors = [error for page, _, error in samples if page == name and error]
+        if not latencies:
+            continue
+        pages[name] = {
+            'count': len(latencies),
+            'errors': len(errors),
+            'error_rate': len(errors) / len(latencies),
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'max': max(latencies),
+            'sample_errors': sorted(set(errors))[:5],
+        }
+
+    interactions = [s for s in samples if s[0] != 'startup']
+    failed = sum(1 for _, _, error in interactions if error)
+    return {
+        'pages': pages,
+        'interactions': len(interactions),
+        'throughput_per_second': len(interactions) / wall_seconds if wall_seconds else 0.0,
+        'error_rate': failed / len(interactions) if interactions else 0.0,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Any]:
+    """与基线结果对比（正数表示变慢/变差）"""
+    diff = {'pages': {}}
+    for name, stats in current['pages'].items():
+        base = baseline.get('pages', {}).get(name)
+        if not base:
+            continue
+        diff['pages'][name] = {
+            metric: stats[metric] - base[metric]
+            for metric in ('p50', 'p95', 'error_rate')
+            if stats.get(metric) is not None and base.get(metric) is not None
+        }
+    diff['throughput_per_second'] = current['throughput_per_second'] - baseline.get('throughput_per_second', 0.0)
+    return diff
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=os.path.dirname(APP_PATH), text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_load_test(args) -> Dict[str, Any]:
+    """执行压测并返回结果"""
+    translator = TranslationManager()
+    labels = {key: translator.get(key, 'zh') for key in ('rec_button', 'timeline_generate')}
+    samples: List[Tuple[str, float, Optional[str]]] = []
+    samples_lock = threading.Lock()
+    deadline = time.monotonic() + args.ramp_up + args.duration
+
+    def user_loop(user_id: int):
+        rng = random.Random(None if args.seed is None else args.seed + user_id)
+        # 在 ramp_up 时间内均匀启动各用户
+        time.sleep(args.ramp_up * user_id / max(1, args.users))
+        user = SimulatedUser(user_id, rng, args.timeout, labels)
+        results = [user.open()]
+        steps = 0
+        while time.monotonic() < deadline and (not args.iterations or steps < args.iterations):
+            results.append(user.step())
+            steps += 1
+            if args.think_time:
+                time.sleep(rng.uniform(0, 2 * args.think_time))
+        with samples_lock:
+            samples.extend(results)
+
+    sampler = ResourceSampler()
+    sampler.start()
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.users, thread_name_prefix='user') as executor:
+        list(executor.map(user_loop, range(args.users)))
+    wall_seconds = time.monotonic() - start
+
+    result = {
+        'revision': git_revision(),
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': {
+            'users': args.users,
+            'duration': args.duration,
+            'iterations': args.iterations,
+            'ramp_up': args.ramp_up,
+            'think_time': args.think_time,
+            'mock_llm': args.mock_llm,
+        },
+        'wall_seconds': wall_seconds,
+        **summarize(samples, wall_seconds),
+        'resources': sampler.stop(),
+    }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='BabyBloomSG 并发会话压测')
+    parser.add_argument('--users', type=int, default=50, help='并发模拟用户数')
+    parser.add_argument('--duration', type=float, default=60, help='压测时长（秒，不含ramp-up）')
+    parser.add_argument('--iterations', type=int, default=0, help='每个用户的最大操作数（0表示不限）')
+    parser.add_argument('--ramp-up', type=float, default=10, help='用户逐步启动的时间（秒）')
+    parser.add_argument('--think-time', type=float, default=1.0, help='两次操作间的平均思考时间（秒）')
+    parser.add_argument('--timeout', type=float, default=60, help='单次交互超时（秒）')
+    parser.add_argument('--seed', type=int, default=None, help='随机种子')
+    parser.add_argument('--output', help='结果JSON输出路径（默认打印到标准输出）')
+    parser.add_argument('--baseline', help='基线结果JSON，用于对比')
+    parser.add_argument('--mock-llm', action='store_true', help='启动本地模拟LLM服务')
+    parser.add_argument('--mock-port', type=int, default=8808)
+    parser.add_argument('--mock-latency', type=float, default=0.8, help='模拟服务首字节延迟中位数（秒）')
+    parser.add_argument('--mock-tokens-per-second', type=float, default=50)
+    parser.add_argument('--mock-error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.mock_llm:
+        start_mock_llm(args)
+
+    result = run_load_test(args)
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            result['comparison'] = compare(result, json.load(f))
+
+    output = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+        print(f"压测结果已写入 {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+内存占用报告 - 估算每个会话状态的大小和进程级共享对象的大小
+只读数据（翻译表、知识库、推荐/时间线引擎）在进程内只保存一份，会话里只应有用户自己的状态；
+这里按会话汇总 session_state 的近似字节数，用来确认内存不会随并发会话数线性增长在只读数据上
+"""
+import os
+import sys
+import threading
+import time
+import types
+from collections import deque
+from typing import Any, Dict, Iterable, Mapping, Optional
+
+# 不展开的对象：模块、类、函数和线程只计本身大小，它们引用的通常是进程级共享的东西
+_OPAQUE = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType,
+           types.MethodType, threading.Thread)
+
+
+def deep_sizeof(obj: Any, exclude: Iterable[Any] = ()) -> int:
+    """
+    对象及其引用的容器和属性的总字节数（近似值，同一对象只计一次）
+
+    Args:
+        obj: 要统计的对象
+        exclude: 不计入的对象（如进程级共享的引擎），其引用的内容也不计入
+    """
+    seen = {id(item) for item in exclude}
+    total = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        try:
+            total += sys.getsizeof(current)
+        except TypeError:
+            continue
+        if isinstance(current, (str, bytes, bytearray, int, float, complex, bool)) or current is None:
+            continue
+        if isinstance(current, _OPAQUE):
+            continue
+        if isinstance(current, Mapping):
+            for key, value in list(current.items()):
+                stack.append(key)
+                stack.append(value)
+        elif isinstance(current, (list, tuple, set, frozenset, deque)):
+            stack.extend(list(current))
+        else:
+            attributes = getattr(current, '__dict__', None)
+            if attributes is not None:
+                stack.append(attributes)
+            for slot in getattr(type(current), '__slots__', ()):
+                if hasattr(current, slot):
+                    stack.append(getattr(current, slot))
+    return total
+
+
+def footprint(state: Mapping[str, Any], exclude: Iterable[Any] = ()) -> Dict[str, int]:
+    """按键统计字节数，如 footprint(st.session_state.to_dict(), exclude=[共享对象...])"""
+    exclude = list(exclude)
+    return {key: deep_sizeof(value, exclude) for key, value in state.items()}
+
+
+def process_rss() -> Optional[int]:
+    """进程当前常驻内存（字节）；Linux 读取 /proc，其他平台返回峰值，无法获取时为None"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except (ImportError, OSError):
+        return None
+
+
+class SessionMemoryReport:
+    """各会话最近一次统计的 session_state 大小（线程安全，进程内共享）"""
+
+    def __init__(self, idle_seconds: float = 1800.0):
+        """
+        Args:
+            idle_seconds: 超过该时间没有更新的会话视为已离开，不再计入
+        """
+        self.idle_seconds = idle_seconds
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, session_id: str, sizes: Dict[str, int]):
+        """记录一个会话的统计结果"""
+        with self._lock:
+            self._sessions[session_id] = {'sizes': dict(sizes), 'total': sum(sizes.values()), 'at': time.time()}
+
+    def summary(self) -> Dict[str, Any]:
+        """活跃会话数、会话状态总大小/平均/最大值，以及平均大小最大的几个键"""
+        now = time.time()
+        with self._lock:
+            for session_id in [sid for sid, entry in self._sessions.items()
+                               if now - entry['at'] > self.idle_seconds]:
+                del self._sessions[session_id]
+            entries = list(self._sessions.values())
+        if not entries:
+            return {'sessions': 0, 'total': 0, 'mean': 0, 'max': 0, 'top_keys': []}
+        totals = [entry['total'] for entry in entries]
+        by_key: Dict[str, int] = {}
+        for entry in entries:
+            for key, size in entry['sizes'].items():
+                by_key[key] = by_key.get(key, 0) + size
+        top_keys = sorted(((key, size // len(entries)) for key, size in by_key.items()), key=lambda item: -item[1])
+        return {
+            'sessions': len(entries),
+            'total': sum(totals),
+            'mean': sum(totals) // len(entries),
+            'max': max(totals),
+            'top_keys': top_keys[:5]
+        }
+
+
+def format_bytes(size: Optional[float]) -> str:
+    """字节数转为 KB/MB 文本"""
+    if size is None:
+        return '-'
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+# 测试代码
+if __name__ == "__main__":
+    from policy_kb import POLICY_KB
+    from translation_manager import TranslationManager
+
+    translator = TranslationManager()
+    print("翻译表:", format_bytes(deep_sizeof(translator)), " 知识库:", format_bytes(deep_sizeof(POLICY_KB)))
+
+    # 原实现：每个会话各自持有一份 TranslationManager
+    report = SessionMemoryReport()
+    for i in range(20):
+        old_state = {'translator': TranslationManager(), 'language': 'zh',
+                     'messages': [{'role': 'user', 'content': '生育津贴有多少？' * 3}] * 4}
+        report.record(f"old-{i}", footprint(old_state))
+    old = report.summary()
+
+    # 共享后：会话里只剩用户自己的状态，共享对象引用不计入
+    report = SessionMemoryReport()
+    for i in range(20):
+        state = {'language': 'zh', 'messages': [{'role': 'user', 'content': '生育津贴有多少？' * 3}] * 4}
+        report.record(f"new-{i}", footprint(state, exclude=[translator, POLICY_KB]))
+    new = report.summary()
+
+    print(f"20个会话 - 每会话持有翻译表: {format_bytes(old['total'])}（平均 {format_bytes(old['mean'])}），"
+          f"进程共享: {format_bytes(new['total'])}（平均 {format_bytes(new['mean'])}）")
+    print("进程常驻内存:", format_bytes(process_rss()))
+    assert new['mean'] * 10 < old['mean']
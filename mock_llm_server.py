@@ -0,0 +1,336 @@
+"""
+本地模拟LLM服务 - 离线压测和端到端基准测试用
+兼容以下接口（含流式输出），延迟分布、错误率和输出速度均可配置：
+  - 通义千问 DashScope OpenAI兼容接口: POST /v1/chat/completions
+  - Gemini REST接口: POST /v1beta/models/<模型>:generateContent / :streamGenerateContent
+  - HuggingFace TGI接口: POST /hf（InferenceClient 以URL作为模型）
+
+用法：
+    python mock_llm_server.py --port 8808 --latency-median 0.8 --error-rate 0.05
+然后在 .env 中指向本服务（Key可以任意填写）：
+    QWEN_BASE_URL=http://127.0.0.1:8808/v1
+    GEMINI_BASE_URL=http://127.0.0.1:8808
+    LLAMA_BASE_URL=http://127.0.0.1:8808/hf
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, Optional
+
+_GEMINI_PATH = re.compile(r'^/v1beta/models/([^/:]+):(generateContent|streamGenerateContent)$')
+
+_FILLER = (
+    "根据新加坡现行家庭政策，婴儿花红计划为第一胎和第二胎提供S$11,000的现金奖励，"
+    "第三胎及以上为S$13,000。🍼 政府还会在儿童发展账户中按1:1配对父母储蓄。"
+    "工作母亲可享受16周带薪产假，父亲可享受4周陪产假。💡 具体金额请以官方网站为准。"
+)
+
+
+@dataclass
+class MockConfig:
+    """模拟服务行为配置"""
+    latency_median: float = 0.5     # 首字节延迟中位数（秒），对数正态分布
+    latency_sigma: float = 0.5      # 对数正态分布的sigma，越大长尾越重
+    tokens_per_second: float = 50.0  # 输出速度
+    response_tokens: int = 200      # 每个回答的token数（按一个汉字一个token计）
+    error_rate: float = 0.0         # 返回错误状态码的概率
+    error_status: int = 503         # 错误状态码
+    stall_rate: float = 0.0         # 长时间无响应的概率（用于测试超时）
+    stall_seconds: float = 60.0     # 无响应时长（秒）
+    seed: Optional[int] = None
+
+
+class MockStats:
+    """请求统计（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+        self.started_at = time.time()
+
+    def incr(self, name: str):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            return {'uptime': time.time() - self.started_at, **self.counts}
+
+
+def make_handler(config: MockConfig, stats: MockStats, rng: random.Random):
+    """创建绑定配置的请求处理类"""
+    rng_lock = threading.Lock()
+
+    def sample(fn):
+        with rng_lock:
+            return fn(rng)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        # ---------- 通用 ----------
+        def log_message(self, format, *args):
+            pass
+
+        def _read_json(self) -> dict:
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length) if length else b''
+            try:
+                return json.loads(body or b'{}')
+            except json.JSONDecodeError:
+                return {}
+
+        def _send_json(self, status: int, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _start_sse(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+            self.end_headers()
+
+        def _send_event(self, payload) -> bool:
+            data = payload if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False)
+            try:
+                self.wfile.write(f"data: {data}\n\n".encode('utf-8'))
+                self.wfile.flush()
+                return True
+            except (BrokenPipeError, ConnectionResetError):
+                # 客户端已取消（如对冲请求落败）
+                stats.incr('client_disconnects')
+                return False
+
+        def _inject_failure(self, api: str) -> bool:
+            """按配置模拟无响应或错误，已处理时返回True"""
+            if sample(lambda r: r.random()) < config.stall_rate:
+                stats.incr(f'{api}_stalls')
+                time.sleep(config.stall_seconds)
+            if sample(lambda r: r.random()) < config.error_rate:
+                stats.incr(f'{api}_errors')
+                self._send_json(config.error_status, {
+                    'error': {'code': config.error_status, 'message': 'mock injected error'}
+                })
+                return True
+            return False
+
+        def _wait_first_byte(self):
+            median = max(config.latency_median, 1e-6)
+            time.sleep(sample(lambda r: r.lognormvariate(math.log(median), config.latency_sigma)))
+
+        def _tokens(self, question: str) -> Iterator[str]:
+            """逐个输出模拟回答的token，按配置的速度节流"""
+            text = f"（模拟回答）关于「{question.strip()[-30:]}」：" + _FILLER
+            while len(text) < config.response_tokens:
+                text += _FILLER
+            interval = 1.0 / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+            for char in text[:config.response_tokens]:
+                if interval:
+                    time.sleep(interval)
+                yield char
+
+        def _answer(self, question: str) -> str:
+            self._wait_first_byte()
+            return "".join(self._tokens(question))
+
+        # ---------- 路由 ----------
+        def do_GET(self):
+            path = self.path.split('?', 1)[0]
+            if path == '/health':
+                self._send_json(200, {'status': 'ok'})
+            elif path == '/stats':
+                self._send_json(200, stats.snapshot())
+            else:
+                self._send_json(404, {'error': 'not found'})
+
+        def do_POST(self):
+            path = self.path.split('?', 1)[0].rstrip('/')
+            payload = self._read_json()
+
+            if path.endswith('/chat/completions'):
+                self._openai(payload)
+                return
+            match = _GEMINI_PATH.match(path)
+            if match:
+                self._gemini(payload, match.group(1), stream=match.group(2) == 'streamGenerateContent')
+                return
+            if path == '/hf' or path.startswith('/hf/'):
+                self._tgi(payload)
+                return
+            self._send_json(404, {'error': 'not found'})
+
+        # ---------- DashScope / OpenAI兼容 ----------
+        def _openai(self, payload: dict):
+            stats.incr('openai_requests')
+            if self._inject_failure('openai'):
+                return
+
+            messages = payload.get('messages') or [{}]
+            question = str(messages[-1].get('content', ''))
+            model = payload.get('model', 'mock')
+            response_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+            if not payload.get('stream'):
+                answer = self._answer(question)
+                self._send_json(200, {
+                    'id': response_id,
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': model,
+                    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': answer},
+                                 'finish_reason': 'stop'}],
+                    'usage': {'prompt_tokens': len(question), 'completion_tokens': len(answer),
+                              'total_tokens': len(question) + len(answer)}
+                })
+                return
+
+            self._wait_first_byte()
+            self._start_sse()
+            for token in self._tokens(question):
+                if not self._send_event({
+                    'id': response_id,
+                    'object': 'chat.completion.chunk',
+                    'created': int(time.time()),
+                    'model': model,
+                    'choices': [{'index': 0, 'delta': {'content': token}, 'finish_reason': None}]
+                }):
+                    return
+            self._send_event({
+                'id': response_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]
+            })
+            self._send_event('[DONE]')
+
+        # ---------- Gemini REST ----------
+        def _gemini(self, payload: dict, model: str, stream: bool):
+            stats.incr('gemini_requests')
+            if self._inject_failure('gemini'):
+                return
+
+            contents = payload.get('contents') or [{}]
+            parts = contents[-1].get('parts') or [{}]
+            question = str(parts[0].get('text', ''))
+
+            def candidate(text: str, finish: Optional[str]) -> dict:
+                body = {'content': {'parts': [{'text': text}], 'role': 'model'}, 'index': 0}
+                if finish:
+                    body['finishReason'] = finish
+                return {'candidates': [body], 'modelVersion': model}
+
+            if not stream:
+                self._send_json(200, candidate(self._answer(question), 'STOP'))
+                return
+
+            self._wait_first_byte()
+            self._start_sse()
+            buffer = []
+            for token in self._tokens(question):
+                buffer.append(token)
+                # Gemini按较大的片段输出
+                if len(buffer) >= 8:
+                    if not self._send_event(candidate("".join(buffer), None)):
+                        return
+                    buffer = []
+            self._send_event(candidate("".join(buffer), 'STOP'))
+
+        # ---------- HuggingFace TGI ----------
+        def _tgi(self, payload: dict):
+            stats.incr('tgi_requests')
+            if self._inject_failure('tgi'):
+                return
+
+            question = str(payload.get('inputs', ''))
+            if not payload.get('stream'):
+                self._send_json(200, [{'generated_text': self._answer(question)}])
+                return
+
+            self._wait_first_byte()
+            self._start_sse()
+            generated = []
+            for index, token in enumerate(self._tokens(question)):
+                generated.append(token)
+                if not self._send_event({
+                    'index': index,
+                    'token': {'id': index, 'text': token, 'logprob': 0.0, 'special': False},
+                    'generated_text': None,
+                    'details': None
+                }):
+                    return
+            self._send_event({
+                'index': len(generated),
+                'token': {'id': len(generated), 'text': '', 'logprob': 0.0, 'special': True},
+                'generated_text': "".join(generated),
+                'details': None
+            })
+
+    return Handler
+
+
+def start_mock_server(config: MockConfig, host: str = '127.0.0.1', port: int = 8808) -> ThreadingHTTPServer:
+    """
+    在后台线程启动模拟服务（供压测脚本内嵌使用）
+
+    Returns:
+        已启动的HTTP服务器，server.mock_stats 为请求统计
+    """
+    stats = MockStats()
+    server = ThreadingHTTPServer((host, port), make_handler(config, stats, random.Random(config.seed)))
+    server.daemon_threads = True
+    server.mock_stats = stats
+    threading.Thread(target=server.serve_forever, name='mock-llm', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟LLM服务（DashScope / Gemini / HuggingFace TGI）')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8808)
+    parser.add_argument('--latency-median', type=float, default=MockConfig.latency_median, help='首字节延迟中位数（秒）')
+    parser.add_argument('--latency-sigma', type=float, default=MockConfig.latency_sigma, help='对数正态分布sigma')
+    parser.add_argument('--tokens-per-second', type=float, default=MockConfig.tokens_per_second, help='输出速度，0表示不限速')
+    parser.add_argument('--response-tokens', type=int, default=MockConfig.response_tokens, help='每个回答的token数')
+    parser.add_argument('--error-rate', type=float, default=MockConfig.error_rate, help='返回错误的概率')
+    parser.add_argument('--error-status', type=int, default=MockConfig.error_status, help='错误状态码')
+    parser.add_argument('--stall-rate', type=float, default=MockConfig.stall_rate, help='长时间无响应的概率')
+    parser.add_argument('--stall-seconds', type=float, default=MockConfig.stall_seconds, help='无响应时长（秒）')
+    parser.add_argument('--seed', type=int, default=None, help='随机种子')
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency_median=args.latency_median,
+        latency_sigma=args.latency_sigma,
+        tokens_per_second=args.tokens_per_second,
+        response_tokens=args.response_tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        stall_rate=args.stall_rate,
+        stall_seconds=args.stall_seconds,
+        seed=args.seed
+    )
+    server = start_mock_server(config, args.host, args.port)
+    print(f"模拟LLM服务已启动: http://{args.host}:{args.port}  ({config})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
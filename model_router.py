@@ -0,0 +1,176 @@
+"""
+自适应模型路由 - "自动"模式下按问题复杂度和各模型的实时延迟选择模型
+简单问题（包括问候和未识别出政策类别的短问题）交给当前最快的健康模型，
+长问题、多意图、多部分或带个人情况的问题交给能力最强的模型
+"""
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from llm_metrics import estimate_tokens
+
+SIMPLE = 'simple'
+COMPLEX = 'complex'
+
+# 多部分问题的标志：连接词（中/英/马来）和编号列表
+_MULTI_PART = re.compile(
+    r'以及|并且|同时|另外|还有|分别|哪些.*(?:和|与)'
+    r'|\b(?:and also|as well as|also|besides|respectively)\b'
+    r'|\b(?:serta|dan juga|selain itu)\b'
+    r'|(?:^|\s)[1-9][.)、]',
+    re.IGNORECASE
+)
+_QUESTION_MARK = re.compile(r'[?？]')
+# 带个人情况的问题：第一人称并给出具体数字（收入、年龄、子女数等），需要结合条件计算
+_PERSONAL = re.compile(
+    r'(?:我|我们|我家|\b(?:my|our|i|we|saya|kami)\b).*\d',
+    re.IGNORECASE
+)
+
+
+def assess_complexity(question: str, intents: Sequence[str], long_question_tokens: int = 40) -> Tuple[str, List[str]]:
+    """
+    判断问题复杂度
+
+    Args:
+        question: 用户问题
+        intents: detect_intents() 识别的意图（多标签），'general' 表示未识别出具体政策类别；
+            'general' 本身不算复杂（问候、闲聊等），只按长度、多意图、多部分和个人情况升级
+        long_question_tokens: 超过该估算token数视为长问题
+
+    Returns:
+        (SIMPLE / COMPLEX, 判定原因列表)
+    """
+    reasons = []
+    if len([intent for intent in intents if intent != 'general']) > 1:
+        reasons.append('multi_intent')
+    if estimate_tokens(question) > long_question_tokens:
+        reasons.append('long')
+    if len(_QUESTION_MARK.findall(question)) >= 2 or _MULTI_PART.search(question):
+        reasons.append('multi_part')
+    if _PERSONAL.search(question):
+        reasons.append('personal')
+    return (COMPLEX if reasons else SIMPLE), reasons
+
+
+@dataclass
+class RoutingDecision:
+    """一次路由决策"""
+    model: str
+    complexity: str
+    reasons: List[str]
+    latencies: Dict[str, float]
+    intents: List[str] = field(default_factory=list)
+    at: float = field(default_factory=time.time)
+
+
+class ModelRouter:
+    """按EWMA延迟和模型能力选择模型（线程安全，进程内共享）"""
+
+    def __init__(self, model_config: Dict[str, Dict[str, Any]], alpha: float = 0.3,
+                 long_question_tokens: int = 40, log_size: int = 100):
+        """
+        Args:
+            model_config: 模型配置，读取每个模型的 quality（能力排序，越大越强）和 latency_prior（无样本时的预估延迟，秒）
+            alpha: EWMA平滑系数，越大越偏向最近的调用
+            long_question_tokens: 长问题阈值（估算token数）
+            log_size: 保留的最近路由决策条数
+        """
+        self.alpha = alpha
+        self.long_question_tokens = long_question_tokens
+        self.quality = {name: cfg.get('quality', 0) for name, cfg in model_config.items()}
+        self.priors = {name: cfg.get('latency_prior', 5.0) for name, cfg in model_config.items()}
+        self._lock = threading.Lock()
+        self._ewma: Dict[str, float] = {}
+        self._samples: Dict[str, int] = {}
+        self._log = deque(maxlen=log_size)
+
+    def observe(self, model: str, seconds: float):
+        """记录一次成功调用的耗时"""
+        with self._lock:
+            previous = self._ewma.get(model)
+            self._ewma[model] = seconds if previous is None else self.alpha * seconds + (1 - self.alpha) * previous
+            self._samples[model] = self._samples.get(model, 0) + 1
+
+    def latency(self, model: str) -> float:
+        """模型的EWMA延迟；尚无样本时使用配置的预估值"""
+        with self._lock:
+            return self._ewma.get(model, self.priors.get(model, 5.0))
+
+    def route(self, question: str, intents: Sequence[str], candidates: Sequence[str]) -> Optional[RoutingDecision]:
+        """
+        选择模型
+
+        Args:
+            question: 用户问题
+            intents: 识别的意图（多标签）
+            candidates: 当前可用的模型（已配置Key、依赖可用且未熔断）
+
+        Returns:
+            路由决策，没有可用模型时为None
+        """
+        if not candidates:
+            return None
+        complexity, reasons = assess_complexity(question, intents, self.long_question_tokens)
+        latencies = {name: self.latency(name) for name in candidates}
+        if complexity == SIMPLE:
+            model = min(candidates, key=lambda name: (latencies[name], -self.quality.get(name, 0)))
+        else:
+            model = max(candidates, key=lambda name: (self.quality.get(name, 0), -latencies[name]))
+
+        decision = RoutingDecision(model, complexity, reasons, latencies, list(intents))
+        with self._lock:
+            self._log.append(decision)
+        return decision
+
+    def decisions(self, limit: int = 10) -> List[RoutingDecision]:
+        """最近的路由决策（新的在前）"""
+        with self._lock:
+            return list(self._log)[-limit:][::-1]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """各模型的EWMA延迟、样本数和被路由次数"""
+        with self._lock:
+            routed: Dict[str, int] = {}
+            for decision in self._log:
+                routed[decision.model] = routed.get(decision.model, 0) + 1
+            names = set(self.priors) | set(self._ewma)
+            return {
+                name: {
+                    'ewma': self._ewma.get(name, self.priors.get(name, 5.0)),
+                    'samples': self._samples.get(name, 0),
+                    'routed': routed.get(name, 0)
+                }
+                for name in sorted(names)
+            }
+
+
+# 测试代码
+if __name__ == "__main__":
+    config = {
+        "通义千问": {"quality": 3, "latency_prior": 2.0},
+        "Gemini": {"quality": 2, "latency_prior": 1.0},
+        "Llama-3": {"quality": 1, "latency_prior": 4.0},
+    }
+    router = ModelRouter(config)
+    candidates = list(config)
+
+    for question, intents in [
+        ("生育津贴有多少？", ['fertility']),
+        ("我们打算明年结婚并且申请BTO，同时想了解生二胎的津贴和育儿假分别是多少？", ['marriage', 'housing', 'fertility']),
+        ("What is the Baby Bonus?", ['fertility']),
+        ("你好", ['general']),
+        ("我月收入4000，有两个孩子，能领多少补贴？", ['fertility']),
+    ]:
+        decision = router.route(question, intents, candidates)
+        print(f"{question[:20]:<22} -> {decision.model} ({decision.complexity}, {decision.reasons})")
+
+    # Gemini 变慢后，简单问题改由最快的模型回答
+    for _ in range(5):
+        router.observe("Gemini", 6.0)
+        router.observe("通义千问", 1.5)
+    print(router.route("生育津贴有多少？", ['fertility'], candidates).model)
+    print(router.snapshot())
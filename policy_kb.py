@@ -0,0 +1,134 @@
+"""
+政策知识库 - 新加坡家庭政策结构化数据
+供应用、RAG检索和离线构建脚本共享
+"""
+import hashlib
+import json
+
+POLICY_KB = {
+    'fertility': {
+        'baby_bonus': {
+            'cash_gifts': {
+                '1st_child': 8000,
+                '2nd_child': 8000,
+                '3rd_child': 10000,
+                '4th_child': 10000,
+                '5th_and_above': 10000
+            },
+            'cda_matching': {
+                '1st_2nd': 3000,
+                '3rd_to_6th': 9000
+            }
+        },
+        'maternity_leave': {
+            'government_paid': 16,
+            'employer_paid': 0,
+            'total': 16
+        },
+        'paternity_leave': {
+            'government_paid': 2,
+            'employer_paid': 0,
+            'total': 2
+        },
+        'childcare_subsidy': {
+            'infant_care': {'max_subsidy': 600, 'income_ceiling': 12000},
+            'childcare': {'max_subsidy': 467, 'income_ceiling': 12000}
+        },
+        'medisave_grant': 4000,
+        'website': 'https://www.babybonus.msf.gov.sg',
+        'description': '生育津贴计划帮助新加坡家庭应对抚养孩子的费用'
+    },
+    'housing': {
+        'bto_requirements': {
+            'age': 21,
+            'income_ceiling': {
+                '2room': 7000,
+                '3room_to_5room': 14000
+            },
+            'citizenship': 'At least one applicant must be Singapore Citizen'
+        },
+        'grants': {
+            'enhanced_housing_grant': {
+                'max_amount': 80000,
+                'income_ceiling': 9000
+            },
+            'family_grant': {
+                'max_amount': 50000,
+                'income_ceiling': 14000
+            },
+            'proximity_housing_grant': {
+                'max_amount': 30000,
+                'condition': 'Living with or near parents'
+            }
+        },
+        'price_ranges': {
+            '2room': [150000, 250000],
+            '3room': [250000, 400000],
+            '4room': [350000, 550000],
+            '5room': [450000, 700000]
+        },
+        'website': 'https://www.hdb.gov.sg',
+        'description': '建屋发展局(HDB)组屋是新加坡大多数家庭的首选住房'
+    },
+    'marriage': {
+        'age_requirement': 21,
+        'cost_range': [26, 42],
+        'documents': ['身份证(NRIC/FIN)', '出生证明', '单身证明'],
+        'procedures': [
+            '在线提交结婚通知(21天前)',
+            '支付费用',
+            '预约注册日期',
+            '携带文件到婚姻注册局',
+            '宣誓并签署结婚证书'
+        ],
+        'website': 'https://www.rom.gov.sg',
+        'description': '在新加坡注册结婚是一个简单快捷的过程'
+    },
+    'healthcare': {
+        'pregnancy_support': {
+            'antenatal_care': '定期产检由政府诊所提供补贴',
+            'delivery_costs': {
+                'public_hospital': [700, 1500],
+                'private_hospital': [5000, 15000]
+            },
+            'medisave_usage': '可使用Medisave支付产检和分娩费用'
+        },
+        'child_immunization': {
+            'cost': 'Free at polyclinics',
+            'schedule': '出生至18个月需完成多次接种'
+        },
+        'website': 'https://www.healthhub.sg'
+    },
+    'education': {
+        'kindergarten': {
+            'age': '18个月起可申请',
+            'subsidy': {
+                'income_ceiling': 12000,
+                'max_subsidy': 467
+            }
+        },
+        'primary_school': {
+            'age': 6,
+            'registration': '分阶段报名系统',
+            'cost': 'Heavily subsidized for citizens'
+        },
+        'website': 'https://www.moe.gov.sg'
+    }
+}
+
+
+def get_kb_version(policy_kb=None) -> str:
+    """
+    计算知识库版本号（内容哈希）
+    
+    知识库内容变化时版本号随之变化，用于判断预构建产物和缓存是否过期
+    
+    Args:
+        policy_kb: 政策知识库字典，默认使用 POLICY_KB
+        
+    Returns:
+        12位十六进制版本号
+    """
+    kb = POLICY_KB if policy_kb is None else policy_kb
+    payload = json.dumps(kb, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:12]
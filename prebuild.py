@@ -0,0 +1,298 @@
+"""
+启动产物预构建 - 构建镜像时一次性生成，副本启动后直接加载，不再由第一个访问者触发模型下载和索引构建
+产物（默认写入 artifacts/，可用 ARTIFACT_DIR 指定）：
+  - embedding_model/        embedding模型目录（SentenceTransformer.save 导出，启动时不再联网下载）
+  - rag_index.faiss         RAG向量索引
+  - rag_documents.json      编译后的知识库文档（检索用的文本和元数据，附知识库版本）
+  - intent_centroids.json   向量意图识别的各意图质心
+  - canned_answers.json     标准问题答案库
+  - manifest.json           产物清单：知识库版本、模型、各文件的SHA-256、校验结果
+翻译表随代码发布，这里只校验各语言是否齐全，结果记入清单
+
+用法：
+    python prebuild.py                  # 构建全部产物并校验
+    python prebuild.py --verify-only    # 只校验已有产物及其与清单中的SHA-256是否一致（如容器启动前检查）
+校验失败时退出码为1
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from policy_kb import POLICY_KB, get_kb_version
+
+DEFAULT_ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", "artifacts")
+MODEL_DIR = 'embedding_model'
+INTENT_FILE = 'intent_centroids.json'
+CANNED_FILE = 'canned_answers.json'
+MANIFEST_FILE = 'manifest.json'
+
+LANGUAGES = ('zh', 'en', 'ms')
+
+# 校验用的查询：(问题, 期望的意图/检索类别)
+VERIFY_QUERIES = [
+    ("生育津贴有多少钱？", 'fertility'),
+    ("How do I apply for a BTO flat?", 'housing'),
+    ("Bagaimana mendaftar perkahwinan?", 'marriage'),
+]
+
+
+def _sha256(path: str) -> str:
+    """文件或目录（按相对路径排序后逐个文件）的SHA-256"""
+    digest = hashlib.sha256()
+    if os.path.isdir(path):
+        for root, _, files in sorted(os.walk(path)):
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                digest.update(os.path.relpath(file_path, path).encode('utf-8'))
+                with open(file_path, 'rb') as f:
+                    for block in iter(lambda: f.read(1 << 20), b''):
+                        digest.update(block)
+    else:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def _size(path: str) -> int:
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+    return os.path.getsize(path)
+
+
+def check_artifact_hashes(directory: str, manifest: Dict[str, Any]) -> List[str]:
+    """重新计算清单中各产物的SHA-256，返回缺失或内容与清单不一致的产物名称"""
+    mismatched = []
+    for name, entry in manifest.get('artifacts', {}).items():
+        path = os.path.join(directory, name)
+        if not os.path.exists(path) or _sha256(path) != entry.get('sha256'):
+            mismatched.append(name)
+    return mismatched
+
+
+def load_manifest(directory: str = DEFAULT_ARTIFACT_DIR) -> Optional[Dict[str, Any]]:
+    """
+    读取产物清单并校验，以下情况返回None（调用方改为现场构建）：
+    清单缺失、与当前知识库版本不一致、构建时校验未通过（ok 为 false）、产物的SHA-256与清单不一致
+
+    Args:
+        directory: 产物目录
+    """
+    path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ 读取产物清单失败: {e}")
+        return None
+    if manifest.get('kb_version') != get_kb_version(POLICY_KB):
+        print("⚠️ 预构建产物与当前知识库版本不一致，请重新运行 python prebuild.py")
+        return None
+    if not manifest.get('ok'):
+        print("⚠️ 预构建产物在构建时未通过校验，请重新运行 python prebuild.py")
+        return None
+    mismatched = check_artifact_hashes(directory, manifest)
+    if mismatched:
+        print(f"⚠️ 预构建产物缺失或内容与清单不一致: {', '.join(mismatched)}")
+        return None
+    return manifest
+
+
+def load_intent_centroids(directory: str, kb_version: str) -> Optional[Dict[str, Any]]:
+    """读取预构建的意图质心，文件缺失或版本不一致时返回None"""
+    path = os.path.join(directory, INTENT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        artifact = json.load(f)
+    return artifact if artifact.get('kb_version') == kb_version else None
+
+
+def check_translations() -> List[str]:
+    """翻译表中缺少某种语言的条目，返回 ['键/语言', ...]"""
+    from translation_manager import TranslationManager
+
+    missing = []
+    for key, texts in TranslationManager().translations.items():
+        missing.extend(f"{key}/{language}" for language in LANGUAGES if not texts.get(language))
+    return missing
+
+
+def build(directory: str) -> Dict[str, float]:
+    """
+    构建全部产物
+
+    Returns:
+        各步骤耗时（秒）
+    """
+    from sentence_transformers import SentenceTransformer
+
+    from canned_answers import build_canned_answers
+    from embedding_intent import EmbeddingIntentClassifier
+    from rag_system import EMBEDDING_MODEL_NAME, RAGSystem
+
+    os.makedirs(directory, exist_ok=True)
+    kb_version = get_kb_version(POLICY_KB)
+    timings = {}
+
+    start = time.perf_counter()
+    model_path = os.path.join(directory, MODEL_DIR)
+    print(f"正在导出embedding模型 {EMBEDDING_MODEL_NAME} ...")
+    SentenceTransformer(EMBEDDING_MODEL_NAME).save(model_path)
+    timings['model'] = time.perf_counter() - start
+
+    # 之后的步骤都从导出的目录加载模型，顺带验证导出结果可用
+    start = time.perf_counter()
+    rag = RAGSystem(POLICY_KB, model_path=model_path)
+    rag.build_index()
+    rag.save_index(directory, kb_version)
+    timings['rag_index'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    classifier = EmbeddingIntentClassifier.build(rag.model.encode)
+    with open(os.path.join(directory, INTENT_FILE), 'w', encoding='utf-8') as f:
+        json.dump({'kb_version': kb_version, 'model': EMBEDDING_MODEL_NAME, **classifier.to_artifact()}, f)
+    timings['intent_centroids'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    build_canned_answers(POLICY_KB, output_path=os.path.join(directory, CANNED_FILE), model=rag.model)
+    timings['canned_answers'] = time.perf_counter() - start
+    return timings
+
+
+def verify(directory: str) -> Dict[str, Dict[str, Any]]:
+    """
+    按在线服务的加载方式逐项加载产物并用样例查询校验
+
+    Returns:
+        {检查项: {'ok': 是否通过, 'detail': 说明}}
+    """
+    checks: Dict[str, Dict[str, Any]] = {}
+    kb_version = get_kb_version(POLICY_KB)
+
+    def record(name: str, ok: bool, detail: str = ''):
+        checks[name] = {'ok': bool(ok), 'detail': detail}
+
+    missing = check_translations()
+    record('translations', not missing, f"缺少 {len(missing)} 项: {', '.join(missing[:10])}" if missing else '')
+
+    model_path = os.path.join(directory, MODEL_DIR)
+    if not os.path.isdir(model_path):
+        record('model', False, f"未找到 {model_path}")
+        return checks
+
+    from canned_answers import CANONICAL_QUESTIONS, CannedAnswerIndex
+    from embedding_intent import EmbeddingIntentClassifier
+    from rag_system import RAGSystem
+
+    try:
+        rag = RAGSystem(POLICY_KB, model_path=model_path)
+    except Exception as e:
+        record('model', False, f"{type(e).__name__}: {e}")
+        return checks
+    record('model', True, f"dim={rag.model.get_sentence_embedding_dimension()}")
+
+    if not rag.load_index(directory, kb_version):
+        record('rag_index', False, "索引缺失或与知识库/模型不匹配")
+    else:
+        misses = [question for question, category in VERIFY_QUERIES
+                  if category not in {doc['metadata']['category'] for doc in rag.search_documents(question, top_k=3)}]
+        record('rag_index', not misses, f"未检索到期望类别: {misses}" if misses else f"{len(rag.documents)} 个文档")
+
+    artifact = load_intent_centroids(directory, kb_version)
+    if artifact is None:
+        record('intent_centroids', False, "文件缺失或知识库版本不一致")
+    else:
+        classifier = EmbeddingIntentClassifier.from_artifact(artifact)
+        misses = [question for question, intent in VERIFY_QUERIES
+                  if intent not in [label for label, _ in classifier.classify(rag.encode_query(question))]]
+        record('intent_centroids', not misses, f"未识别出期望意图: {misses}" if misses else f"{len(classifier.intents)} 个意图")
+
+    canned = CannedAnswerIndex.load(os.path.join(directory, CANNED_FILE), policy_kb=POLICY_KB)
+    if canned is None:
+        record('canned_answers', False, "文件缺失或知识库版本不一致")
+    else:
+        # 每条标准问题用自己的第一个中文问法查询，应命中自己
+        misses = []
+        for item in CANONICAL_QUESTIONS:
+            question = item['questions']['zh'][0]
+            match = canned.match(rag.encode_query(question), 'zh')
+            if match is None or match['id'] != item['id']:
+                misses.append(item['id'])
+        record('canned_answers', not misses, f"未命中: {misses}" if misses else f"{len(CANONICAL_QUESTIONS)} 条标准问题")
+
+    return checks
+
+
+def write_manifest(directory: str, timings: Dict[str, float], checks: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """写入产物清单（文件哈希、知识库版本、依赖版本、构建耗时和校验结果）"""
+    from importlib import metadata
+
+    from rag_system import EMBEDDING_MODEL_NAME
+
+    artifacts = {}
+    for name in (MODEL_DIR, 'rag_index.faiss', 'rag_documents.json', INTENT_FILE, CANNED_FILE):
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            artifacts[name] = {'sha256': _sha256(path), 'bytes': _size(path)}
+
+    packages = {}
+    for package in ('sentence-transformers', 'faiss-cpu', 'numpy', 'torch'):
+        try:
+            packages[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            pass
+
+    manifest = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'kb_version': get_kb_version(POLICY_KB),
+        'embedding_model': EMBEDDING_MODEL_NAME,
+        'python': sys.version.split()[0],
+        'packages': packages,
+        'artifacts': artifacts,
+        'build_seconds': {step: round(seconds, 2) for step, seconds in timings.items()},
+        'checks': checks,
+        'ok': all(check['ok'] for check in checks.values())
+    }
+    tmp_path = os.path.join(directory, f"{MANIFEST_FILE}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST_FILE))
+    return manifest
+
+
+# 命令行入口
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="预构建启动产物（模型、索引、意图质心、标准答案库）并写入清单")
+    parser.add_argument('--output-dir', default=DEFAULT_ARTIFACT_DIR, help="产物目录")
+    parser.add_argument('--verify-only', action='store_true', help="只校验已有产物，不重新构建")
+    args = parser.parse_args()
+
+    from rag_system import DEPENDENCIES_AVAILABLE
+    if not DEPENDENCIES_AVAILABLE:
+        raise SystemExit("需要 sentence-transformers 和 faiss-cpu 才能预构建产物")
+
+    timings = {}
+    if not args.verify_only:
+        timings = build(args.output_dir)
+
+    checks = verify(args.output_dir)
+    for name, check in checks.items():
+        print(f"{'✅' if check['ok'] else '❌'} {name:<18} {check['detail']}")
+
+    if args.verify_only:
+        # 同时重新计算各产物的SHA-256并与清单比对
+        manifest = load_manifest(args.output_dir)
+        ok = manifest is not None and all(check['ok'] for check in checks.values())
+    else:
+        manifest = write_manifest(args.output_dir, timings, checks)
+        ok = manifest['ok']
+        print(f"已写入 {os.path.join(args.output_dir, MANIFEST_FILE)}（知识库版本 {manifest['kb_version']}）")
+    sys.exit(0 if ok else 1)
@@ -2,8 +2,9 @@
 RAG检索系统 - 使用FAISS向量数据库进行语义检索
 """
 import json
+import os
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 try:
     from sentence_transformers import SentenceTransformer
@@ -13,16 +14,24 @@ except ImportError:
     DEPENDENCIES_AVAILABLE = False
     print("⚠️ 请安装依赖: pip install sentence-transformers faiss-cpu")
 
+# 轻量级多语言embedding模型（预构建脚本与在线服务共用）
+EMBEDDING_MODEL_NAME = 'paraphrase-multilingual-MiniLM-L12-v2'
+
+# 预构建的索引产物文件名（见 prebuild.py）
+INDEX_FILE = 'rag_index.faiss'
+DOCUMENTS_FILE = 'rag_documents.json'
+
 
 class RAGSystem:
     """RAG检索系统"""
     
-    def __init__(self, policy_kb: Dict[str, Any]):
+    def __init__(self, policy_kb: Dict[str, Any], model_path: Optional[str] = None):
         """
         初始化RAG系统
         
         Args:
             policy_kb: 政策知识库字典
+            model_path: 预构建的本地模型目录（prebuild.py 导出），为空时按名称加载（可能需要下载）
         """
         if not DEPENDENCIES_AVAILABLE:
             raise ImportError("缺少必要的依赖库")
@@ -33,7 +42,7 @@ class RAGSystem:
         
         # 使用轻量级的多语言模型
         print("正在加载embedding模型...")
-        self.model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
+        self.model = SentenceTransformer(model_path or EMBEDDING_MODEL_NAME)
         print("✅ Embedding模型加载完成")
     
     def _extract_documents(self) -> List[Dict[str, str]]:
@@ -103,24 +112,97 @@ class RAGSystem:
         
         print(f"✅ 向量索引构建完成，共 {len(self.documents)} 个文档")
     
-    def search(self, query: str, top_k: int = 3) -> List[str]:
+    def save_index(self, directory: str, kb_version: str):
+        """
+        保存向量索引和文档（预构建产物）
+        
+        Args:
+            directory: 产物目录
+            kb_version: 构建时的知识库版本，加载时据此判断是否过期
+        """
+        if self.index is None:
+            raise RuntimeError("索引未构建，请先调用build_index()")
+        os.makedirs(directory, exist_ok=True)
+        faiss.write_index(self.index, os.path.join(directory, INDEX_FILE))
+        with open(os.path.join(directory, DOCUMENTS_FILE), 'w', encoding='utf-8') as f:
+            json.dump({'kb_version': kb_version, 'documents': self.documents}, f, ensure_ascii=False)
+    
+    def load_index(self, directory: str, kb_version: str) -> bool:
+        """
+        加载预构建的向量索引，文件缺失、知识库版本不一致或维度与模型不符时返回False（调用方改为 build_index）
+        
+        Args:
+            directory: 产物目录
+            kb_version: 当前知识库版本
+        """
+        index_path = os.path.join(directory, INDEX_FILE)
+        documents_path = os.path.join(directory, DOCUMENTS_FILE)
+        if not (os.path.exists(index_path) and os.path.exists(documents_path)):
+            return False
+        
+        with open(documents_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('kb_version') != kb_version:
+            print("⚠️ 预构建索引与当前知识库版本不一致，重新构建")
+            return False
+        
+        index = faiss.read_index(index_path)
+        if index.d != self.model.get_sentence_embedding_dimension() or index.ntotal != len(data['documents']):
+            print("⚠️ 预构建索引与模型或文档不匹配，重新构建")
+            return False
+        
+        self.index = index
+        self.documents = data['documents']
+        print(f"✅ 已加载预构建索引，共 {len(self.documents)} 个文档")
+        return True
+    
+    def encode_query(self, query: str) -> np.ndarray:
+        """
+        查询向量化（结果可在检索和标准答案匹配之间复用）
+        
+        Args:
+            query: 查询文本
+            
+        Returns:
+            形状为 (1, dim) 的float32向量
+        """
+        query_embedding = self.model.encode([query])
+        return np.array(query_embedding).astype('float32')
+    
+    def search(self, query: str, top_k: int = 3, query_embedding: np.ndarray = None) -> List[str]:
         """
         语义检索
         
         Args:
             query: 查询文本
             top_k: 返回前k个最相关文档
+            query_embedding: 已计算的查询向量，为空时重新编码
             
         Returns:
             最相关的文档文本列表
         """
+        return [doc['text'] for doc in self.search_documents(query, top_k, query_embedding)]
+    
+    def search_documents(self, query: str, top_k: int = 3,
+                         query_embedding: np.ndarray = None) -> List[Dict[str, Any]]:
+        """
+        语义检索，返回完整文档（text和metadata），供紧凑上下文按元数据重新序列化
+        
+        Args:
+            query: 查询文本
+            top_k: 返回前k个最相关文档
+            query_embedding: 已计算的查询向量，为空时重新编码
+            
+        Returns:
+            最相关的文档列表
+        """
         if self.index is None:
             print("⚠️ 索引未构建，请先调用build_index()")
             return []
         
         # 查询向量化
-        query_embedding = self.model.encode([query])
-        query_embedding = np.array(query_embedding).astype('float32')
+        if query_embedding is None:
+            query_embedding = self.encode_query(query)
         
         # 搜索
         distances, indices = self.index.search(query_embedding, top_k)
@@ -128,8 +210,8 @@ class RAGSystem:
         # 返回结果
         results = []
         for idx in indices[0]:
-            if idx < len(self.documents):
-                results.append(self.documents[idx]['text'])
+            if 0 <= idx < len(self.documents):
+                results.append(self.documents[idx])
         
         return results
     
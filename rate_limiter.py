@@ -0,0 +1,195 @@
+"""
+进程级限流 - 每个模型一个令牌桶（请求速率）加一个并发信号量（同时进行的请求数）
+排队等待超过预算时立即失败，由调用方切换模型或回退到模板回答
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+
+class RateLimitExceeded(Exception):
+    """排队等待超过预算"""
+
+
+class TokenBucket:
+    """令牌桶（线程安全）"""
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Args:
+            rate: 每秒补充的令牌数
+            capacity: 桶容量（允许的突发请求数）
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, timeout: float) -> bool:
+        """
+        获取一个令牌
+
+        Args:
+            timeout: 最长等待时间（秒）；预计等待超过剩余时间时立即返回False
+
+        Returns:
+            是否获取成功
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait_time = (1 - self._tokens) / self.rate
+
+            if wait_time > deadline - time.monotonic():
+                return False
+            time.sleep(wait_time)
+
+
+class ProviderLimiter:
+    """单个模型的限流器：令牌桶 + 并发信号量 + 排队统计"""
+
+    def __init__(self, name: str, requests_per_second: float, burst: int,
+                 max_concurrency: int, queue_timeout: float):
+        """
+        Args:
+            name: 模型名称
+            requests_per_second: 平均请求速率
+            burst: 允许的突发请求数
+            max_concurrency: 最大并发请求数
+            queue_timeout: 默认排队等待预算（秒）
+        """
+        self.name = name
+        self.queue_timeout = queue_timeout
+        self.max_concurrency = max_concurrency
+        self.bucket = TokenBucket(requests_per_second, burst)
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.max_waiting = 0
+        self.in_flight = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """
+        申请一个请求名额（速率和并发都满足时返回True）
+
+        Args:
+            timeout: 排队等待预算（秒），默认使用 queue_timeout
+        """
+        timeout = self.queue_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        with self._lock:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+
+        try:
+            # 先占并发名额再取令牌，避免因并发排队失败而白白消耗令牌
+            admitted = self._semaphore.acquire(timeout=timeout)
+            if admitted and not self.bucket.acquire(max(0.0, deadline - time.monotonic())):
+                self._semaphore.release()
+                admitted = False
+        finally:
+            with self._lock:
+                self.waiting -= 1
+                self.total_wait += time.monotonic() - start
+
+        with self._lock:
+            if admitted:
+                self.in_flight += 1
+                self.admitted += 1
+            else:
+                self.rejected += 1
+        return admitted
+
+    def release(self):
+        """释放并发名额"""
+        with self._lock:
+            self.in_flight -= 1
+        self._semaphore.release()
+
+    @contextmanager
+    def slot(self, timeout: Optional[float] = None):
+        """以上下文管理器形式占用名额，排队超时抛出 RateLimitExceeded"""
+        if not self.acquire(timeout):
+            raise RateLimitExceeded(f"{self.name} 排队超时")
+        try:
+            yield
+        finally:
+            self.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前排队深度、并发数和累计统计"""
+        with self._lock:
+            requests = self.admitted + self.rejected
+            return {
+                'name': self.name,
+                'queue_depth': self.waiting,
+                'max_queue_depth': self.max_waiting,
+                'in_flight': self.in_flight,
+                'max_concurrency': self.max_concurrency,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'avg_wait': self.total_wait / requests if requests else 0.0
+            }
+
+
+class LimiterRegistry:
+    """按模型名管理限流器，配置来自 MODEL_CONFIG 中的 rate_limit 字段"""
+
+    DEFAULTS = {
+        'requests_per_second': 2.0,
+        'burst': 5,
+        'max_concurrency': 4,
+        'queue_timeout': 3.0
+    }
+
+    def __init__(self, model_config: Dict[str, Dict[str, Any]]):
+        """
+        Args:
+            model_config: 模型配置字典，每项可包含 rate_limit 子字典
+        """
+        self._limiters: Dict[str, ProviderLimiter] = {}
+        for name, config in model_config.items():
+            settings = {**self.DEFAULTS, **config.get('rate_limit', {})}
+            self._limiters[name] = ProviderLimiter(name, **settings)
+
+    def get(self, name: str) -> ProviderLimiter:
+        """获取模型的限流器"""
+        return self._limiters[name]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """所有限流器的状态"""
+        return {name: limiter.snapshot() for name, limiter in self._limiters.items()}
+
+
+# 测试代码
+if __name__ == "__main__":
+    limiter = ProviderLimiter('demo', requests_per_second=10, burst=2, max_concurrency=1, queue_timeout=0.05)
+
+    with limiter.slot():
+        # 并发名额已占满，排队超过预算后立即失败
+        start = time.monotonic()
+        assert not limiter.acquire()
+        print(f"并发已满，{(time.monotonic() - start) * 1000:.0f}ms 后快速失败")
+
+    # 突发令牌用完后，等待时间超过预算的请求直接拒绝
+    assert limiter.acquire(timeout=0)
+    limiter.release()
+    assert not limiter.acquire(timeout=0)
+    print(limiter.snapshot())
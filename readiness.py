@@ -0,0 +1,111 @@
+"""
+就绪检查 - 记录各子系统（检索模型、标准答案库、意图质心、推荐引擎、翻译表等）的加载状态
+自动扩缩容在副本预热完成前不应分配流量：必需的子系统全部加载完成（或确认依赖未安装）之前，
+probe() 返回503，之后返回200，响应内容中列出每个子系统的状态、来源（预构建产物 / 现场构建）和耗时；
+必需的子系统加载失败时一直返回503，负载均衡器不会把流量分给损坏的副本
+"""
+import json
+import threading
+import time
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+PENDING = 'pending'
+LOADING = 'loading'
+READY = 'ready'
+UNAVAILABLE = 'unavailable'  # 依赖未安装，不会再加载
+FAILED = 'failed'            # 加载出错（如内存不足、模型下载失败），必需的子系统处于该状态时副本不就绪
+SERVING = frozenset({READY, UNAVAILABLE})          # 可以接收流量（依赖未安装属于部署选择，以降级方式服务）
+JSON_CONTENT_TYPE = 'application/json; charset=utf-8'
+
+
+class ReadinessRegistry:
+    """子系统加载状态（线程安全，进程内共享）"""
+
+    def __init__(self, required: Sequence[str] = ()):
+        """
+        Args:
+            required: 就绪前必须完成加载的子系统名称
+        """
+        self.required = list(required)
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._subsystems: Dict[str, Dict[str, Any]] = {name: {'state': PENDING} for name in self.required}
+        self._info: Dict[str, Any] = {}
+
+    def start(self, name: str):
+        """子系统开始加载"""
+        with self._lock:
+            self._subsystems[name] = {'state': LOADING, 'since': time.time()}
+
+    def finish(self, name: str, state: str, source: Optional[str] = None, detail: Optional[str] = None):
+        """
+        子系统加载结束
+
+        Args:
+            name: 子系统名称
+            state: READY / UNAVAILABLE / FAILED
+            source: 来源，如 'artifact'（预构建产物）或 'built'（现场构建）
+            detail: 附加说明（如错误信息）
+        """
+        with self._lock:
+            entry = self._subsystems.get(name, {})
+            since = entry.get('since')
+            self._subsystems[name] = {
+                'state': state,
+                'source': source,
+                'seconds': round(time.time() - since, 3) if since else None,
+                'detail': detail
+            }
+
+    def set_info(self, key: str, value: Any):
+        """附加信息（如预构建产物清单摘要），随状态一起返回"""
+        with self._lock:
+            self._info[key] = value
+
+    def is_ready(self) -> bool:
+        """必需的子系统是否都已加载完成或确认依赖未安装（任一加载失败时为False）"""
+        with self._lock:
+            return all(self._subsystems.get(name, {}).get('state') in SERVING for name in self.required)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """就绪状态、各子系统状态和附加信息"""
+        ready = self.is_ready()
+        with self._lock:
+            subsystems = {name: {key: value for key, value in entry.items() if key != 'since' and value is not None}
+                          for name, entry in sorted(self._subsystems.items())}
+            failed = [name for name in self.required if self._subsystems.get(name, {}).get('state') == FAILED]
+            return {
+                'ready': ready,
+                'failed': failed,
+                'uptime': round(time.time() - self.started_at, 1),
+                'required': list(self.required),
+                'subsystems': subsystems,
+                **self._info
+            }
+
+    def probe(self) -> Tuple[int, str, str]:
+        """HTTP就绪检查：(状态码, JSON文本, Content-Type)，未就绪时为503"""
+        snapshot = self.snapshot()
+        return (200 if snapshot['ready'] else 503), json.dumps(snapshot, ensure_ascii=False), JSON_CONTENT_TYPE
+
+
+# 测试代码
+if __name__ == "__main__":
+    registry = ReadinessRegistry(required=['rag', 'canned', 'translator'])
+    print(registry.probe()[0])
+
+    registry.start('translator')
+    registry.finish('translator', READY, source='built')
+    registry.start('rag')
+    time.sleep(0.05)
+    registry.finish('rag', READY, source='artifact')
+    print(registry.probe())
+
+    registry.finish('canned', UNAVAILABLE, detail='未找到 canned_answers.json')
+    status, body, content_type = registry.probe()
+    print(status, content_type, body)
+    assert status == 200 and registry.snapshot()['subsystems']['rag']['seconds'] >= 0.05
+
+    # 必需的子系统加载失败：不就绪
+    registry.finish('rag', FAILED, detail='MemoryError')
+    assert registry.probe()[0] == 503
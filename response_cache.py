@@ -0,0 +1,213 @@
+"""
+LLM回答持久化缓存 - 基于本地SQLite文件，同一节点上的多个Streamlit进程共享
+按 (模型提供方, 模型ID, 系统提示词, 上下文, 对话历史, 归一化问题) 的哈希精确匹配
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    provider TEXT NOT NULL,
+    response TEXT NOT NULL,
+    kb_version TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+_TRAILING_PUNCTUATION = re.compile(r'[\s?？!！。.,，~～]+$')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_question(question: str) -> str:
+    """归一化问题：去首尾空白和结尾标点、合并空白、转小写"""
+    question = _WHITESPACE.sub(' ', question.strip().lower())
+    return _TRAILING_PUNCTUATION.sub('', question)
+
+
+def make_cache_key(provider: str, model_id: str, system_prompt: str, context: str, question: str,
+                   history: str = '') -> str:
+    """
+    生成缓存键
+
+    Args:
+        provider: 模型提供方（MODEL_CONFIG中的名称）
+        model_id: 模型ID
+        system_prompt: 系统提示词或提示词模板
+        context: 政策背景信息
+        question: 用户问题（内部会归一化）
+        history: 发送给模型的对话历史文本（同一问题在不同对话中可能有不同回答）
+
+    Returns:
+        SHA-256十六进制摘要
+    """
+    digest = hashlib.sha256()
+    for part in (provider, model_id, system_prompt, context, history, normalize_question(question)):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """SQLite回答缓存：TTL过期、按最近访问时间的容量淘汰、知识库变更时整体失效"""
+
+    def __init__(self, path: str, kb_version: str, ttl_seconds: float = 86400,
+                 max_entries: int = 10000):
+        """
+        初始化缓存
+
+        Args:
+            path: SQLite文件路径
+            kb_version: 当前知识库版本，与文件中记录的版本不一致时清空缓存
+            ttl_seconds: 条目有效期（秒）
+            max_entries: 最大条目数，超出时淘汰最久未访问的条目
+        """
+        self.path = path
+        self.kb_version = kb_version
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        self._check_kb_version(conn)
+
+    def _connect(self) -> sqlite3.Connection:
+        """每个线程一个连接；WAL模式允许多进程并发读写"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _check_kb_version(self, conn: sqlite3.Connection):
+        """知识库版本变化时清空缓存"""
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute("SELECT value FROM meta WHERE name = 'kb_version'").fetchone()
+            if row is None or row[0] != self.kb_version:
+                conn.execute('DELETE FROM responses')
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta (name, value) VALUES ('kb_version', ?)",
+                    (self.kb_version,)
+                )
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        读取缓存
+
+        Args:
+            key: make_cache_key 生成的缓存键
+
+        Returns:
+            缓存的回答，未命中或已过期返回None
+        """
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute(
+            'SELECT response FROM responses WHERE key = ? AND expires_at > ? AND kb_version = ?',
+            (key, now, self.kb_version)
+        ).fetchone()
+
+        with self._stats_lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if row is None:
+            return None
+
+        conn.execute('UPDATE responses SET last_access = ? WHERE key = ?', (now, key))
+        return row[0]
+
+    def set(self, key: str, provider: str, response: str):
+        """
+        写入缓存，并按容量上限淘汰最久未访问的条目
+
+        Args:
+            key: 缓存键
+            provider: 回答的模型提供方
+            response: 回答文本
+        """
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute(
+                'INSERT OR REPLACE INTO responses '
+                '(key, provider, response, kb_version, created_at, expires_at, last_access) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, provider, response, self.kb_version, now, now + self.ttl_seconds, now)
+            )
+            conn.execute('DELETE FROM responses WHERE expires_at <= ?', (now,))
+            count = conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+            if count > self.max_entries:
+                conn.execute(
+                    'DELETE FROM responses WHERE key IN '
+                    '(SELECT key FROM responses ORDER BY last_access ASC LIMIT ?)',
+                    (count - self.max_entries,)
+                )
+
+    def clear(self):
+        """清空缓存"""
+        self._connect().execute('DELETE FROM responses')
+
+    def stats(self) -> Dict[str, Any]:
+        """本进程的命中统计和缓存文件中的条目数"""
+        count = self._connect().execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'entries': count
+            }
+
+
+# 测试代码
+if __name__ == "__main__":
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'cache.sqlite3')
+        cache = ResponseCache(path, kb_version='v1', max_entries=2)
+
+        key = make_cache_key('通义千问', 'qwen-max', 'system', 'context', '生育津贴有多少？')
+        assert key == make_cache_key('通义千问', 'qwen-max', 'system', 'context', '  生育津贴有多少 ')
+        assert cache.get(key) is None
+
+        cache.set(key, '通义千问', '回答A')
+        print(f"命中: {cache.get(key)}")
+
+        cache.set('k2', '通义千问', '回答B')
+        cache.set('k3', '通义千问', '回答C')
+        print(f"容量淘汰后条目数: {cache.stats()['entries']}")
+        assert cache.stats()['entries'] == 2
+
+        # 知识库版本变化后缓存失效
+        cache_v2 = ResponseCache(path, kb_version='v2')
+        assert cache_v2.get('k3') is None
+        print(cache_v2.stats())
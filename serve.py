@@ -0,0 +1,58 @@
+"""
+启动器 - 在 Streamlit 接受连接之前预热子系统并启动 /ready 探针，然后在同一进程内启动 Streamlit
+直接 streamlit run app.py 时，Streamlit 要等第一个会话连接才执行脚本，新副本在收到真实流量前既不预热也没有就绪检查；
+这里先导入 subsystems 启动预热线程和 /ready 端点（设置了 LLM_METRICS_PORT 时还有 /metrics），再运行 streamlit run app.py。
+两者在同一进程内，app.py 导入的是同一个 subsystems 模块，会话直接使用预热好的对象
+
+用法：
+    python serve.py                                  # 等同 streamlit run app.py，外加预热和就绪检查
+    python serve.py --probe-host 0.0.0.0 -- --server.port 8501 --server.headless true   # 容器中允许探针访问
+    python serve.py --verify-artifacts               # 先校验预构建产物（同 prebuild.py --verify-only），失败时退出
+"""
+import argparse
+import os
+import sys
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+
+def main(argv=None) -> int:
+    # 与 app.py 相同，先加载 .env，再读取环境变量配置和导入按环境变量配置的模块
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="预热子系统、启动就绪检查端点后运行 streamlit run app.py",
+                                     epilog="-- 之后的参数原样传给 streamlit run")
+    parser.add_argument('--probe-port', type=int, default=int(os.getenv("LLM_METRICS_PORT") or "9464"),
+                        help="/ready 的端口（默认 LLM_METRICS_PORT，未设置时为9464）；"
+                             "只有设置了 LLM_METRICS_PORT 时同一端口才提供 /metrics")
+    parser.add_argument('--probe-host', default=os.getenv("LLM_METRICS_HOST", "127.0.0.1"),
+                        help="/ready 的监听地址（默认仅本机；容器中供 kubelet 探针访问时指定 0.0.0.0）")
+    parser.add_argument('--verify-artifacts', action='store_true', help="启动前校验预构建产物，失败时退出码为1")
+    args, streamlit_args = parser.parse_known_args(argv)
+    if streamlit_args[:1] == ['--']:
+        streamlit_args = streamlit_args[1:]
+
+    if args.verify_artifacts:
+        from prebuild import DEFAULT_ARTIFACT_DIR, load_manifest, verify
+        checks = verify(DEFAULT_ARTIFACT_DIR)
+        failed = [name for name, check in checks.items() if not check['ok']]
+        if load_manifest(DEFAULT_ARTIFACT_DIR) is None or failed:
+            print(f"❌ 预构建产物校验失败: {failed or '清单缺失或知识库版本不一致'}")
+            return 1
+
+    import subsystems
+    server = subsystems.start_http_endpoint(args.probe_port, args.probe_host)
+    if server is not None:
+        print(f"就绪检查: http://{args.probe_host}:{args.probe_port}/ready")
+    subsystems.start_warmup()
+
+    # 在同一进程内运行 streamlit run（预热线程和探针端点继续在后台运行）
+    from streamlit.web import cli as streamlit_cli
+    sys.argv = ['streamlit', 'run', APP_PATH, *streamlit_args]
+    return streamlit_cli.main()
+
+
+# 命令行入口
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+"""
+进程级子系统 - 翻译表、推荐引擎、RAG检索、标准答案库、向量意图识别和时间线生成器的加载、预热与就绪状态
+这些对象只读且加载耗时，进程内只保存一份。本模块不依赖 Streamlit 运行时：app.py 在会话中按需调用各 get_*，
+启动器 serve.py 则在 Streamlit 接受连接之前就开始预热并提供 /ready 探针（同一进程内导入的是同一个模块，对象共享）
+"""
+import functools
+import os
+import threading
+from typing import Callable, Dict, Optional
+
+from lazy_imports import is_available, load
+from llm_metrics import MetricsRegistry, start_file_exporter, start_metrics_server
+from policy_kb import POLICY_KB, get_kb_version
+from prebuild import CANNED_FILE, DEFAULT_ARTIFACT_DIR, MODEL_DIR, load_intent_centroids, load_manifest
+from readiness import FAILED, READY, UNAVAILABLE, ReadinessRegistry
+
+# 重量级依赖（sentence-transformers/torch、faiss、plotly、pandas）按需导入，这里只探测是否已安装
+RAG_AVAILABLE = is_available('numpy', 'sentence_transformers', 'faiss')
+# 标准答案库和向量意图识别复用RAG的embedding模型
+CANNED_AVAILABLE = RAG_AVAILABLE
+INTENT_EMBEDDING_AVAILABLE = RAG_AVAILABLE
+TIMELINE_AVAILABLE = is_available('plotly', 'pandas')
+
+try:
+    from recommendation_engine import RecommendationEngine
+    REC_AVAILABLE = True
+except ImportError:
+    REC_AVAILABLE = False
+
+try:
+    from translation_manager import TranslationManager
+    TRANSLATION_AVAILABLE = True
+except ImportError:
+    TRANSLATION_AVAILABLE = False
+
+# 就绪检查：列出的子系统在进程启动时于后台预加载，全部加载结束前 /ready 返回503
+# 留空表示不预加载（各子系统仍在首次使用时加载），此时始终就绪
+WARMUP_SUBSYSTEMS = [name.strip() for name in
+                     os.getenv("WARMUP_SUBSYSTEMS", "translator,rec,rag,canned,intent").split(",") if name.strip()]
+# 预构建产物目录（python prebuild.py 生成），缺失或版本不一致时各子系统现场构建
+ARTIFACT_DIR = DEFAULT_ARTIFACT_DIR
+
+# 进程级指标：可通过HTTP端点（LLM_METRICS_PORT，同时提供 /ready）或文件（LLM_METRICS_FILE）导出Prometheus格式
+# 只有显式设置 LLM_METRICS_PORT 时才提供 /metrics；默认只监听本机，容器中需要被探针访问时设置 LLM_METRICS_HOST=0.0.0.0
+LLM_METRICS_PORT = int(os.getenv("LLM_METRICS_PORT", "0"))
+LLM_METRICS_HOST = os.getenv("LLM_METRICS_HOST", "127.0.0.1")
+LLM_METRICS_FILE = os.getenv("LLM_METRICS_FILE", "")
+
+
+def process_singleton(func: Callable):
+    """
+    进程内只执行一次的无参加载函数，结果在所有会话和线程间共享（同 st.cache_resource，但不需要脚本上下文）；
+    并发调用时等待首次调用完成，不会重复加载；加载抛出异常时不缓存，下次调用重试
+    """
+    lock = threading.Lock()
+    result = []
+
+    @functools.wraps(func)
+    def wrapper():
+        if not result:
+            with lock:
+                if not result:
+                    result.append(func())
+        return result[0]
+    return wrapper
+
+
+@process_singleton
+def get_readiness() -> ReadinessRegistry:
+    """进程级共享的子系统加载状态"""
+    return ReadinessRegistry(required=WARMUP_SUBSYSTEMS)
+
+
+@process_singleton
+def get_policy_kb_version() -> str:
+    """知识库版本（运行期间知识库不变，只计算一次）"""
+    return get_kb_version(POLICY_KB)
+
+
+@process_singleton
+def get_artifact_manifest():
+    """预构建产物清单；版本不一致、构建时校验未通过或文件哈希不符时为None，各子系统改为现场构建"""
+    manifest = load_manifest(ARTIFACT_DIR)
+    get_readiness().set_info('artifacts', {
+        'kb_version': manifest['kb_version'],
+        'created_at': manifest['created_at'],
+        'ok': manifest['ok']
+    } if manifest else None)
+    return manifest
+
+
+@process_singleton
+def get_metrics_registry() -> MetricsRegistry:
+    """进程级共享的指标注册表，首次创建时按配置启动文件导出（HTTP端点见 start_http_endpoint）"""
+    registry = MetricsRegistry()
+    if LLM_METRICS_FILE:
+        start_file_exporter(registry, LLM_METRICS_FILE)
+    return registry
+
+
+_server_lock = threading.Lock()
+_server = None
+
+
+def start_http_endpoint(port: Optional[int] = None, host: Optional[str] = None, metrics: Optional[bool] = None):
+    """
+    启动 /ready（以及 /metrics）端点（进程内只启动一次，之后的调用直接返回已启动的服务器）
+
+    Args:
+        port: 监听端口，默认 LLM_METRICS_PORT；为0时不启动
+        host: 监听地址，默认 LLM_METRICS_HOST
+        metrics: 是否同时提供 /metrics，默认只在设置了 LLM_METRICS_PORT 时提供
+
+    Returns:
+        HTTP服务器，未启动时为None
+    """
+    global _server
+    port = LLM_METRICS_PORT if port is None else port
+    metrics = bool(LLM_METRICS_PORT) if metrics is None else metrics
+    with _server_lock:
+        if _server is not None or not port:
+            return _server
+        try:
+            _server = start_metrics_server(get_metrics_registry().to_prometheus if metrics else None, port,
+                                           host=host or LLM_METRICS_HOST, routes={'/ready': get_readiness().probe})
+        except OSError as e:
+            # 同一节点多个进程时端口可能已被占用
+            print(f"指标端点启动失败（端口 {port}）: {e}")
+        return _server
+
+
+# 翻译表、知识库和各引擎都是只读数据，进程内只保存一份；会话状态只存放每个用户自己的状态
+@process_singleton
+def get_translator():
+    """进程级共享的翻译管理器，翻译管理器未加载时为None"""
+    readiness = get_readiness()
+    if not TRANSLATION_AVAILABLE:
+        readiness.finish('translator', UNAVAILABLE)
+        return None
+    readiness.start('translator')
+    translator = TranslationManager()
+    readiness.finish('translator', READY, source='built')
+    return translator
+
+
+# 各页面的系统按需加载：首次进入对应页面（或预热线程）时才导入依赖并初始化
+# （津贴计算等轻量页面不会触发 torch/plotly 的导入）；有预构建产物时直接加载，不再下载模型和构建索引
+# 加载可能发生在预热线程中，这里不展示进度，由页面自行显示 spinner
+@process_singleton
+def get_rag_system():
+    """RAG检索系统（问答页面），依赖缺失或初始化失败时为None"""
+    readiness = get_readiness()
+    if not RAG_AVAILABLE:
+        readiness.finish('rag', UNAVAILABLE)
+        return None
+    readiness.start('rag')
+    manifest = get_artifact_manifest()
+    model_path = os.path.join(ARTIFACT_DIR, MODEL_DIR)
+    try:
+        rag_system = load('rag_system')
+        rag = rag_system.RAGSystem(POLICY_KB, model_path=model_path if manifest and os.path.isdir(model_path) else None)
+        if manifest and rag.load_index(ARTIFACT_DIR, get_policy_kb_version()):
+            source = 'artifact'
+        else:
+            rag.build_index()
+            source = 'built'
+        readiness.finish('rag', READY, source=source)
+        return rag
+    except ImportError as e:
+        # 依赖库缺失，静默处理
+        readiness.finish('rag', UNAVAILABLE, detail=str(e))
+        return None
+    except Exception as e:
+        # 其他错误（如模型下载失败、内存不足等），静默处理，详情见就绪检查
+        readiness.finish('rag', FAILED, detail=f"{type(e).__name__}: {e}")
+        return None
+
+
+@process_singleton
+def get_canned_index():
+    """标准问题答案库，复用RAG的embedding模型；优先使用预构建产物，其次 python canned_answers.py 构建的文件"""
+    readiness = get_readiness()
+    if not CANNED_AVAILABLE or get_rag_system() is None:
+        readiness.finish('canned', UNAVAILABLE)
+        return None
+    readiness.start('canned')
+    artifact_path = os.path.join(ARTIFACT_DIR, CANNED_FILE)
+    use_artifact = get_artifact_manifest() is not None and os.path.exists(artifact_path)
+    try:
+        canned_answers = load('canned_answers')
+        path = artifact_path if use_artifact else canned_answers.DEFAULT_INDEX_PATH
+        canned_index = canned_answers.CannedAnswerIndex.load(path, policy_kb=POLICY_KB)
+    except Exception as e:
+        print(f"标准答案库加载失败: {e}")
+        readiness.finish('canned', FAILED, detail=f"{type(e).__name__}: {e}")
+        return None
+    if canned_index is None:
+        readiness.finish('canned', UNAVAILABLE, detail="未构建标准答案库")
+    else:
+        readiness.finish('canned', READY, source='artifact' if use_artifact else 'file')
+    return canned_index
+
+
+@process_singleton
+def get_embedding_intent_classifier():
+    """向量意图识别同样复用RAG的embedding模型；没有预构建的质心时编码示例问题计算各意图质心"""
+    readiness = get_readiness()
+    rag = get_rag_system() if INTENT_EMBEDDING_AVAILABLE else None
+    if rag is None:
+        readiness.finish('intent', UNAVAILABLE)
+        return None
+    readiness.start('intent')
+    try:
+        classifier_class = load('embedding_intent').EmbeddingIntentClassifier
+        artifact = load_intent_centroids(ARTIFACT_DIR, get_policy_kb_version()) if get_artifact_manifest() else None
+        if artifact is not None:
+            classifier, source = classifier_class.from_artifact(artifact), 'artifact'
+        else:
+            classifier, source = classifier_class.build(rag.model.encode), 'built'
+        readiness.finish('intent', READY, source=source)
+        return classifier
+    except Exception as e:
+        print(f"向量意图识别初始化失败，使用关键词识别: {e}")
+        readiness.finish('intent', FAILED, detail=f"{type(e).__name__}: {e}")
+        return None
+
+
+@process_singleton
+def get_recommendation_engine():
+    """推荐引擎（政策推荐和津贴计算页面）"""
+    readiness = get_readiness()
+    if not REC_AVAILABLE:
+        readiness.finish('rec', UNAVAILABLE)
+        return None
+    readiness.start('rec')
+    try:
+        engine = RecommendationEngine(POLICY_KB)
+    except Exception as e:
+        print(f"推荐引擎初始化失败: {e}")
+        readiness.finish('rec', FAILED, detail=f"{type(e).__name__}: {e}")
+        return None
+    readiness.finish('rec', READY, source='built')
+    return engine
+
+
+@process_singleton
+def get_timeline_generator():
+    """时间线生成器（时间规划页面，导入 plotly 和 pandas）"""
+    readiness = get_readiness()
+    if not TIMELINE_AVAILABLE:
+        readiness.finish('timeline', UNAVAILABLE)
+        return None
+    readiness.start('timeline')
+    try:
+        generator = load('timeline_generator').TimelineGenerator()
+    except Exception as e:
+        print(f"时间线生成器初始化失败: {e}")
+        readiness.finish('timeline', FAILED, detail=f"{type(e).__name__}: {e}")
+        return None
+    readiness.finish('timeline', READY, source='built')
+    return generator
+
+
+SUBSYSTEM_LOADERS: Dict[str, Callable] = {
+    'translator': get_translator,
+    'rec': get_recommendation_engine,
+    'rag': get_rag_system,
+    'canned': get_canned_index,
+    'intent': get_embedding_intent_classifier,
+    'timeline': get_timeline_generator,
+}
+
+
+@process_singleton
+def start_warmup() -> Optional[threading.Thread]:
+    """在后台线程按顺序预加载 WARMUP_SUBSYSTEMS（进程内只启动一次），不阻塞页面渲染"""
+    def run():
+        for name in WARMUP_SUBSYSTEMS:
+            loader = SUBSYSTEM_LOADERS.get(name)
+            if loader is not None:
+                loader()
+    if not WARMUP_SUBSYSTEMS:
+        return None
+    thread = threading.Thread(target=run, name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+# 测试代码
+if __name__ == "__main__":
+    import time
+
+    server = start_http_endpoint(port=int(os.getenv("LLM_METRICS_PORT", "9464")))
+    thread = start_warmup()
+    assert start_warmup() is thread  # 重复调用不会再启动预热
+    print("预热前:", get_readiness().probe()[0])
+    if thread is not None:
+        thread.join()
+    status, body, content_type = get_readiness().probe()
+    print(f"预热后: {status} {content_type}\n{body}")
+    if server is not None:
+        print(f"就绪检查: http://{server.server_address[0]}:{server.server_address[1]}/ready")
+        server.shutdown()
+    start = time.perf_counter()
+    assert get_translator() is get_translator()
+    print(f"再次获取翻译表: {(time.perf_counter() - start) * 1e6:.1f} µs")
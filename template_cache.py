@@ -0,0 +1,95 @@
+"""
+模板回答缓存 - 进程内LRU，所有会话共享
+键只包含影响回答内容的归一化输入（意图、公民身份、收入档、子女数等）；
+知识库或汇率版本变化时整体清空，避免旧内容和新内容混在一起占用容量
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class TemplateCache:
+    """有容量上限的LRU缓存（线程安全）"""
+
+    def __init__(self, max_entries: int = 1024):
+        """
+        Args:
+            max_entries: 条目上限，超出时淘汰最久未使用的条目
+        """
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[Hashable, Any]' = OrderedDict()
+        self._generation: Optional[Hashable] = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def ensure_generation(self, generation: Hashable):
+        """版本（如 (知识库版本, 汇率版本)）与上次不同时清空缓存"""
+        with self._lock:
+            if generation != self._generation:
+                if self._generation is not None:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._generation = generation
+
+    def get_or_render(self, key: Hashable, render: Callable[[], Any]) -> Any:
+        """
+        返回缓存的结果，未命中时调用 render() 生成并写入
+
+        render 在锁外执行，并发未命中时可能重复生成同一个键，结果相同，不影响正确性
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        value = render()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """条目数、命中率和失效次数"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+                'invalidations': self.invalidations
+            }
+
+
+# 测试代码
+if __name__ == "__main__":
+    import time
+
+    cache = TemplateCache(max_entries=2)
+    renders = []
+
+    def render(key):
+        renders.append(key)
+        time.sleep(0.01)
+        return f"answer for {key}"
+
+    cache.ensure_generation(('kb1', 'rates1'))
+    for key in [('fertility', True, 0), ('fertility', True, 0), ('housing', True, True), ('marriage',)]:
+        cache.get_or_render(key, lambda: render(key))
+    print(cache.stats(), renders)
+
+    cache.ensure_generation(('kb1', 'rates2'))  # 汇率刷新
+    print(cache.stats())
+    assert cache.stats()['entries'] == 0 and cache.stats()['invalidations'] == 1
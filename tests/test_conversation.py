@@ -0,0 +1,63 @@
+"""多轮对话窗口：原文轮数上限、滚动摘要截断、token预算内的历史"""
+from conversation import ConversationWindow, render_history, summarize_turn
+from llm_metrics import estimate_tokens
+
+ANSWER = "**第一胎**现金奖励S$8,000。更多细节见官网。"
+
+
+def filled(turns, **kwargs):
+    conversation = ConversationWindow(**kwargs)
+    for i in range(1, turns + 1):
+        conversation.add_turn(f"第{i}个问题：生育津贴有多少钱？", ANSWER)
+    return conversation
+
+
+def test_summary_is_one_plain_sentence():
+    line = summarize_turn("生育津贴有多少钱？", ANSWER)
+    assert line == "问: 生育津贴有多少钱 → 答: 第一胎现金奖励S$8,000"
+
+
+def test_old_turns_roll_into_summary():
+    conversation = filled(5, max_turns=2)
+    assert [user for user, _ in conversation.turns] == ["第4个问题：生育津贴有多少钱？", "第5个问题：生育津贴有多少钱？"]
+    assert len(conversation.summary_lines) == 3
+    assert conversation.summary_lines[0].startswith("问: 第1个问题")
+
+
+def test_summary_drops_oldest_lines_over_token_limit():
+    conversation = filled(20, max_turns=1, summary_tokens=60)
+    line_tokens = estimate_tokens(conversation.summary_lines[-1])
+    assert sum(estimate_tokens(line) for line in conversation.summary_lines) <= 60
+    assert len(conversation.summary_lines) == 60 // line_tokens
+    assert "第19个问题" in conversation.summary_lines[-1]
+
+
+def test_window_stays_within_budget():
+    conversation = filled(5, max_turns=3)
+    summary, turns = conversation.window(token_budget=30)
+    assert estimate_tokens(summary) + sum(estimate_tokens(u) + estimate_tokens(a) for u, a in turns) <= 30
+
+
+def test_window_summarizes_older_turns_before_dropping_newest():
+    conversation = filled(3, max_turns=3)
+    full_summary, full_turns = conversation.window(token_budget=10000)
+    assert not full_summary and len(full_turns) == 3
+    # 预算刚好容纳最近一轮原文和前两轮的摘要
+    budget = (sum(estimate_tokens(text) for text in full_turns[-1])
+              + sum(estimate_tokens(summarize_turn(*turn)) for turn in full_turns[:-1]))
+    summary, turns = conversation.window(token_budget=budget)
+    assert turns == full_turns[-1:]
+    assert summary.splitlines() == [summarize_turn(*turn) for turn in full_turns[:-1]]
+
+
+def test_messages_put_summary_first():
+    messages = filled(4, max_turns=2).to_messages(token_budget=1000)
+    assert messages[0]['role'] == 'system' and "早前对话摘要" in messages[0]['content']
+    assert [m['role'] for m in messages[1:]] == ['user', 'assistant', 'user', 'assistant']
+    assert render_history(messages).splitlines()[0] == "背景: 早前对话摘要："
+
+
+def test_clear():
+    conversation = filled(5, max_turns=2)
+    conversation.clear()
+    assert conversation.to_messages(token_budget=1000) == []
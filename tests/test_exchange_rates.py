@@ -0,0 +1,90 @@
+"""汇率缓存：过期后先返回旧值再后台刷新、失败保留旧值、持久化"""
+import threading
+import time
+
+import pytest
+
+from exchange_rates import ExchangeRateProvider
+
+DEFAULTS = {'USD': 0.74, 'CNY': 5.3}
+LIVE = {'USD': 0.75, 'CNY': 5.4, 'EUR': 0.69}
+
+
+class SlowFetch:
+    """可控的汇率接口：release 之前一直阻塞"""
+
+    def __init__(self, rates=None, error=None):
+        self.rates = rates or LIVE
+        self.error = error
+        self.calls = 0
+        self.release = threading.Event()
+
+    def __call__(self, url, timeout):
+        self.calls += 1
+        self.release.wait(2)
+        if self.error:
+            raise self.error
+        return self.rates
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_stale_read_returns_old_rates_and_refreshes_in_background():
+    fetch = SlowFetch()
+    provider = ExchangeRateProvider(defaults=DEFAULTS, ttl=3600, fetch=fetch)
+    start = time.monotonic()
+    assert provider.get() == DEFAULTS  # 从未获取过，视为过期，但不等待网络
+    assert time.monotonic() - start < 0.5
+    old_version = provider.version
+    fetch.release.set()
+    wait_for(lambda: provider.status()['source'] == 'live')
+    # 只保留需要的币种
+    assert provider.get() == {'USD': 0.75, 'CNY': 5.4}
+    assert provider.version != old_version and not provider.is_stale()
+
+
+def test_concurrent_stale_reads_trigger_one_refresh():
+    fetch = SlowFetch()
+    provider = ExchangeRateProvider(defaults=DEFAULTS, fetch=fetch)
+    for _ in range(5):
+        provider.get()
+    fetch.release.set()
+    wait_for(lambda: provider.status()['source'] == 'live')
+    assert fetch.calls == 1
+
+
+def test_failed_refresh_keeps_rates_and_waits_before_retrying():
+    fetch = SlowFetch(error=ConnectionError('offline'))
+    fetch.release.set()
+    provider = ExchangeRateProvider(defaults=DEFAULTS, retry_interval=60, fetch=fetch)
+    provider.get()
+    wait_for(lambda: provider.status()['last_error'] is not None)
+    assert provider.get() == DEFAULTS and provider.status()['source'] == 'default'
+    assert 'offline' in provider.status()['last_error']
+    assert fetch.calls == 1  # retry_interval 内不再触发
+
+
+@pytest.mark.parametrize('content', ['not json', '{"rates": {}}'])
+def test_corrupt_file_falls_back_to_defaults(tmp_path, content):
+    path = tmp_path / 'exchange_rates.json'
+    path.write_text(content, encoding='utf-8')
+    provider = ExchangeRateProvider(defaults=DEFAULTS, path=str(path), fetch=SlowFetch())
+    assert provider.status()['source'] == 'default' and provider.status()['last_error']
+
+
+def test_persisted_rates_survive_restart(tmp_path):
+    path = str(tmp_path / 'exchange_rates.json')
+    fetch = SlowFetch()
+    fetch.release.set()
+    assert ExchangeRateProvider(defaults=DEFAULTS, path=path, fetch=fetch).refresh()
+
+    offline = SlowFetch(error=ConnectionError('offline'))
+    restarted = ExchangeRateProvider(defaults=DEFAULTS, ttl=3600, path=path, fetch=offline)
+    assert restarted.get() == {'USD': 0.75, 'CNY': 5.4}
+    assert restarted.status()['source'] == 'disk' and not restarted.is_stale()
+    assert offline.calls == 0
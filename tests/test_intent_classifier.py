@@ -0,0 +1,41 @@
+"""意图分类器准确率：人工标注的评测集和标准问题库中的各语言问法"""
+import pytest
+
+from intent_classifier import (GENERAL, INTENT_KEYWORDS, LABELED_QUESTIONS, IntentClassifier,
+                               _legacy_detect_intent)
+
+
+@pytest.fixture(scope='module')
+def classifier():
+    return IntentClassifier()
+
+
+@pytest.mark.parametrize('question, expected', LABELED_QUESTIONS)
+def test_labeled_question(classifier, question, expected):
+    assert set(classifier.intents_of(question)) == expected
+
+
+def test_primary_intent_not_worse_than_legacy(classifier):
+    primary = sum(classifier.primary(question) in expected for question, expected in LABELED_QUESTIONS)
+    legacy = sum(_legacy_detect_intent(question) in expected for question, expected in LABELED_QUESTIONS)
+    assert primary >= legacy
+
+
+@pytest.mark.parametrize('term', ['津贴', '孩子', 'anak'])
+def test_generic_terms_not_keywords(term):
+    # 泛用词会给其他类别的问题误加生育津贴段落
+    for by_language in INTENT_KEYWORDS.values():
+        for terms in by_language.values():
+            assert term not in [entry[0] if isinstance(entry, tuple) else entry for entry in terms]
+
+
+def test_unrelated_question_is_general(classifier):
+    assert classifier.classify("你好") == [(GENERAL, 0.0)]
+
+
+def test_canned_questions_recall(classifier):
+    canned_answers = pytest.importorskip('canned_answers')
+    misses = [(question, item['intent']) for item in canned_answers.CANONICAL_QUESTIONS
+              for questions in item['questions'].values() for question in questions
+              if item['intent'] not in classifier.intents_of(question)]
+    assert not misses
@@ -0,0 +1,67 @@
+"""延迟预算：剩余时间、阶段超时、到期和放宽"""
+import pytest
+
+from latency_budget import BudgetExceeded, LatencyBudget
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_remaining_and_expiry(clock):
+    budget = LatencyBudget(8, clock=clock)
+    assert budget.deadline == 108.0
+    clock.now += 5
+    assert budget.remaining() == 3 and budget.allows(3) and not budget.allows(3.5)
+    clock.now += 3
+    assert budget.expired() and budget.remaining() == 0
+    clock.now += 10
+    assert budget.remaining() == 0  # 不为负
+
+
+def test_stage_timeout_respects_cap_and_reserve(clock):
+    budget = LatencyBudget(8, clock=clock)
+    assert budget.timeout() == 8
+    assert budget.timeout(cap=3) == 3
+    assert budget.timeout(cap=30, reserve=2) == 6
+    clock.now += 7
+    assert budget.timeout(cap=30, reserve=2) == 0
+
+
+def test_stages_accumulate_and_report_degradation(clock):
+    budget = LatencyBudget(8, clock=clock)
+    for seconds in (1, 0.5):
+        with budget.stage('llm'):
+            clock.now += seconds
+    with pytest.raises(RuntimeError):
+        with budget.stage('retrieval'):
+            clock.now += 2
+            raise RuntimeError
+    budget.degrade('translation', 'budget')
+    report = budget.report()
+    assert report['stages'] == {'llm': 1.5, 'retrieval': 2}
+    assert report['degraded'] == {'translation': 'budget'}
+    assert report['elapsed'] == 3.5 and report['budget'] == 8
+
+
+def test_extend_only_widens(clock):
+    budget = LatencyBudget(8, clock=clock)
+    clock.now += 8
+    budget.extend_to(30)
+    assert not budget.expired() and budget.remaining() == 22 and budget.report()['budget'] == 30
+    budget.extend_to(10)
+    assert budget.deadline == 130.0
+
+
+def test_budget_exceeded_is_a_timeout():
+    # 调用方按超时统一处理（不计入熔断）
+    assert issubclass(BudgetExceeded, TimeoutError)
@@ -0,0 +1,68 @@
+"""限流器的准入：令牌桶突发和补充、并发上限、排队超时"""
+import time
+
+import pytest
+
+from rate_limiter import LimiterRegistry, ProviderLimiter, RateLimitExceeded, TokenBucket
+
+
+def test_bucket_allows_burst_then_rejects_without_waiting():
+    bucket = TokenBucket(rate=1.0, capacity=2)
+    assert bucket.acquire(0) and bucket.acquire(0)
+    start = time.monotonic()
+    # 下一个令牌要1秒后才补充，超过等待预算时立即失败而不是睡到超时
+    assert not bucket.acquire(0.2)
+    assert time.monotonic() - start < 0.1
+
+
+def test_bucket_refills_at_rate():
+    bucket = TokenBucket(rate=20.0, capacity=1)
+    assert bucket.acquire(0)
+    assert not bucket.acquire(0)
+    start = time.monotonic()
+    assert bucket.acquire(1.0)
+    assert 0.03 <= time.monotonic() - start < 0.5
+
+
+def test_bucket_does_not_exceed_capacity():
+    bucket = TokenBucket(rate=100.0, capacity=2)
+    time.sleep(0.05)  # 空闲期间补充的令牌不超过容量
+    assert bucket.acquire(0) and bucket.acquire(0)
+    assert not bucket.acquire(0)
+
+
+def test_concurrency_cap_and_release():
+    limiter = ProviderLimiter('Gemini', requests_per_second=100, burst=10, max_concurrency=1, queue_timeout=0)
+    assert limiter.acquire()
+    assert not limiter.acquire()
+    limiter.release()
+    assert limiter.acquire()
+    snapshot = limiter.snapshot()
+    assert snapshot['admitted'] == 2 and snapshot['rejected'] == 1 and snapshot['in_flight'] == 1
+
+
+def test_rate_rejection_returns_concurrency_slot():
+    limiter = ProviderLimiter('Gemini', requests_per_second=0.1, burst=1, max_concurrency=1, queue_timeout=0)
+    with limiter.slot():
+        pass
+    # 令牌不足被拒绝时不能占着唯一的并发名额：令牌恢复后应能立即获准
+    assert not limiter.acquire()
+    limiter.bucket.rate = 1000.0
+    assert limiter.acquire(0.1)
+    assert limiter.snapshot()['in_flight'] == 1
+
+
+def test_slot_raises_when_queue_times_out():
+    limiter = ProviderLimiter('Gemini', requests_per_second=100, burst=10, max_concurrency=1, queue_timeout=0.05)
+    with limiter.slot():
+        with pytest.raises(RateLimitExceeded):
+            with limiter.slot():
+                pass
+    assert limiter.snapshot()['in_flight'] == 0
+
+
+def test_registry_merges_model_config_with_defaults():
+    registry = LimiterRegistry({'通义千问': {'rate_limit': {'max_concurrency': 1}}, 'Gemini': {}})
+    assert registry.get('通义千问').max_concurrency == 1
+    assert registry.get('Gemini').queue_timeout == LimiterRegistry.DEFAULTS['queue_timeout']
+    assert set(registry.snapshot()) == {'通义千问', 'Gemini'}
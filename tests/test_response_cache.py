@@ -0,0 +1,60 @@
+"""LLM回答缓存的失效：TTL过期、容量淘汰、知识库版本变化"""
+import time
+
+import pytest
+
+from response_cache import ResponseCache, make_cache_key
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'cache.sqlite3')
+
+
+def test_key_ignores_whitespace_case_and_trailing_punctuation():
+    key = make_cache_key('通义千问', 'qwen-max', 'system', 'context', 'What is the Baby Bonus?')
+    assert key == make_cache_key('通义千问', 'qwen-max', 'system', 'context', '  what is the  baby bonus ')
+
+
+@pytest.mark.parametrize('field', ['provider', 'model_id', 'system_prompt', 'context', 'history'])
+def test_key_changes_with_prompt_inputs(field):
+    # 提供方、模型、提示词、上下文、对话历史任一变化都不能命中旧回答
+    parts = dict(provider='通义千问', model_id='qwen-max', system_prompt='system', context='context',
+                 question='生育津贴有多少？', history='')
+    assert make_cache_key(**parts) != make_cache_key(**{**parts, field: 'changed'})
+
+
+def test_hit_after_set(path):
+    cache = ResponseCache(path, kb_version='v1')
+    assert cache.get('k') is None
+    cache.set('k', '通义千问', '回答')
+    assert cache.get('k') == '回答'
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_expired_entry_is_not_served(path):
+    cache = ResponseCache(path, kb_version='v1', ttl_seconds=0)
+    cache.set('k', '通义千问', '回答')
+    assert cache.get('k') is None
+
+
+def test_evicts_least_recently_accessed(path):
+    cache = ResponseCache(path, kb_version='v1', max_entries=2)
+    cache.set('old', '通义千问', 'A')
+    time.sleep(0.01)
+    cache.set('recent', '通义千问', 'B')
+    time.sleep(0.01)
+    assert cache.get('old') == 'A'  # 访问后 old 比 recent 新
+    time.sleep(0.01)
+    cache.set('new', '通义千问', 'C')
+    assert cache.stats()['entries'] == 2
+    assert cache.get('recent') is None
+    assert cache.get('old') == 'A' and cache.get('new') == 'C'
+
+
+def test_kb_version_change_clears_shared_file(path):
+    ResponseCache(path, kb_version='v1').set('k', '通义千问', '旧知识库的回答')
+    assert ResponseCache(path, kb_version='v1').get('k') == '旧知识库的回答'
+    cache = ResponseCache(path, kb_version='v2')
+    assert cache.get('k') is None
+    assert cache.stats()['entries'] == 0
@@ -0,0 +1,50 @@
+"""模板回答缓存：LRU淘汰、版本变化时整体失效"""
+from template_cache import TemplateCache
+
+
+def render_counter():
+    renders = []
+
+    def render(key):
+        renders.append(key)
+        return f"answer for {key}"
+    return renders, render
+
+
+def test_hit_does_not_render_again():
+    cache = TemplateCache()
+    renders, render = render_counter()
+    key = ('fertility', True, 1)
+    assert cache.get_or_render(key, lambda: render(key)) == cache.get_or_render(key, lambda: render(key))
+    assert renders == [key]
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_evicts_least_recently_used():
+    cache = TemplateCache(max_entries=2)
+    renders, render = render_counter()
+    for key in ['a', 'b', 'a', 'c']:  # 'a' 被再次使用，淘汰的是 'b'
+        cache.get_or_render(key, lambda: render(key))
+    assert cache.stats()['entries'] == 2
+    cache.get_or_render('a', lambda: render('a'))
+    cache.get_or_render('b', lambda: render('b'))
+    assert renders == ['a', 'b', 'c', 'b']
+
+
+def test_generation_change_invalidates():
+    cache = TemplateCache()
+    renders, render = render_counter()
+    cache.ensure_generation(('kb1', 'rates1'))
+    cache.get_or_render('a', lambda: render('a'))
+    cache.ensure_generation(('kb1', 'rates1'))  # 版本不变不失效
+    cache.get_or_render('a', lambda: render('a'))
+    cache.ensure_generation(('kb1', 'rates2'))  # 汇率刷新
+    assert cache.stats()['entries'] == 0 and cache.stats()['invalidations'] == 1
+    cache.get_or_render('a', lambda: render('a'))
+    assert renders == ['a', 'a']
+
+
+def test_first_generation_is_not_counted_as_invalidation():
+    cache = TemplateCache()
+    cache.ensure_generation(('kb1', 'rates1'))
+    assert cache.stats()['invalidations'] == 0
@@ -3,8 +3,35 @@
 支持中文、英文、马来语
 """
 
+# 政策回答的关键词替换映射（模块级常量，所有会话共用）
+POLICY_KEYWORD_MAP = {
+    ('zh', 'en'): {
+        '生育津贴': 'Baby Bonus',
+        '现金奖励': 'Cash Gift',
+        '产假': 'Maternity Leave',
+        '陪产假': 'Paternity Leave',
+        '住房津贴': 'Housing Grant',
+        '申请条件': 'Eligibility',
+        '官方网站': 'Official Website',
+        '公民身份': 'Citizenship',
+        '新加坡公民': 'Singapore Citizen'
+    },
+    ('zh', 'ms'): {
+        '生育津贴': 'Bonus Bayi',
+        '现金奖励': 'Hadiah Tunai',
+        '产假': 'Cuti Bersalin',
+        '陪产假': 'Cuti Paterniti',
+        '住房津贴': 'Geran Perumahan',
+        '申请条件': 'Kelayakan',
+        '官方网站': 'Laman Web Rasmi',
+        '公民身份': 'Kewarganegaraan',
+        '新加坡公民': 'Warganegara Singapura'
+    }
+}
+
+
 class TranslationManager:
-    """管理应用程序的多语言翻译"""
+    """管理应用程序的多语言翻译（只读，app.py 中所有会话共用一个实例）"""
     
     def __init__(self):
         self.translations = {
@@ -91,6 +118,36 @@ class TranslationManager:
                 'en': 'Enable RAG Enhanced Search',
                 'ms': 'Aktifkan Carian Dipertingkat RAG'
             },
+            'sidebar_enable_streaming': {
+                'zh': '流式输出回答',
+                'en': 'Stream Answers',
+                'ms': 'Strim Jawapan'
+            },
+            'sidebar_enable_progressive': {
+                'zh': '先显示标准回答，再由AI完善',
+                'en': 'Show standard answer first, then refine with AI',
+                'ms': 'Papar jawapan standard dahulu, kemudian diperhalusi AI'
+            },
+            'sidebar_profile_apply': {
+                'zh': '更新个人信息',
+                'en': 'Update profile',
+                'ms': 'Kemas kini profil'
+            },
+            'sidebar_auto_model': {
+                'zh': '🤖 自动选择',
+                'en': '🤖 Auto',
+                'ms': '🤖 Automatik'
+            },
+            'sidebar_auto_needs_env': {
+                'zh': '自动选择只使用 .env 中配置的Key，当前未配置，将只提供模板回答；请选择具体模型并输入Key',
+                'en': 'Auto mode only uses keys configured in .env and none are set, so only standard answers are available; pick a model and enter its key',
+                'ms': 'Mod automatik hanya menggunakan kunci dalam .env dan tiada yang ditetapkan, jadi hanya jawapan standard tersedia; pilih model dan masukkan kuncinya'
+            },
+            'sidebar_enable_hedging': {
+                'zh': '启用对冲请求（降低长尾延迟）',
+                'en': 'Enable Hedged Requests (cut tail latency)',
+                'ms': 'Aktifkan Permintaan Lindung Nilai (kurangkan kependaman ekor)'
+            },
             
             # 公民身份选项
             'citizen': {
@@ -422,6 +479,36 @@ class TranslationManager:
             },
             
             # 错误和警告消息
+            'chat_llm_fallback': {
+                'zh': 'AI模型暂时不可用，以下为基于政策知识库的标准回答',
+                'en': 'AI models are temporarily unavailable; below is the standard answer from the policy knowledge base',
+                'ms': 'Model AI tidak tersedia buat sementara; berikut ialah jawapan standard daripada pangkalan pengetahuan dasar'
+            },
+            'chat_refining': {
+                'zh': 'AI 正在完善回答…',
+                'en': 'AI is refining the answer…',
+                'ms': 'AI sedang memperhalusi jawapan…'
+            },
+            'chat_cancel_refine': {
+                'zh': '停止完善，保留当前回答',
+                'en': 'Stop refining, keep this answer',
+                'ms': 'Henti memperhalusi, kekalkan jawapan ini'
+            },
+            'chat_refine_cancelled': {
+                'zh': '已停止AI完善，保留标准回答',
+                'en': 'AI refinement stopped; the standard answer is kept',
+                'ms': 'Penghalusan AI dihentikan; jawapan standard dikekalkan'
+            },
+            'chat_routed_to': {
+                'zh': '自动选择模型',
+                'en': 'Auto-selected model',
+                'ms': 'Model dipilih secara automatik'
+            },
+            'chat_stream_interrupted': {
+                'zh': '回答生成中断，请稍后重试',
+                'en': 'Answer generation was interrupted, please try again later',
+                'ms': 'Penjanaan jawapan terganggu, sila cuba lagi nanti'
+            },
             'error_no_api_key': {
                 'zh': '请先配置API密钥',
                 'en': 'Please configure API key first',
@@ -520,36 +607,10 @@ class TranslationManager:
         if from_lang == to_lang:
             return response
         
-        # 简单的关键词替换映射
-        keyword_map = {
-            ('zh', 'en'): {
-                '生育津贴': 'Baby Bonus',
-                '现金奖励': 'Cash Gift',
-                '产假': 'Maternity Leave',
-                '陪产假': 'Paternity Leave',
-                '住房津贴': 'Housing Grant',
-                '申请条件': 'Eligibility',
-                '官方网站': 'Official Website',
-                '公民身份': 'Citizenship',
-                '新加坡公民': 'Singapore Citizen'
-            },
-            ('zh', 'ms'): {
-                '生育津贴': 'Bonus Bayi',
-                '现金奖励': 'Hadiah Tunai',
-                '产假': 'Cuti Bersalin',
-                '陪产假': 'Cuti Paterniti',
-                '住房津贴': 'Geran Perumahan',
-                '申请条件': 'Kelayakan',
-                '官方网站': 'Laman Web Rasmi',
-                '公民身份': 'Kewarganegaraan',
-                '新加坡公民': 'Warganegara Singapura'
-            }
-        }
-        
         # 执行关键词替换
         translated = response
-        if (from_lang, to_lang) in keyword_map:
-            for original, translation in keyword_map[(from_lang, to_lang)].items():
+        if (from_lang, to_lang) in POLICY_KEYWORD_MAP:
+            for original, translation in POLICY_KEYWORD_MAP[(from_lang, to_lang)].items():
                 translated = translated.replace(original, translation)
         
         return translated
\ No newline at end of file